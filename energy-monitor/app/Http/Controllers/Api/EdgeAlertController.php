@@ -0,0 +1,96 @@
+<?php
+
+namespace App\Http\Controllers\Api;
+
+use App\Http\Controllers\Controller;
+use App\Models\Register;
+use App\Services\AlertService;
+use Illuminate\Http\Request;
+use Illuminate\Http\JsonResponse;
+use Illuminate\Support\Facades\Log;
+use Illuminate\Support\Facades\Validator;
+
+class EdgeAlertController extends Controller
+{
+    protected AlertService $alertService;
+
+    public function __construct(AlertService $alertService)
+    {
+        $this->alertService = $alertService;
+    }
+
+    /**
+     * Threshold rules for the Python poller to evaluate on each reading
+     */
+    public function rules(): JsonResponse
+    {
+        $rules = $this->alertService->getAlertRules();
+
+        return response()->json([
+            'success' => true,
+            'rules' => $rules
+        ]);
+    }
+
+    /**
+     * Store a threshold violation pushed by the Python poller
+     */
+    public function store(Request $request): JsonResponse
+    {
+        $validator = Validator::make($request->all(), [
+            'device_id' => 'required|integer|exists:devices,id',
+            'parameter' => 'required|string|max:255',
+            'value' => 'required|numeric',
+            'timestamp' => 'required|date_format:Y-m-d\TH:i:s\Z',
+            'level' => 'required|in:out_of_range,critical'
+        ]);
+
+        if ($validator->fails()) {
+            return response()->json([
+                'success' => false,
+                'message' => 'Validation failed',
+                'errors' => $validator->errors()
+            ], 422);
+        }
+
+        try {
+            $register = Register::where('device_id', $request->device_id)
+                ->where('parameter_name', $request->parameter)
+                ->first();
+
+            if (!$register) {
+                return response()->json([
+                    'success' => false,
+                    'message' => "Register not found for device {$request->device_id} and parameter '{$request->parameter}'"
+                ], 404);
+            }
+
+            $alert = $this->alertService->processEdgeAlert(
+                $register,
+                $request->value,
+                $request->timestamp,
+                $request->level
+            );
+
+            return response()->json([
+                'success' => true,
+                'message' => 'Alert stored successfully',
+                'data' => [
+                    'alert_id' => $alert->id,
+                    'severity' => $alert->severity
+                ]
+            ], 201);
+
+        } catch (\Exception $e) {
+            Log::error("Error storing edge alert", [
+                'error' => $e->getMessage(),
+                'payload' => $request->all()
+            ]);
+
+            return response()->json([
+                'success' => false,
+                'message' => 'Internal server error while storing alert'
+            ], 500);
+        }
+    }
+}
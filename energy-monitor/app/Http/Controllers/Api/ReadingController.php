@@ -28,12 +28,18 @@ public function __construct(AlertService $alertService)
      */
     public function store(Request $request): JsonResponse
     {
-        // Validate the incoming payload
+        [$status, $body] = $this->storeReading($request->all());
+
+        return response()->json($body, $status);
+    }
+
+    /**
+     * Store a batch of readings from the Python poller
+     */
+    public function storeBatch(Request $request): JsonResponse
+    {
         $validator = Validator::make($request->all(), [
-            'device_id' => 'required|integer|exists:devices,id',
-            'parameter' => 'required|string|max:255',
-            'value' => 'required|numeric',
-            'timestamp' => 'required|date_format:Y-m-d\TH:i:s\Z'
+            'readings' => 'required|array|min:1|max:1000'
         ]);
 
         if ($validator->fails()) {
@@ -44,42 +50,112 @@ public function store(Request $request): JsonResponse
             ], 422);
         }
 
+        // Each reading gets its own status so the poller can retry only
+        // the ones that failed on the server side
+        $results = [];
+        foreach ($request->input('readings') as $index => $payload) {
+            [$status, $body] = $this->storeReading(is_array($payload) ? $payload : []);
+            $results[] = [
+                'index' => $index,
+                'status' => $status,
+                'message' => $body['message']
+            ];
+        }
+
+        $stored = count(array_filter($results, fn ($result) => $result['status'] === 201));
+
+        return response()->json([
+            'success' => $stored === count($results),
+            'stored' => $stored,
+            'failed' => count($results) - $stored,
+            'results' => $results
+        ]);
+    }
+
+    /**
+     * Validate and store one reading payload, returning [status, body]
+     */
+    private function storeReading(array $data): array
+    {
+        $hasRegisterId = array_key_exists('register_id', $data);
+
+        // Validate the incoming payload
+        // With a register_id from the registry sync the register lookup below
+        // also proves the device exists, so the separate device check is skipped
+        $validator = Validator::make($data, [
+            'device_id' => $hasRegisterId ? 'required|integer' : 'required|integer|exists:devices,id',
+            'register_id' => 'sometimes|integer',
+            'parameter' => 'required|string|max:255',
+            'value' => 'required|numeric',
+            'quality' => 'sometimes|string|in:' . implode(',', Reading::QUALITY_CODES),
+            'timestamp' => 'required|date_format:Y-m-d\TH:i:s\Z',
+            'alerts_evaluated' => 'sometimes|boolean'
+        ]);
+
+        if ($validator->fails()) {
+            return [422, [
+                'success' => false,
+                'message' => 'Validation failed',
+                'errors' => $validator->errors()
+            ]];
+        }
+
         try {
-            // Get the device
-            $device = Device::findOrFail($request->device_id);
-            
-            // Find the register for this device and parameter
-            $register = Register::where('device_id', $request->device_id)
-                ->where('parameter_name', $request->parameter)
-                ->first();
+            if ($hasRegisterId) {
+                $register = Register::where('id', $data['register_id'])
+                    ->where('device_id', $data['device_id'])
+                    ->first();
+
+                if (!$register) {
+                    return [404, [
+                        'success' => false,
+                        'message' => "Register {$data['register_id']} not found for device {$data['device_id']}"
+                    ]];
+                }
+            } else {
+                // Get the device
+                $device = Device::findOrFail($data['device_id']);
+
+                // Find the register for this device and parameter
+                $register = Register::where('device_id', $data['device_id'])
+                    ->where('parameter_name', $data['parameter'])
+                    ->first();
+            }
 
             if (!$register) {
-                return response()->json([
+                return [404, [
                     'success' => false,
-                    'message' => "Register not found for device {$request->device_id} and parameter '{$request->parameter}'"
-                ], 404);
+                    'message' => "Register not found for device {$data['device_id']} and parameter '{$data['parameter']}'"
+                ]];
             }
 
             // Create the reading
             $reading = Reading::create([
-                'device_id' => $request->device_id,
+                'device_id' => $data['device_id'],
                 'register_id' => $register->id,
-                'value' => $request->value,
-                'timestamp' => Carbon::parse($request->timestamp)
+                'value' => $data['value'],
+                'quality' => $data['quality'] ?? Reading::QUALITY_GOOD,
+                'timestamp' => Carbon::parse($data['timestamp'])
             ]);
 
-            // Process alerts using the AlertService
-            $alerts = $this->alertService->processAlerts($register, $request->value, $request->timestamp);
+            // Process alerts using the AlertService; thresholds are skipped when
+            // the poller already evaluated them and pushed any violation
+            $alerts = $this->alertService->processAlerts(
+                $register,
+                $data['value'],
+                $data['timestamp'],
+                filter_var($data['alerts_evaluated'] ?? false, FILTER_VALIDATE_BOOLEAN)
+            );
 
             Log::info("Reading stored successfully", [
-                'device_id' => $request->device_id,
-                'parameter' => $request->parameter,
-                'value' => $request->value,
-                'timestamp' => $request->timestamp,
+                'device_id' => $data['device_id'],
+                'parameter' => $data['parameter'],
+                'value' => $data['value'],
+                'timestamp' => $data['timestamp'],
                 'alerts_created' => count($alerts)
             ]);
 
-            return response()->json([
+            return [201, [
                 'success' => true,
                 'message' => 'Reading stored successfully',
                 'data' => [
@@ -87,21 +163,22 @@ public function store(Request $request): JsonResponse
                     'device_id' => $reading->device_id,
                     'parameter' => $register->parameter_name,
                     'value' => $reading->value,
+                    'quality' => $reading->quality,
                     'timestamp' => $reading->timestamp->toISOString(),
                     'alerts_created' => count($alerts)
                 ]
-            ], 201);
+            ]];
 
         } catch (\Exception $e) {
             Log::error("Error storing reading", [
                 'error' => $e->getMessage(),
-                'payload' => $request->all()
+                'payload' => $data
             ]);
 
-            return response()->json([
+            return [500, [
                 'success' => false,
                 'message' => 'Internal server error while storing reading'
-            ], 500);
+            ]];
         }
     }
-} 
\ No newline at end of file
+}
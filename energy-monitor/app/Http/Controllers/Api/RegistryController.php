@@ -0,0 +1,49 @@
+<?php
+
+namespace App\Http\Controllers\Api;
+
+use App\Http\Controllers\Controller;
+use App\Models\Device;
+use Illuminate\Http\Request;
+use Illuminate\Http\JsonResponse;
+
+class RegistryController extends Controller
+{
+    /**
+     * Device/register registry for the Python poller, with ETag caching
+     */
+    public function index(Request $request): JsonResponse
+    {
+        $devices = Device::with(['gateway', 'registers'])
+            ->orderBy('id')
+            ->get()
+            ->map(function (Device $device) {
+                return [
+                    'id' => $device->id,
+                    'name' => $device->name,
+                    'slave_id' => $device->slave_id,
+                    'gateway_ip' => $device->gateway?->fixed_ip,
+                    'registers' => $device->registers->sortBy('id')->values()->map(function ($register) {
+                        return [
+                            'id' => $register->id,
+                            'parameter_name' => $register->parameter_name,
+                            'register_address' => $register->register_address,
+                            'data_type' => $register->data_type,
+                            'unit' => $register->unit,
+                        ];
+                    }),
+                ];
+            });
+
+        $payload = [
+            'success' => true,
+            'devices' => $devices
+        ];
+
+        $response = response()->json($payload);
+        $response->setEtag(md5($response->getContent()));
+        $response->isNotModified($request);
+
+        return $response;
+    }
+}
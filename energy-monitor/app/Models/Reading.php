@@ -9,10 +9,16 @@ class Reading extends Model
 {
     use HasFactory;
 
+    public const QUALITY_GOOD = 'good';
+
+    // Codes the poller's data validation sends; readings it cannot send (NaN, infinity) never arrive
+    public const QUALITY_CODES = [self::QUALITY_GOOD, 'out_of_bounds', 'rate_exceeded', 'stuck'];
+
     protected $fillable = [
         'device_id',
         'register_id',
         'value',
+        'quality',
         'timestamp',
     ];
 
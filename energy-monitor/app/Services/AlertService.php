@@ -17,13 +17,13 @@ class AlertService
     /**
      * Process alerts for a reading value
      */
-    public function processAlerts(Register $register, float $value, string $timestamp): array
+    public function processAlerts(Register $register, float $value, string $timestamp, bool $thresholdsEvaluated = false): array
     {
         $alerts = [];
         $readingTime = Carbon::parse($timestamp);
 
-        // Check for out of range alerts
-        if ($register->normal_range && $this->isOutOfRange($value, $register->normal_range)) {
+        // Check for out of range alerts (skipped when the poller already evaluated them)
+        if (!$thresholdsEvaluated && $register->normal_range && $this->isOutOfRange($value, $register->normal_range)) {
             $alert = $this->createOutOfRangeAlert($register, $value, $readingTime);
             $alerts[] = $alert;
         }
@@ -35,7 +35,7 @@ public function processAlerts(Register $register, float $value, string $timestam
         }
 
         // Check for critical thresholds
-        if ($register->critical && $this->isCriticalValue($register, $value)) {
+        if (!$thresholdsEvaluated && $register->critical && $this->isCriticalValue($register, $value)) {
             $alert = $this->createCriticalAlert($register, $value, $readingTime);
             $alerts[] = $alert;
         }
@@ -43,6 +43,52 @@ public function processAlerts(Register $register, float $value, string $timestam
         return $alerts;
     }
 
+    /**
+     * Create an alert raised by the poller's edge threshold evaluation
+     */
+    public function processEdgeAlert(Register $register, float $value, string $timestamp, string $level): Alert
+    {
+        $readingTime = Carbon::parse($timestamp);
+
+        if ($level === 'critical') {
+            return $this->createCriticalAlert($register, $value, $readingTime);
+        }
+
+        return $this->createOutOfRangeAlert($register, $value, $readingTime);
+    }
+
+    /**
+     * Threshold rules the poller evaluates on each reading
+     */
+    public function getAlertRules(): array
+    {
+        $rules = [];
+
+        $registers = Register::whereNotNull('normal_range')->get();
+        foreach ($registers as $register) {
+            $range = $this->parseNormalRange($register->normal_range);
+            if (!$range) {
+                continue;
+            }
+
+            [$min, $max] = $range;
+            $criticalBuffer = ($max - $min) * 0.2;
+
+            $rules[] = [
+                'register_id' => $register->id,
+                'device_id' => $register->device_id,
+                'parameter' => $register->parameter_name,
+                'min' => $min,
+                'max' => $max,
+                'critical' => (bool) $register->critical,
+                'critical_min' => $register->critical ? $min - $criticalBuffer : null,
+                'critical_max' => $register->critical ? $max + $criticalBuffer : null,
+            ];
+        }
+
+        return $rules;
+    }
+
     /**
      * Create out of range alert
      */
@@ -180,19 +226,30 @@ private function sendNotifications(Alert $alert, string $notificationClass): voi
      */
     private function isOutOfRange(float $value, string $normalRange): bool
     {
-        // Parse normal range format like "220-400" or "220–400"
+        $range = $this->parseNormalRange($normalRange);
+        if ($range) {
+            [$min, $max] = $range;
+            return $value < $min || $value > $max;
+        }
+        
+        return false;
+    }
+
+    /**
+     * Parse a normal range like "220-400" or "220–400" into [min, max]
+     */
+    public function parseNormalRange(string $normalRange): ?array
+    {
         $normalRange = str_replace(['–', '—'], '-', $normalRange);
         
         if (strpos($normalRange, '-') !== false) {
             $parts = explode('-', $normalRange);
             if (count($parts) === 2) {
-                $min = (float) trim($parts[0]);
-                $max = (float) trim($parts[1]);
-                return $value < $min || $value > $max;
+                return [(float) trim($parts[0]), (float) trim($parts[1])];
             }
         }
         
-        return false;
+        return null;
     }
 
     /**
@@ -213,18 +270,12 @@ private function isCriticalValue(Register $register, float $value): bool
             return false;
         }
 
-        $normalRange = str_replace(['–', '—'], '-', $register->normal_range);
-        
-        if (strpos($normalRange, '-') !== false) {
-            $parts = explode('-', $normalRange);
-            if (count($parts) === 2) {
-                $min = (float) trim($parts[0]);
-                $max = (float) trim($parts[1]);
-                $range = $max - $min;
-                $criticalBuffer = $range * 0.2; // 20% beyond normal range
-                
-                return $value < ($min - $criticalBuffer) || $value > ($max + $criticalBuffer);
-            }
+        $range = $this->parseNormalRange($register->normal_range);
+        if ($range) {
+            [$min, $max] = $range;
+            $criticalBuffer = ($max - $min) * 0.2; // 20% beyond normal range
+            
+            return $value < ($min - $criticalBuffer) || $value > ($max + $criticalBuffer);
         }
         
         return false;
@@ -0,0 +1,29 @@
+<?php
+
+use Illuminate\Database\Migrations\Migration;
+use Illuminate\Database\Schema\Blueprint;
+use Illuminate\Support\Facades\Schema;
+
+return new class extends Migration
+{
+    /**
+     * Run the migrations.
+     */
+    public function up(): void
+    {
+        Schema::table('readings', function (Blueprint $table) {
+            // Data-quality code assigned by the poller's validation
+            $table->string('quality', 32)->default('good')->after('value');
+        });
+    }
+
+    /**
+     * Reverse the migrations.
+     */
+    public function down(): void
+    {
+        Schema::table('readings', function (Blueprint $table) {
+            $table->dropColumn('quality');
+        });
+    }
+};
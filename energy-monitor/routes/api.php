@@ -3,6 +3,8 @@
 use Illuminate\Http\Request;
 use Illuminate\Support\Facades\Route;
 use App\Http\Controllers\Api\ReadingController;
+use App\Http\Controllers\Api\EdgeAlertController;
+use App\Http\Controllers\Api\RegistryController;
 
 /*
 |--------------------------------------------------------------------------
@@ -78,6 +80,14 @@
 
 // Reading endpoint for Python poller (temporarily without auth for testing)
 Route::post('/readings', [ReadingController::class, 'store']);
+Route::post('/readings/batch', [ReadingController::class, 'storeBatch']);
+
+// Edge alert evaluation by the Python poller (same access as /readings)
+Route::get('/alert-rules', [EdgeAlertController::class, 'rules']);
+Route::post('/alerts', [EdgeAlertController::class, 'store']);
+
+// Device/register registry the Python poller syncs config.json against
+Route::get('/registry', [RegistryController::class, 'index']);
 
 // Health check endpoint (no auth required)
 Route::get('/health', function () {
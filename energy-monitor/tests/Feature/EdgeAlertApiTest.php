@@ -0,0 +1,129 @@
+<?php
+
+namespace Tests\Feature;
+
+use App\Models\Device;
+use App\Models\Gateway;
+use App\Models\Register;
+use Illuminate\Foundation\Testing\RefreshDatabase;
+use Illuminate\Support\Facades\Notification;
+use Tests\TestCase;
+
+class EdgeAlertApiTest extends TestCase
+{
+    use RefreshDatabase;
+
+    protected Device $device;
+
+    public function setUp(): void
+    {
+        parent::setUp();
+        Notification::fake();
+
+        $gateway = Gateway::create([
+            'name' => 'Test Gateway',
+            'fixed_ip' => '192.168.1.100',
+            'sim_number' => '+1234567890',
+            'gsm_signal' => -70,
+            'gnss_location' => '40.7128,-74.0060'
+        ]);
+
+        $this->device = Device::create([
+            'name' => 'Test Device',
+            'slave_id' => 1,
+            'location_tag' => 'Building A',
+            'gateway_id' => $gateway->id
+        ]);
+    }
+
+    private function createRegister(string $parameter, ?string $normalRange, bool $critical): Register
+    {
+        return Register::create([
+            'device_id' => $this->device->id,
+            'parameter_name' => $parameter,
+            'register_address' => 40001,
+            'data_type' => 'float',
+            'unit' => 'V',
+            'scale' => 1.0,
+            'normal_range' => $normalRange,
+            'critical' => $critical,
+            'notes' => null
+        ]);
+    }
+
+    public function test_lists_threshold_rules_for_registers_with_normal_range()
+    {
+        $voltage = $this->createRegister('Voltage (L-N)', '220-240', true);
+        $this->createRegister('Current', null, false);
+
+        $response = $this->getJson('/api/alert-rules');
+
+        $response->assertStatus(200)
+            ->assertJsonCount(1, 'rules')
+            ->assertJsonPath('rules.0.register_id', $voltage->id)
+            ->assertJsonPath('rules.0.parameter', 'Voltage (L-N)')
+            ->assertJsonPath('rules.0.critical', true);
+
+        $rule = $response->json('rules.0');
+        $this->assertEquals(220, $rule['min']);
+        $this->assertEquals(240, $rule['max']);
+        $this->assertEquals(216, $rule['critical_min']);
+        $this->assertEquals(244, $rule['critical_max']);
+    }
+
+    public function test_stores_pushed_critical_alert()
+    {
+        $this->createRegister('Voltage (L-N)', '220-240', true);
+
+        $response = $this->postJson('/api/alerts', [
+            'device_id' => $this->device->id,
+            'parameter' => 'Voltage (L-N)',
+            'value' => 260.0,
+            'timestamp' => '2025-07-08T16:00:00Z',
+            'level' => 'critical'
+        ]);
+
+        $response->assertStatus(201)
+            ->assertJsonPath('data.severity', 'critical');
+
+        $this->assertDatabaseHas('alerts', [
+            'device_id' => $this->device->id,
+            'parameter_name' => 'Voltage (L-N)',
+            'severity' => 'critical',
+            'resolved' => false
+        ]);
+    }
+
+    public function test_rejects_unknown_alert_level()
+    {
+        $this->createRegister('Voltage (L-N)', '220-240', true);
+
+        $response = $this->postJson('/api/alerts', [
+            'device_id' => $this->device->id,
+            'parameter' => 'Voltage (L-N)',
+            'value' => 260.0,
+            'timestamp' => '2025-07-08T16:00:00Z',
+            'level' => 'panic'
+        ]);
+
+        $response->assertStatus(422);
+    }
+
+    public function test_reading_evaluated_at_the_edge_does_not_raise_threshold_alerts_again()
+    {
+        $this->createRegister('Voltage (L-N)', '220-240', true);
+
+        $response = $this->postJson('/api/readings', [
+            'device_id' => $this->device->id,
+            'parameter' => 'Voltage (L-N)',
+            'value' => 260.0,
+            'timestamp' => '2025-07-08T16:00:00Z',
+            'alerts_evaluated' => true
+        ]);
+
+        $response->assertStatus(201)
+            ->assertJsonPath('data.alerts_created', 0);
+
+        $this->assertDatabaseCount('alerts', 0);
+    }
+}
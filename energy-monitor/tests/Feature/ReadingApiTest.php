@@ -202,4 +202,148 @@ public function test_validation_fails_for_invalid_payload()
                 'errors'
             ]);
     }
+
+    public function test_stores_batch_and_reports_each_reading()
+    {
+        $gateway = Gateway::create([
+            'name' => 'Test Gateway',
+            'fixed_ip' => '192.168.1.100',
+            'sim_number' => '+1234567890',
+            'gsm_signal' => -70,
+            'gnss_location' => '40.7128,-74.0060'
+        ]);
+
+        $device = Device::create([
+            'name' => 'Test Device',
+            'slave_id' => 1,
+            'location_tag' => 'Building A',
+            'gateway_id' => $gateway->id
+        ]);
+
+        Register::create([
+            'device_id' => $device->id,
+            'parameter_name' => 'Voltage (L-N)',
+            'register_address' => 40001,
+            'data_type' => 'float',
+            'unit' => 'V',
+            'scale' => 1.0,
+            'normal_range' => '220-240',
+            'critical' => false,
+            'notes' => 'Line to Neutral Voltage'
+        ]);
+
+        $response = $this->postJson('/api/readings/batch', [
+            'readings' => [
+                [
+                    'device_id' => $device->id,
+                    'parameter' => 'Voltage (L-N)',
+                    'value' => 228.6,
+                    'timestamp' => '2025-07-08T16:00:00Z'
+                ],
+                [
+                    'device_id' => $device->id,
+                    'parameter' => 'Unknown Parameter',
+                    'value' => 1.0,
+                    'timestamp' => '2025-07-08T16:00:00Z'
+                ],
+                [
+                    'device_id' => $device->id,
+                    'parameter' => 'Voltage (L-N)',
+                    'value' => 'not_a_number',
+                    'timestamp' => '2025-07-08T16:00:00Z'
+                ]
+            ]
+        ]);
+
+        $response->assertStatus(200)
+            ->assertJsonPath('stored', 1)
+            ->assertJsonPath('failed', 2)
+            ->assertJsonPath('results.0.status', 201)
+            ->assertJsonPath('results.1.status', 404)
+            ->assertJsonPath('results.2.status', 422);
+
+        $this->assertDatabaseCount('readings', 1);
+    }
+
+    public function test_stores_quality_code_from_poller_validation()
+    {
+        $gateway = Gateway::create([
+            'name' => 'Test Gateway',
+            'fixed_ip' => '192.168.1.100',
+            'sim_number' => '+1234567890',
+            'gsm_signal' => -70,
+            'gnss_location' => '40.7128,-74.0060'
+        ]);
+
+        $device = Device::create([
+            'name' => 'Test Device',
+            'slave_id' => 1,
+            'location_tag' => 'Building A',
+            'gateway_id' => $gateway->id
+        ]);
+
+        $register = Register::create([
+            'device_id' => $device->id,
+            'parameter_name' => 'Voltage (L-N)',
+            'register_address' => 40001,
+            'data_type' => 'float',
+            'unit' => 'V',
+            'scale' => 1.0,
+            'normal_range' => '220-240',
+            'critical' => false,
+            'notes' => 'Line to Neutral Voltage'
+        ]);
+
+        $response = $this->postJson('/api/readings/batch', [
+            'readings' => [
+                [
+                    'device_id' => $device->id,
+                    'parameter' => 'Voltage (L-N)',
+                    'value' => 228.6,
+                    'timestamp' => '2025-07-08T16:00:00Z'
+                ],
+                [
+                    'device_id' => $device->id,
+                    'parameter' => 'Voltage (L-N)',
+                    'value' => 228.6,
+                    'quality' => 'stuck',
+                    'timestamp' => '2025-07-08T16:30:00Z'
+                ],
+                [
+                    'device_id' => $device->id,
+                    'parameter' => 'Voltage (L-N)',
+                    'value' => 228.6,
+                    'quality' => 'not_a_code',
+                    'timestamp' => '2025-07-08T17:00:00Z'
+                ]
+            ]
+        ]);
+
+        $response->assertStatus(200)
+            ->assertJsonPath('stored', 2)
+            ->assertJsonPath('results.2.status', 422);
+
+        $this->assertDatabaseHas('readings', [
+            'register_id' => $register->id,
+            'timestamp' => '2025-07-08 16:00:00',
+            'quality' => 'good'
+        ]);
+        $this->assertDatabaseHas('readings', [
+            'register_id' => $register->id,
+            'timestamp' => '2025-07-08 16:30:00',
+            'quality' => 'stuck'
+        ]);
+    }
+
+    public function test_batch_validation_fails_without_readings()
+    {
+        $response = $this->postJson('/api/readings/batch', ['readings' => []]);
+
+        $response->assertStatus(422)
+            ->assertJsonStructure([
+                'success',
+                'message',
+                'errors'
+            ]);
+    }
 } 
\ No newline at end of file
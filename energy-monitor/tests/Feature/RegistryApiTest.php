@@ -0,0 +1,124 @@
+<?php
+
+namespace Tests\Feature;
+
+use App\Models\Device;
+use App\Models\Gateway;
+use App\Models\Register;
+use Illuminate\Foundation\Testing\RefreshDatabase;
+use Tests\TestCase;
+
+class RegistryApiTest extends TestCase
+{
+    use RefreshDatabase;
+
+    protected Device $device;
+    protected Register $register;
+
+    public function setUp(): void
+    {
+        parent::setUp();
+
+        $gateway = Gateway::create([
+            'name' => 'Test Gateway',
+            'fixed_ip' => '192.168.1.100',
+            'sim_number' => '+1234567890',
+            'gsm_signal' => -70,
+            'gnss_location' => '40.7128,-74.0060'
+        ]);
+
+        $this->device = Device::create([
+            'name' => 'Test Device',
+            'slave_id' => 1,
+            'location_tag' => 'Building A',
+            'gateway_id' => $gateway->id
+        ]);
+
+        $this->register = Register::create([
+            'device_id' => $this->device->id,
+            'parameter_name' => 'Voltage (L-N)',
+            'register_address' => 40001,
+            'data_type' => 'float',
+            'unit' => 'V',
+            'scale' => 1.0,
+            'normal_range' => '220-240',
+            'critical' => false,
+            'notes' => 'Line to Neutral Voltage'
+        ]);
+    }
+
+    public function test_returns_devices_with_their_registers()
+    {
+        $response = $this->getJson('/api/registry');
+
+        $response->assertStatus(200)
+            ->assertHeader('ETag')
+            ->assertJsonPath('devices.0.id', $this->device->id)
+            ->assertJsonPath('devices.0.gateway_ip', '192.168.1.100')
+            ->assertJsonPath('devices.0.registers.0.id', $this->register->id)
+            ->assertJsonPath('devices.0.registers.0.parameter_name', 'Voltage (L-N)');
+    }
+
+    public function test_returns_not_modified_for_matching_etag()
+    {
+        $etag = $this->getJson('/api/registry')->headers->get('ETag');
+
+        $this->getJson('/api/registry', ['If-None-Match' => $etag])
+            ->assertStatus(304);
+
+        Register::create([
+            'device_id' => $this->device->id,
+            'parameter_name' => 'Current',
+            'register_address' => 40003,
+            'data_type' => 'float',
+            'unit' => 'A',
+            'scale' => 1.0,
+            'normal_range' => null,
+            'critical' => false,
+            'notes' => null
+        ]);
+
+        $this->getJson('/api/registry', ['If-None-Match' => $etag])
+            ->assertStatus(200);
+    }
+
+    public function test_stores_reading_by_register_id()
+    {
+        $response = $this->postJson('/api/readings', [
+            'device_id' => $this->device->id,
+            'register_id' => $this->register->id,
+            'parameter' => 'Voltage (L-N)',
+            'value' => 228.6,
+            'timestamp' => '2025-07-08T16:00:00Z'
+        ]);
+
+        $response->assertStatus(201);
+
+        $this->assertDatabaseHas('readings', [
+            'device_id' => $this->device->id,
+            'register_id' => $this->register->id,
+            'value' => 228.6
+        ]);
+    }
+
+    public function test_rejects_register_id_of_another_device()
+    {
+        $other = Device::create([
+            'name' => 'Other Device',
+            'slave_id' => 2,
+            'location_tag' => 'Building B',
+            'gateway_id' => $this->device->gateway_id
+        ]);
+
+        $response = $this->postJson('/api/readings', [
+            'device_id' => $other->id,
+            'register_id' => $this->register->id,
+            'parameter' => 'Voltage (L-N)',
+            'value' => 228.6,
+            'timestamp' => '2025-07-08T16:00:00Z'
+        ]);
+
+        $response->assertStatus(404);
+        $this->assertDatabaseCount('readings', 0);
+    }
+}
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Edge threshold alert evaluation for the Modbus polling service
+Checks every reading against the dashboard's alert rules and pushes violations immediately
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from quality import IMPLAUSIBLE
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ThresholdCheck:
+    """One band of a register's alert rule, with hysteresis
+
+    The alarm raises when the value leaves [low, high] and clears only once it
+    is back inside the band by `deadband`, so a value hovering at a limit
+    raises once instead of on every reading.
+    """
+    level: str
+    low: float
+    high: float
+    deadband: float
+    active: bool = False
+
+    def update(self, value: float) -> Optional[bool]:
+        """True when the alarm raises, False when it clears, None otherwise"""
+        if not self.active and (value < self.low or value > self.high):
+            self.active = True
+            return True
+        if self.active and self.low + self.deadband <= value <= self.high - self.deadband:
+            self.active = False
+            return False
+        return None
+
+
+def compile_rule(rule: Dict[str, Any], hysteresis: float) -> List[ThresholdCheck]:
+    """Threshold checks for one rule from GET /api/alert-rules"""
+    low, high = float(rule['min']), float(rule['max'])
+    deadband = (high - low) * hysteresis
+    checks = [ThresholdCheck('out_of_range', low, high, deadband)]
+    if rule.get('critical') and rule.get('critical_min') is not None:
+        checks.append(ThresholdCheck(
+            'critical', float(rule['critical_min']), float(rule['critical_max']), deadband
+        ))
+    return checks
+
+
+class AlertEvaluator:
+    """Evaluates alert rules inline and pushes raised alerts on a fast lane
+
+    Alerts go out from a dedicated thread with its own HTTP session, so they
+    never wait behind the cycle's reading upload. The rules are fetched on a
+    background thread as well; evaluation only reads the cached rules, so an
+    unreachable API never slows polling down. An alert the API could not
+    be reached for is kept (and checkpointed) until it is sent; one that
+    could not be queued or was rejected re-arms its alarm, so the next
+    reading outside the band raises it again.
+    """
+
+    def __init__(self, rules_url: str, push_url: str, hysteresis: float = 0.02,
+                 refresh_interval: float = 300.0, queue_size: int = 1000):
+        self.rules_url = rules_url
+        self.push_url = push_url
+        self.hysteresis = hysteresis
+        self.refresh_interval = refresh_interval
+        self.checks: Dict[Tuple[int, str], List[ThresholdCheck]] = {}
+        self.rules_loaded_at: Optional[float] = None
+        self.rules_failed_at: Optional[float] = None
+        self.rule_failures = 0
+        # Alarms restored from a checkpoint before the rules were loaded
+        self.restored_active: List[Tuple[int, str, str]] = []
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.outbox: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.unsent: List[Dict[str, Any]] = []
+        self.stats = {"raised": 0, "cleared": 0, "pushed": 0, "push_failures": 0}
+        self.thread = threading.Thread(target=self._push_loop, name='alert-push', daemon=True)
+        self.thread.start()
+        self.rules_thread = threading.Thread(target=self._rules_loop, name='alert-rules', daemon=True)
+        self.rules_thread.start()
+
+    @classmethod
+    def from_env(cls, api_url: str) -> Optional['AlertEvaluator']:
+        """Build an evaluator from EDGE_ALERTS* variables; None when disabled"""
+        if os.getenv('EDGE_ALERTS', 'false').lower() != 'true':
+            return None
+        base = api_url.rsplit('/', 1)[0]
+        return cls(
+            os.getenv('EDGE_ALERTS_RULES_URL') or f"{base}/alert-rules",
+            os.getenv('EDGE_ALERTS_PUSH_URL') or f"{base}/alerts",
+            hysteresis=float(os.getenv('EDGE_ALERTS_HYSTERESIS', '0.02')),
+            refresh_interval=float(os.getenv('EDGE_ALERTS_REFRESH_SECONDS', '300'))
+        )
+
+    def _rules_loop(self):
+        """Keep the rules fresh; after a failed fetch retry sooner, backing off up to the refresh interval"""
+        while not self.stopping.is_set():
+            if self.refresh_rules():
+                delay = self.refresh_interval
+            else:
+                delay = min(self.refresh_interval, 5 * 2 ** min(self.rule_failures, 10))
+            self.stopping.wait(delay)
+
+    def refresh_rules(self) -> bool:
+        """Fetch the alert rules now; False (and the time recorded) if the API could not provide them"""
+        import requests
+
+        try:
+            response = requests.get(self.rules_url, timeout=10)
+            response.raise_for_status()
+            rules = response.json()['rules']
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            self.rules_failed_at = time.monotonic()
+            self.rule_failures += 1
+            logger.error(f"Could not load alert rules from {self.rules_url} "
+                         f"({self.rule_failures} failed attempts): {e}")
+            return False
+
+        checks = {}
+        for rule in rules:
+            try:
+                checks[(int(rule['device_id']), rule['parameter'])] = compile_rule(rule, self.hysteresis)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Skipping invalid alert rule {rule}: {e}")
+
+        with self.lock:
+            # Keep the alarm state of bands that did not change
+            for key, new_checks in checks.items():
+                old = {(check.level, check.low, check.high): check for check in self.checks.get(key, [])}
+                for check in new_checks:
+                    previous = old.get((check.level, check.low, check.high))
+                    if previous is not None:
+                        check.active = previous.active
+            self.checks = checks
+            self._apply_restored()
+            self.rules_loaded_at = time.monotonic()
+            self.rule_failures = 0
+        logger.info(f"Loaded {len(checks)} alert rules")
+        return True
+
+    def _apply_restored(self):
+        """Re-raise alarms restored by import_state() once their rules exist (lock held)"""
+        for device_id, parameter, level in self.restored_active:
+            for check in self.checks.get((device_id, parameter), []):
+                if check.level == level:
+                    check.active = True
+        self.restored_active = []
+
+    def evaluate(self, readings: List[Dict[str, Any]]):
+        """Check readings against the rules, queueing raised alerts for push
+
+        Readings are flagged `alerts_evaluated` so the API does not raise the
+        same threshold alerts again when they are uploaded.
+        """
+        if self.rules_loaded_at is None:
+            # Rules not loaded yet: readings stay unflagged and the API checks them
+            return
+
+        with self.lock:
+            # Alerts that could not be pushed before go out again first
+            while self.unsent:
+                try:
+                    self.outbox.put_nowait(self.unsent[0])
+                except queue.Full:
+                    break
+                self.unsent.pop(0)
+
+            for reading in readings:
+                reading['alerts_evaluated'] = True
+                if reading.get('quality') in IMPLAUSIBLE:
+                    continue
+                for check in self.checks.get((reading['device_id'], reading['parameter']), []):
+                    change = check.update(reading['value'])
+                    if change is None:
+                        continue
+                    if not change:
+                        self.stats["cleared"] += 1
+                        logger.info(f"{check.level} alarm cleared: device {reading['device_id']} "
+                                    f"{reading['parameter']} = {reading['value']}")
+                        continue
+
+                    self.stats["raised"] += 1
+                    logger.warning(f"{check.level} alarm raised: device {reading['device_id']} "
+                                   f"{reading['parameter']} = {reading['value']}")
+                    try:
+                        self.outbox.put_nowait({
+                            "device_id": reading['device_id'],
+                            "parameter": reading['parameter'],
+                            "value": reading['value'],
+                            "timestamp": reading['timestamp'],
+                            "level": check.level
+                        })
+                    except queue.Full:
+                        self.stats["push_failures"] += 1
+                        check.active = False
+                        logger.error(f"Alert queue full, {check.level} alert for device {reading['device_id']} "
+                                     f"{reading['parameter']} will be raised again by the next reading")
+
+    def _push_loop(self):
+        import requests
+
+        session = requests.Session()
+        while True:
+            alert = self.outbox.get()
+            if alert is None:
+                break
+            for attempt in range(3):
+                try:
+                    response = session.post(self.push_url, json=alert, timeout=10)
+                    if response.status_code < 500:
+                        break
+                    logger.error(f"Alert API error {response.status_code}: {response.text}")
+                except requests.exceptions.RequestException as e:
+                    logger.error(f"Request error pushing alert: {e}")
+                time.sleep(2 ** attempt)
+            else:
+                self.stats["push_failures"] += 1
+                with self.lock:
+                    keep = len(self.unsent) < self.outbox.maxsize
+                    if keep:
+                        self.unsent.append(alert)
+                if not keep:
+                    self._rearm(alert)
+                continue
+
+            if response.status_code in (200, 201):
+                self.stats["pushed"] += 1
+            else:
+                self.stats["push_failures"] += 1
+                logger.error(f"Alert rejected ({response.status_code}): {response.text}")
+                self._rearm(alert)
+
+    def _rearm(self, alert: Dict[str, Any]):
+        """Clear the alarm behind an alert that was not delivered, so it can raise again"""
+        with self.lock:
+            for check in self.checks.get((alert['device_id'], alert['parameter']), []):
+                if check.level == alert['level']:
+                    check.active = False
+
+    def export_state(self) -> Dict[str, Any]:
+        """Raised alarms, so a restart does not raise them again, and alerts not sent yet"""
+        with self.lock:
+            return {
+                "active": [
+                    [device_id, parameter, check.level]
+                    for (device_id, parameter), checks in self.checks.items()
+                    for check in checks if check.active
+                ] + [list(alarm) for alarm in self.restored_active],
+                "unsent": self.unsent + [alert for alert in list(self.outbox.queue) if alert is not None]
+            }
+
+    def import_state(self, state):
+        """Restore alarms from export_state(); applied once the rules are loaded"""
+        if isinstance(state, list):
+            # Checkpoints written before unsent alerts were kept
+            state = {"active": state}
+        with self.lock:
+            self.restored_active = [tuple(alarm) for alarm in state.get("active", [])]
+            if self.rules_loaded_at is not None:
+                self._apply_restored()
+            self.unsent.extend(state.get("unsent", []))
+
+    def close(self):
+        """Stop the rules refresh, and the push thread after the queued alerts are sent"""
+        self.stopping.set()
+        self.outbox.put(None)
+        self.thread.join(30)
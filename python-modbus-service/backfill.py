@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Load-profile backfill for the Modbus polling service
+Recovers readings missed during an outage from the meter's own interval log
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from connections import PRIORITY_BACKFILL
+from device_config import DeviceConfig, RegisterConfig
+
+logger = logging.getLogger(__name__)
+
+API_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+TIMESTAMP_WIDTHS = {'unix32': 2, 'datetime': 6}
+
+
+@dataclass
+class LoadProfileLayout:
+    """Where and how one meter model keeps its interval log
+
+    Entry `i` starts at `first_entry_register + i * entry_words`. With
+    `newest_first` entry 0 is the latest interval, otherwise the latest is
+    the last valid entry. `count_register`, if set, holds the number of
+    valid entries; without it all `max_entries` are read.
+    """
+    name: str
+    first_entry_register: int
+    entry_words: int
+    max_entries: int
+    fields: List[RegisterConfig]  # address is the word offset within an entry
+    timestamp_offset: int = 0
+    timestamp_type: str = 'unix32'  # 'unix32' seconds, or 'datetime' as Y, M, D, h, m, s words
+    utc_offset_minutes: int = 0  # meter clock minus UTC
+    newest_first: bool = True
+    count_register: Optional[int] = None
+
+    def entry_time(self, words: List[int]) -> Optional[float]:
+        """Epoch seconds of an entry, or None for an empty slot"""
+        offset = self.timestamp_offset
+        try:
+            if self.timestamp_type == 'unix32':
+                seconds = (words[offset] << 16) | words[offset + 1]
+                if seconds in (0, 0xFFFFFFFF):
+                    return None
+                moment = datetime.fromtimestamp(seconds, timezone.utc)
+            else:
+                moment = datetime(*words[offset:offset + 6], tzinfo=timezone.utc)
+        except (ValueError, OverflowError):
+            return None
+        return (moment - timedelta(minutes=self.utc_offset_minutes)).timestamp()
+
+
+def parse_layout(name: str, data: Dict[str, Any]) -> LoadProfileLayout:
+    """Build a layout from its entry in the layouts file"""
+    timestamp = data.get('timestamp', {})
+    timestamp_type = timestamp.get('type', 'unix32')
+    if timestamp_type not in TIMESTAMP_WIDTHS:
+        raise ValueError(f"Invalid timestamp type '{timestamp_type}' in load profile {name}, "
+                         f"expected one of {sorted(TIMESTAMP_WIDTHS)}")
+    order = data.get('order', 'newest_first')
+    if order not in ('newest_first', 'oldest_first'):
+        raise ValueError(f"Invalid order '{order}' in load profile {name}")
+
+    entry_words = data['entry_words']
+    fields = []
+    for field_data in data['fields']:
+        register = RegisterConfig(
+            address=field_data['offset'],
+            parameter=field_data['parameter'],
+            data_type=field_data.get('data_type', 'float'),
+            scale=field_data.get('scale', 1.0),
+            unit=field_data.get('unit', ''),
+            description=field_data.get('description', '')
+        )
+        if register.address + register.width > entry_words:
+            raise ValueError(f"Field {register.parameter} does not fit in a {entry_words}-word entry of {name}")
+        fields.append(register)
+
+    return LoadProfileLayout(
+        name=name,
+        first_entry_register=data['first_entry_register'],
+        entry_words=entry_words,
+        max_entries=data['max_entries'],
+        fields=fields,
+        timestamp_offset=timestamp.get('offset', 0),
+        timestamp_type=timestamp_type,
+        utc_offset_minutes=timestamp.get('utc_offset_minutes', 0),
+        newest_first=order == 'newest_first',
+        count_register=data.get('count_register')
+    )
+
+
+def load_layouts(path: str) -> Dict[str, LoadProfileLayout]:
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return {name: parse_layout(name, layout) for name, layout in data.items()}
+
+
+def api_time(moment: float) -> str:
+    return datetime.fromtimestamp(moment, timezone.utc).strftime(API_TIMESTAMP_FORMAT)
+
+
+def epoch(timestamp: str) -> float:
+    return datetime.strptime(timestamp, API_TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+
+
+class Backfiller:
+    """Reads back a device's load profile for the intervals it was unreachable
+
+    A job covers (since, until): the last successful poll before a gap and
+    the first one after it. Jobs run on a background thread that takes the
+    gateway at PRIORITY_BACKFILL one block at a time, so live polling,
+    commands and on-demand reads always go first. Entries are read newest
+    first, and a job's `until` moves back as entries are recovered, so an
+    interrupted job resumes where it stopped.
+    """
+
+    def __init__(self, poller, layouts: Dict[str, LoadProfileLayout], min_gap: float = 3600.0,
+                 retry_interval: float = 300.0, max_recovered: int = 50000):
+        self.poller = poller
+        self.layouts = layouts
+        self.min_gap = min_gap
+        self.retry_interval = retry_interval
+        self.max_recovered = max_recovered
+        self.lock = threading.Lock()
+        self.jobs: List[List[float]] = []  # [device_id, since, until]
+        self.recovered: List[Dict[str, Any]] = []
+        self.stats = {"jobs_done": 0, "readings_recovered": 0, "read_errors": 0}
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='backfill', daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def from_env(cls, poller) -> Optional['Backfiller']:
+        """Build a backfiller if any device names a load profile; layouts come from LOAD_PROFILE_LAYOUTS"""
+        if not any(device.load_profile for device in poller.devices):
+            return None
+        path = os.getenv('LOAD_PROFILE_LAYOUTS', 'load_profiles.json')
+        try:
+            layouts = load_layouts(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Load-profile backfill disabled, could not load layouts from {path}: {e}")
+            return None
+        for device in poller.devices:
+            if device.load_profile and device.load_profile not in layouts:
+                logger.error(f"Device {device.device_id} uses unknown load profile {device.load_profile}")
+        return cls(
+            poller,
+            layouts,
+            min_gap=float(os.getenv('BACKFILL_MIN_GAP_SECONDS', '3600')),
+            retry_interval=float(os.getenv('BACKFILL_RETRY_SECONDS', '300'))
+        )
+
+    def check(self, device: DeviceConfig, previous_success: Optional[str], current: str):
+        """Queue a job if the device was out of contact for longer than `min_gap`"""
+        if previous_success is None or device.load_profile not in self.layouts:
+            return
+        since, until = epoch(previous_success), epoch(current)
+        if until - since < self.min_gap:
+            return
+        with self.lock:
+            self.jobs.append([device.device_id, since, until])
+        logger.info(f"Device {device.device_id} missed {previous_success} to {current}, "
+                    f"queued load-profile backfill")
+        self.wake.set()
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """Readings recovered since the last call, oldest first"""
+        with self.lock:
+            recovered, self.recovered = self.recovered, []
+        return sorted(recovered, key=lambda reading: reading['timestamp'])
+
+    def _run(self):
+        while not self.stopped.is_set():
+            with self.lock:
+                pending = list(self.jobs)
+            failed = False
+            for job in pending:
+                if self.stopped.is_set():
+                    return
+                device = self.poller.device_by_id(job[0])
+                try:
+                    if device is None or device.load_profile not in self.layouts \
+                            or self._backfill(device, self.layouts[device.load_profile], job):
+                        with self.lock:
+                            self.jobs.remove(job)
+                        self.stats["jobs_done"] += 1
+                    else:
+                        failed = True
+                except Exception as e:
+                    logger.error(f"Load-profile backfill of device {job[0]} failed: {e}")
+                    self.stats["read_errors"] += 1
+                    failed = True
+            self.wake.wait(self.retry_interval if failed else None)
+            self.wake.clear()
+
+    def _read(self, device: DeviceConfig, address: int, count: int) -> Optional[List[int]]:
+        with self.poller.pool.connection(device.ip, device.port, device.timeout, PRIORITY_BACKFILL) as client:
+            if client is None:
+                return None
+            result = client.read_holding_registers(address=address, count=count, slave=device.slave_id)
+        if result.isError():
+            logger.warning(f"Error reading load profile of device {device.device_id} at {address}: {result}")
+            self.stats["read_errors"] += 1
+            return None
+        return result.registers
+
+    def _backfill(self, device: DeviceConfig, layout: LoadProfileLayout, job: List[float]) -> bool:
+        """Recover the intervals of one job; False to retry later"""
+        entries = layout.max_entries
+        if layout.count_register is not None:
+            words = self._read(device, layout.count_register, 1)
+            if words is None:
+                return False
+            entries = min(entries, words[0])
+
+        per_read = max(1, device.max_block_registers // layout.entry_words)
+        newest = 0
+        while newest < entries:
+            if self.stopped.is_set():
+                return False
+            _, since, until = job
+            count = min(per_read, entries - newest)
+            # Entry indices newest, newest+1, ... counted back from the latest interval
+            first = newest if layout.newest_first else entries - newest - count
+            words = self._read(device, layout.first_entry_register + first * layout.entry_words,
+                               count * layout.entry_words)
+            if words is None:
+                return False
+
+            readings = []
+            oldest = until
+            reached_start = False
+            for slot in range(count):
+                index = first + slot
+                start = (index - first) * layout.entry_words
+                entry = words[start:start + layout.entry_words]
+                moment = layout.entry_time(entry)
+                if moment is None:
+                    continue
+                if moment <= since:
+                    reached_start = True
+                    continue
+                if moment >= until:
+                    continue
+                oldest = min(oldest, moment)
+                address = layout.first_entry_register + index * layout.entry_words
+                for field in layout.fields:
+                    reading = self.poller.make_reading(device, replace(field, address=address + field.address),
+                                                       entry[field.address:field.address + field.width],
+                                                       api_time(moment))
+                    # Unwritten or corrupt slots decode to NaN, which cannot be uploaded
+                    if math.isfinite(reading['value']):
+                        readings.append(reading)
+
+            with self.lock:
+                if len(self.recovered) + len(readings) > self.max_recovered:
+                    # Wait until the poller has taken what is already recovered
+                    return False
+                self.recovered.extend(readings)
+                job[2] = min(job[2], oldest)
+            self.stats["readings_recovered"] += len(readings)
+            if reached_start:
+                break
+            newest += count
+
+        logger.info(f"Load-profile backfill of device {device.device_id} done")
+        return True
+
+    def export_state(self) -> Dict[str, Any]:
+        """Unfinished jobs and recovered readings not yet drained"""
+        with self.lock:
+            return {
+                "jobs": [list(job) for job in self.jobs],
+                "recovered": list(self.recovered)
+            }
+
+    def import_state(self, state: Dict[str, Any]):
+        with self.lock:
+            self.jobs.extend([int(device_id), since, until] for device_id, since, until in state.get("jobs", []))
+            self.recovered.extend(state.get("recovered", []))
+        if self.jobs:
+            self.wake.set()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"jobs_pending": len(self.jobs), "readings_waiting": len(self.recovered), **self.stats}
+
+    def close(self):
+        self.stopped.set()
+        self.wake.set()
+        self.thread.join(timeout=5)
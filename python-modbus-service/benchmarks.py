@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+CPU benchmarks for the poller's hot paths
+Runs offline on fixed synthetic configs and compares results with a stored baseline
+
+    python benchmarks.py --output results.json
+    python benchmarks.py --save-baseline baseline.json
+    python benchmarks.py --baseline baseline.json --tolerance 0.15
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+from compression import CompressionStage
+from device_config import load_cached_plan, parse_config, store_cached_plan, config_digest
+from poller import API_TIMESTAMP_FORMAT, ModbusPoller
+
+SIZES = (10, 1000, 100000)
+REGISTERS_PER_DEVICE = 100
+DATA_TYPES = ('float', 'uint32', 'uint16', 'int')
+TIMESTAMP = '2025-07-08T16:00:00Z'
+
+
+def synthetic_config(registers: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Deterministic config.json content with `registers` registers"""
+    rng = random.Random(seed)
+    config = []
+    for device_index in range(max(1, (registers + REGISTERS_PER_DEVICE - 1) // REGISTERS_PER_DEVICE)):
+        count = min(REGISTERS_PER_DEVICE, registers - device_index * REGISTERS_PER_DEVICE)
+        address = 40001
+        device_registers = []
+        for index in range(count):
+            data_type = DATA_TYPES[index % len(DATA_TYPES)]
+            device_registers.append({
+                "address": address,
+                "parameter": f"Parameter {index}",
+                "data_type": data_type,
+                "scale": rng.choice([1.0, 0.1, 0.01]),
+                "unit": rng.choice(["V", "A", "kW", "kWh", "Hz"]),
+                "description": f"Synthetic register {index}",
+                "compression": {"deviation": 0.5, "max_interval": 3600}
+            })
+            # Occasional gaps split the device into several block reads
+            address += (2 if data_type in ('float', 'uint32') else 1) + (5 if rng.random() < 0.05 else 0)
+        config.append({
+            "device_id": device_index + 1,
+            "ip": f"10.{device_index // 65536 % 256}.{device_index // 256 % 256}.{device_index % 256}",
+            "port": 502,
+            "slave_id": 1,
+            "timeout": 10,
+            "registers": device_registers
+        })
+    return config
+
+
+def bare_poller() -> ModbusPoller:
+    """A poller without connections, API clients or env-driven features"""
+    poller = ModbusPoller.__new__(ModbusPoller)
+    poller.shard = None
+    poller.compression = CompressionStage()
+    return poller
+
+
+def block_words(devices) -> List[Tuple[Any, Any, List[int]]]:
+    """(device, block, register words) for every block, as a gateway would return them"""
+    rng = random.Random(7)
+    return [
+        (device, block, [rng.randrange(0x10000) for _ in range(block.count)])
+        for device in devices
+        for block in device.read_plan
+    ]
+
+
+def time_case(setup: Callable[[], Any], run: Callable[[Any], Any], repeat: int,
+              min_time: float = 0.02) -> List[float]:
+    """Seconds per run; setup() is excluded from the timing
+
+    Each of the `repeat` samples averages enough runs to last `min_time`,
+    so cases on small datasets are not lost in timer resolution.
+    """
+    def once() -> float:
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        return time.perf_counter() - start
+
+    # The first run warms caches and sizes the loop
+    runs = max(1, int(min_time / max(once(), 1e-9)))
+    return [sum(once() for _ in range(runs)) / runs for _ in range(repeat)]
+
+
+def benchmark_cases(size: int, workdir: str) -> Dict[str, Tuple[Callable, Callable]]:
+    """name -> (setup, run) for one dataset size"""
+    config = synthetic_config(size)
+    raw = json.dumps(config).encode('utf-8')
+    config_path = os.path.join(workdir, f"config-{size}.json")
+    cache_path = f"{config_path}.cache"
+    with open(config_path, 'wb') as f:
+        f.write(raw)
+    devices = parse_config(config)
+    store_cached_plan(cache_path, config_digest(raw), devices)
+
+    poller = bare_poller()
+    poller.config_file = config_path
+    words = block_words(devices)
+    rng = random.Random(size)
+    raw_values = [(rng.randrange(1 << 32), DATA_TYPES[i % len(DATA_TYPES)]) for i in range(size)]
+
+    def readings_of(poller: ModbusPoller):
+        return [
+            poller.make_reading(device, register, values[offset:offset + register.width], TIMESTAMP)
+            for device, block, values in words
+            for offset, register in block.registers
+        ]
+
+    readings = readings_of(poller)
+    by_device = {device.device_id: [] for device in devices}
+    for reading in readings:
+        by_device[reading['device_id']].append(reading)
+
+    def load_config(_):
+        os.environ['CONFIG_CACHE_PATH'] = ''
+        poller.load_config()
+
+    def load_cached(_):
+        load_cached_plan(cache_path, config_digest(raw))
+
+    def decode(_):
+        for raw_value, data_type in raw_values:
+            poller.decode_register_value(raw_value, data_type, 0.1)
+
+    def serialize_single(_):
+        for reading in readings:
+            json.dumps(reading)
+
+    def serialize_batch(_):
+        json.dumps({"readings": readings})
+
+    def fresh_poller():
+        fresh = bare_poller()
+        # Two earlier samples so the third mostly falls inside the corridor
+        for step in (-2, -1):
+            moment = datetime(2025, 7, 8, 16, tzinfo=timezone.utc).timestamp() + step * 1800
+            stamp = datetime.fromtimestamp(moment, timezone.utc).strftime(API_TIMESTAMP_FORMAT)
+            for device in devices:
+                fresh.compress_readings(device, [dict(reading, timestamp=stamp)
+                                                 for reading in by_device[device.device_id]])
+        return fresh
+
+    def compress(fresh: ModbusPoller):
+        for device in devices:
+            fresh.compress_readings(device, by_device[device.device_id])
+
+    return {
+        "load_config": (lambda: None, load_config),
+        "load_cached_plan": (lambda: None, load_cached),
+        "decode_register_value": (lambda: None, decode),
+        "make_reading": (lambda: None, lambda _: readings_of(poller)),
+        "json_single": (lambda: None, serialize_single),
+        "json_batch": (lambda: None, serialize_batch),
+        "compress_readings": (fresh_poller, compress),
+    }
+
+
+def run_benchmarks(sizes, repeat: int, only: List[str]) -> Dict[str, Any]:
+    results = {}
+    previous_cache = os.environ.get('CONFIG_CACHE_PATH')
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            for size in sizes:
+                for name, (setup, run) in benchmark_cases(size, workdir).items():
+                    if only and name not in only:
+                        continue
+                    # Fewer repeats for the large dataset keep the suite quick
+                    timings = time_case(setup, run, repeat if size < 100000 else max(3, repeat // 2))
+                    best = min(timings)
+                    key = f"{name}[{size}]"
+                    results[key] = {
+                        "case": name,
+                        "registers": size,
+                        "min_s": best,
+                        "median_s": statistics.median(timings),
+                        "ns_per_register": best / size * 1e9,
+                        "repeat": len(timings)
+                    }
+                    print(f"{key:<32} {best * 1000:10.3f} ms  {best / size * 1e9:10.1f} ns/register",
+                          file=sys.stderr)
+        finally:
+            if previous_cache is None:
+                os.environ.pop('CONFIG_CACHE_PATH', None)
+            else:
+                os.environ['CONFIG_CACHE_PATH'] = previous_cache
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "created": datetime.now(timezone.utc).strftime(API_TIMESTAMP_FORMAT)
+        },
+        "results": results
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Cases slower than the baseline by more than `tolerance` (0.15 = 15%)"""
+    regressions = []
+    for key, current in results["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if base is None:
+            continue
+        change = current["min_s"] / base["min_s"] - 1
+        current["baseline_min_s"] = base["min_s"]
+        current["change"] = round(change, 4)
+        status = "REGRESSION" if change > tolerance else "ok"
+        print(f"{key:<32} {change * 100:+7.1f}%  {status}", file=sys.stderr)
+        if change > tolerance:
+            regressions.append(f"{key}: {change * 100:+.1f}% vs baseline (limit {tolerance * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the poller's CPU-bound paths")
+    parser.add_argument('--sizes', default=','.join(str(size) for size in SIZES),
+                        help='comma-separated register counts (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=7, help='timed runs per case, best is reported')
+    parser.add_argument('--only', default='', help='comma-separated case names to run')
+    parser.add_argument('--output', help='write results as JSON to this file (default: stdout)')
+    parser.add_argument('--save-baseline', metavar='PATH', help='also store the results as a baseline')
+    parser.add_argument('--baseline', metavar='PATH', help='compare with a stored baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='allowed slowdown against the baseline before failing (default: %(default)s)')
+    args = parser.parse_args()
+    # Keep the poller's per-call logging out of the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    only = [name for name in args.only.split(',') if name]
+    results = run_benchmarks(sizes, args.repeat, only)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results["regressions"] = regressions
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            f.write(output)
+
+    if regressions:
+        print(f"{len(regressions)} benchmark regressions:", file=sys.stderr)
+        for regression in regressions:
+            print(f"  {regression}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Modbus TCP frame capture for the polling service
+Records the raw request and response bytes exchanged with each gateway, with timing
+
+File layout: segments of a header (magic, wall-clock start in ns) followed by
+records of (ns since start, kind, gateway index, length, bytes). Each run of
+the poller appends a segment. A gateway record names the "host:port" behind
+an index before that index is first used in its segment.
+"""
+
+import logging
+import os
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MBCAP\x01'
+HEADER = struct.Struct('>Q')
+RECORD = struct.Struct('>QBHH')
+
+KIND_GATEWAY = 0
+KIND_REQUEST = 1
+KIND_RESPONSE = 2
+KIND_CLOSE = 3
+
+
+@dataclass
+class Exchange:
+    """One request to a gateway and what came back"""
+    request: bytes
+    response: Optional[bytes]  # None when the gateway did not answer
+    latency: float  # seconds until the last response byte, or until the client gave up
+    offset: float  # seconds from the start of the capture to the request
+
+
+class FrameRecorder:
+    """Appends the frames of every wrapped client to a capture file
+
+    Clients are wrapped by replacing their `send`/`recv`/`close` methods, so
+    the bytes are exactly those on the wire, whatever pymodbus builds.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 100 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.file = None
+        self.gateways: Dict[str, int] = {}
+        self.start = 0
+
+    @classmethod
+    def from_env(cls, shard: Optional[Tuple[int, int]] = None) -> Optional['FrameRecorder']:
+        """Build a recorder from MODBUS_CAPTURE_* variables; None while MODBUS_CAPTURE_FILE is unset"""
+        path = os.getenv('MODBUS_CAPTURE_FILE')
+        if not path:
+            return None
+        if shard:
+            # Each worker process writes its own file
+            path = f"{path}.{shard[0]}"
+        return cls(path, max_bytes=int(os.getenv('MODBUS_CAPTURE_MAX_MB', '100')) * 1024 * 1024)
+
+    def _open(self):
+        if self.file is not None and self.file.tell() > self.max_bytes:
+            self.file.close()
+            self.file = None
+            os.replace(self.path, f"{self.path}.1")
+        if self.file is None:
+            self.file = open(self.path, 'ab')
+            self.gateways = {}
+            self.start = time.perf_counter_ns()
+            self.file.write(MAGIC + HEADER.pack(time.time_ns()))
+
+    def _write(self, kind: int, gateway: str, data: bytes):
+        with self.lock:
+            try:
+                self._open()
+                now = time.perf_counter_ns()
+                index = self.gateways.get(gateway)
+                if index is None:
+                    index = self.gateways[gateway] = len(self.gateways)
+                    name = gateway.encode('utf-8')
+                    self.file.write(RECORD.pack(now - self.start, KIND_GATEWAY, index, len(name)) + name)
+                self.file.write(RECORD.pack(now - self.start, kind, index, len(data)) + data)
+            except OSError as e:
+                logger.error(f"Could not write Modbus capture {self.path}: {e}")
+
+    def attach(self, client, gateway: str):
+        """Record everything `client` sends and receives as `gateway`"""
+        send, recv, close = client.send, client.recv, client.close
+
+        def recording_send(request):
+            self._write(KIND_REQUEST, gateway, bytes(request))
+            return send(request)
+
+        def recording_recv(size):
+            data = recv(size)
+            if data:
+                self._write(KIND_RESPONSE, gateway, bytes(data))
+            return data
+
+        def recording_close():
+            self._write(KIND_CLOSE, gateway, b'')
+            return close()
+
+        client.send, client.recv, client.close = recording_send, recording_recv, recording_close
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def read_capture(path: str) -> Tuple[int, List[Tuple[int, int, str, bytes]]]:
+    """(wall-clock start in ns, [(ns since start, kind, gateway, bytes)]) from a capture file"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a Modbus capture file")
+
+    first = None
+    base = 0
+    names: Dict[int, str] = {}
+    records = []
+    position = 0
+    while position + RECORD.size <= len(data):
+        if data.startswith(MAGIC, position):
+            # A new segment: offsets restart from its own wall-clock start
+            start, = HEADER.unpack_from(data, position + len(MAGIC))
+            position += len(MAGIC) + HEADER.size
+            first = start if first is None else first
+            base = start - first
+            names = {}
+            continue
+        offset, kind, index, length = RECORD.unpack_from(data, position)
+        position += RECORD.size
+        payload = data[position:position + length]
+        position += length
+        if len(payload) < length:
+            # Truncated by a crash mid-write
+            break
+        if kind == KIND_GATEWAY:
+            names[index] = payload.decode('utf-8')
+        else:
+            records.append((base + offset, kind, names.get(index, str(index)), payload))
+    return first, records
+
+
+def exchanges(records: List[Tuple[int, int, str, bytes]]) -> Dict[str, List[Exchange]]:
+    """Pair requests with their responses, per gateway and in capture order"""
+    result: Dict[str, List[Exchange]] = {}
+    pending: Dict[str, Tuple[int, bytes, Optional[bytearray], int]] = {}
+
+    def finish(gateway: str, until: int):
+        sent, request, response, answered = pending.pop(gateway)
+        end = answered if response is not None else until
+        result.setdefault(gateway, []).append(
+            Exchange(request, bytes(response) if response is not None else None,
+                     (end - sent) / 1e9, sent / 1e9))
+
+    for offset, kind, gateway, payload in records:
+        if kind == KIND_REQUEST:
+            if gateway in pending:
+                finish(gateway, offset)
+            pending[gateway] = (offset, payload, None, offset)
+        elif kind == KIND_RESPONSE and gateway in pending:
+            sent, request, response, _ = pending[gateway]
+            response = response if response is not None else bytearray()
+            # pymodbus reads the header and the body of a response separately
+            response.extend(payload)
+            pending[gateway] = (sent, request, response, offset)
+        elif kind == KIND_CLOSE and gateway in pending:
+            finish(gateway, offset)
+
+    for gateway in list(pending):
+        finish(gateway, pending[gateway][3])
+    return result
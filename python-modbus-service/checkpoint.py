@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Runtime state checkpoints for warm restarts of the Modbus polling service
+"""
+
+import json
+import logging
+import os
+import struct
+import zlib
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# File layout: header (magic, format version, payload length, CRC32 of the
+# payload) followed by zlib-compressed JSON. Bump CHECKPOINT_VERSION whenever
+# the state layout changes incompatibly; older files are then ignored.
+CHECKPOINT_MAGIC = b'MBCP'
+CHECKPOINT_VERSION = 1
+CHECKPOINT_HEADER = struct.Struct('>4sHxxII')
+
+
+def save_checkpoint(path: str, state: Dict[str, Any]) -> bool:
+    """Atomically replace the checkpoint at `path` with `state`"""
+    payload = zlib.compress(json.dumps(state, separators=(',', ':')).encode('utf-8'), 1)
+    header = CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, len(payload), zlib.crc32(payload))
+    tmp_path = f"{path}.tmp"
+
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        # Readers see either the old or the new checkpoint, never a torn one
+        os.replace(tmp_path, path)
+        return True
+    except OSError as e:
+        logger.error(f"Failed to write checkpoint {path}: {e}")
+        return False
+
+
+def load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    """Read a checkpoint; None if missing, corrupt or from another format version"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.error(f"Failed to read checkpoint {path}: {e}")
+        return None
+
+    if len(data) < CHECKPOINT_HEADER.size:
+        logger.warning(f"Ignoring truncated checkpoint {path}")
+        return None
+
+    magic, version, length, crc = CHECKPOINT_HEADER.unpack_from(data)
+    payload = data[CHECKPOINT_HEADER.size:]
+    if magic != CHECKPOINT_MAGIC:
+        logger.warning(f"Ignoring {path}: not a poller checkpoint")
+        return None
+    if version != CHECKPOINT_VERSION:
+        logger.warning(f"Ignoring checkpoint {path} with format version {version}")
+        return None
+    if len(payload) != length or zlib.crc32(payload) != crc:
+        logger.warning(f"Ignoring corrupt checkpoint {path}")
+        return None
+
+    try:
+        return json.loads(zlib.decompress(payload))
+    except (zlib.error, ValueError) as e:
+        logger.warning(f"Ignoring unreadable checkpoint {path}: {e}")
+        return None
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Priority write commands (coils and holding registers) for the Modbus polling service
+"""
+
+import logging
+import time
+from typing import Any, Dict
+
+from connections import ConnectionPool, PRIORITY_COMMAND
+
+logger = logging.getLogger(__name__)
+
+COMMAND_TYPES = ('coil', 'register')
+
+
+class CommandError(ValueError):
+    """Invalid write command"""
+
+
+class CommandExecutor:
+    """Writes to devices ahead of scheduled reads and confirms by reading back"""
+
+    def __init__(self, poller, pool: ConnectionPool):
+        self.poller = poller
+        self.pool = pool
+
+    def execute(self, command: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one write command and return its outcome"""
+        try:
+            device_id = int(command['device_id'])
+            kind = command['type']
+            address = int(command['address'])
+            value = command['value']
+        except (KeyError, TypeError, ValueError) as e:
+            raise CommandError(f"Command needs device_id, type, address and value: {e}") from None
+
+        if kind not in COMMAND_TYPES:
+            raise CommandError(f"Unknown command type '{kind}', expected one of {', '.join(COMMAND_TYPES)}")
+        device = self.poller.device_by_id(device_id)
+        if device is None:
+            raise CommandError(f"Device {device_id} is not configured")
+        if kind == 'coil':
+            # Only an explicit boolean: bool("false") would switch the coil ON
+            if isinstance(value, bool):
+                pass
+            elif isinstance(value, int) and value in (0, 1):
+                value = bool(value)
+            else:
+                raise CommandError(f"Coil value must be true/false or 0/1, got {value!r}")
+        else:
+            # Only a whole number: int(21.7) would quietly write 21
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            elif isinstance(value, bool) or not isinstance(value, int):
+                raise CommandError(f"Register value must be a whole number, got {value!r}")
+            if not 0 <= value <= 0xFFFF:
+                raise CommandError(f"Register value {value} does not fit in 16 bits")
+
+        start = time.monotonic()
+        with self.pool.connection(device.ip, device.port, device.timeout, PRIORITY_COMMAND) as client:
+            if client is None:
+                return self._result(False, f"Failed to connect to {device.ip}:{device.port}", start)
+
+            if kind == 'coil':
+                result = client.write_coil(address, value, slave=device.slave_id)
+            else:
+                result = client.write_register(address, value, slave=device.slave_id)
+            if result.isError():
+                logger.error(f"Write of {value} to {kind} {address} on device {device_id} failed: {result}")
+                return self._result(False, f"Device rejected the write: {result}", start)
+
+            if not command.get('verify', True):
+                logger.info(f"Wrote {value} to {kind} {address} on device {device_id}")
+                return self._result(True, "Written", start, value=value, confirmed=None)
+
+            # Read back through the same connection before anyone else uses it
+            if kind == 'coil':
+                readback = client.read_coils(address, count=1, slave=device.slave_id)
+                actual = None if readback.isError() else bool(readback.bits[0])
+            else:
+                readback = client.read_holding_registers(address, count=1, slave=device.slave_id)
+                actual = None if readback.isError() else readback.registers[0]
+
+        confirmed = actual == value
+        logger.info(f"Wrote {value} to {kind} {address} on device {device_id}, "
+                    f"read back {actual} ({'confirmed' if confirmed else 'NOT confirmed'})")
+        message = "Written and confirmed" if confirmed else f"Read back {actual} after writing {value}"
+        return self._result(confirmed, message, start, value=actual, confirmed=confirmed)
+
+    @staticmethod
+    def _result(success: bool, message: str, start: float, **extra) -> Dict[str, Any]:
+        return {
+            "success": success,
+            "message": message,
+            "duration_ms": round((time.monotonic() - start) * 1000, 1),
+            **extra
+        }
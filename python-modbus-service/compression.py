@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Swinging-door compression for analog Modbus readings
+Emits only the points needed to rebuild a signal within a fixed error bound
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class SwingingDoorCompressor:
+    """Swinging-door trending (SDT) state for a single register
+
+    Two "doors" pivot around the last archived point at +/- deviation and
+    narrow with every sample. A sample is only held back while the straight
+    line from the pivot to it stays inside the corridor of every sample in
+    between; otherwise the previous sample is archived and becomes the new
+    pivot. Linear interpolation between archived points therefore reproduces
+    every original sample to within ``deviation``.
+    """
+
+    def __init__(self, deviation: float, max_interval: float = 0.0):
+        self.deviation = abs(deviation)
+        self.max_interval = max_interval
+        self.archived: Optional[Tuple[float, float]] = None
+        self.held: Optional[Tuple[float, float, Any]] = None
+        self.slope_upper = -math.inf
+        self.slope_lower = math.inf
+
+    def _close_doors(self):
+        """Forget the corridor, e.g. after archiving a new pivot"""
+        self.slope_upper = -math.inf
+        self.slope_lower = math.inf
+
+    def offer(self, t: float, v: float, payload: Any) -> List[Any]:
+        """Feed one sample; return the payloads that must be archived"""
+        if not math.isfinite(v):
+            return []
+
+        if self.archived is None:
+            self.archived = (t, v)
+            return [payload]
+
+        at, av = self.archived
+        if t <= at:
+            return []
+
+        emitted = []
+        if self.held is not None and not (
+                self.slope_upper <= (v - av) / (t - at) <= self.slope_lower):
+            # The line from the pivot to this sample would leave the corridor
+            # of the samples in between: archive the previous sample instead
+            ht, hv, held_payload = self.held
+            emitted.append(held_payload)
+            self.archived = (ht, hv)
+            self._close_doors()
+            at, av = self.archived
+
+        dt = t - at
+        self.slope_upper = max(self.slope_upper, (v - (av + self.deviation)) / dt)
+        self.slope_lower = min(self.slope_lower, (v - (av - self.deviation)) / dt)
+        self.held = (t, v, payload)
+
+        if self.max_interval and t - self.archived[0] >= self.max_interval:
+            emitted.append(payload)
+            self.archived = (t, v)
+            self.held = None
+            self._close_doors()
+
+        return emitted
+
+    def flush(self) -> List[Any]:
+        """Archive the pending sample, e.g. before shutdown"""
+        if self.held is None:
+            return []
+        ht, hv, held_payload = self.held
+        self.archived = (ht, hv)
+        self.held = None
+        self._close_doors()
+        return [held_payload]
+
+    def to_state(self) -> Dict[str, Any]:
+        """JSON-friendly snapshot of the corridor"""
+        return {
+            'deviation': self.deviation,
+            'max_interval': self.max_interval,
+            'archived': list(self.archived) if self.archived else None,
+            'held': list(self.held) if self.held else None,
+            'slopes': [self.slope_upper, self.slope_lower]
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'SwingingDoorCompressor':
+        """Rebuild a compressor from to_state() output"""
+        compressor = cls(state['deviation'], state['max_interval'])
+        compressor.archived = tuple(state['archived']) if state['archived'] else None
+        compressor.held = tuple(state['held']) if state['held'] else None
+        compressor.slope_upper, compressor.slope_lower = state['slopes']
+        return compressor
+
+
+class CompressionStage:
+    """Per-register swinging-door compressors for the poller"""
+
+    def __init__(self):
+        self.compressors: Dict[Tuple[int, str], SwingingDoorCompressor] = {}
+
+    def process(self, device_id: int, parameter: str, deviation: float,
+                max_interval: float, t: float, value: float, payload: Any) -> List[Any]:
+        """Run one reading through the compressor for its register"""
+        key = (device_id, parameter)
+        compressor = self.compressors.get(key)
+        if compressor is None or compressor.deviation != abs(deviation):
+            compressor = SwingingDoorCompressor(deviation, max_interval)
+            self.compressors[key] = compressor
+        compressor.max_interval = max_interval
+        return compressor.offer(t, value, payload)
+
+    def flush(self) -> List[Any]:
+        """Archive every pending sample"""
+        emitted = []
+        for compressor in self.compressors.values():
+            emitted.extend(compressor.flush())
+        return emitted
+
+    def export_state(self) -> List[Dict[str, Any]]:
+        """Snapshot of every register's corridor"""
+        return [
+            {'device_id': device_id, 'parameter': parameter, **compressor.to_state()}
+            for (device_id, parameter), compressor in self.compressors.items()
+        ]
+
+    def import_state(self, state: List[Dict[str, Any]]):
+        """Restore corridors saved by export_state()"""
+        for entry in state:
+            key = (entry['device_id'], entry['parameter'])
+            self.compressors[key] = SwingingDoorCompressor.from_state(entry)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Pooled Modbus TCP connections shared by polling and commands
+One connection per gateway, handed out in priority order
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Lower numbers are served first when several users wait for a gateway
+PRIORITY_COMMAND = 0
+PRIORITY_READ = 1
+PRIORITY_POLL = 2
+PRIORITY_BACKFILL = 3
+
+
+class PriorityLock:
+    """Mutex that wakes the highest-priority waiter first (FIFO within a priority)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._held = False
+        self._waiters: List[Tuple[int, int, threading.Event]] = []
+        self._sequence = itertools.count()
+
+    def acquire(self, priority: int = PRIORITY_POLL):
+        with self._lock:
+            if not self._held and not self._waiters:
+                self._held = True
+                return
+            event = threading.Event()
+            heapq.heappush(self._waiters, (priority, next(self._sequence), event))
+        # release() hands the lock over directly by setting our event
+        event.wait()
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                _, _, event = heapq.heappop(self._waiters)
+                event.set()
+            else:
+                self._held = False
+
+
+class PooledConnection:
+    """A gateway connection and the lock that serialises its users"""
+
+    def __init__(self, host: str, port: int, timeout: float, recorder=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.recorder = recorder
+        self.lock = PriorityLock()
+        self.client = None
+
+    def ensure_connected(self) -> bool:
+        from pymodbus.client import ModbusTcpClient
+
+        if self.client is not None and self.client.connected:
+            return True
+        if self.client is None:
+            self.client = ModbusTcpClient(host=self.host, port=self.port, timeout=self.timeout)
+            if self.recorder is not None:
+                self.recorder.attach(self.client, f"{self.host}:{self.port}")
+        with tracing.span('connect', host=self.host, port=self.port):
+            return self.client.connect()
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+
+class ConnectionPool:
+    """Keeps one Modbus TCP connection open per gateway between uses
+
+    With a `recorder` (see capture.py) every frame on the pooled connections
+    is written to a capture file.
+    """
+
+    def __init__(self, recorder=None):
+        self._connections: Dict[Tuple[str, int], PooledConnection] = {}
+        self._lock = threading.Lock()
+        self.recorder = recorder
+
+    def _get(self, host: str, port: int, timeout: float) -> PooledConnection:
+        with self._lock:
+            key = (host, port)
+            connection = self._connections.get(key)
+            if connection is None:
+                connection = PooledConnection(host, port, timeout, self.recorder)
+                self._connections[key] = connection
+            return connection
+
+    @contextmanager
+    def connection(self, host: str, port: int, timeout: float, priority: int = PRIORITY_POLL):
+        """Exclusive use of a connected client for one or more requests
+
+        Yields None if the gateway cannot be reached. The connection is
+        dropped after any error so the next user reconnects.
+        """
+        pooled = self._get(host, port, timeout)
+        with tracing.span('wait_gateway', host=host, priority=priority):
+            pooled.lock.acquire(priority)
+        try:
+            if not pooled.ensure_connected():
+                pooled.close()
+                yield None
+                return
+            try:
+                yield pooled.client
+            except Exception:
+                pooled.close()
+                raise
+        finally:
+            pooled.lock.release()
+
+    def close(self, host: str, port: int):
+        """Drop a gateway's connection, e.g. after it stopped answering"""
+        with self._lock:
+            pooled = self._connections.get((host, port))
+        if pooled is not None:
+            pooled.lock.acquire(PRIORITY_COMMAND)
+            try:
+                pooled.close()
+            finally:
+                pooled.lock.release()
+
+    def close_all(self):
+        with self._lock:
+            connections = list(self._connections.values())
+        for pooled in connections:
+            pooled.lock.acquire(PRIORITY_COMMAND)
+            try:
+                pooled.close()
+            finally:
+                pooled.lock.release()
+        if self.recorder is not None:
+            self.recorder.flush()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Derived metrics for cumulative counter registers
+Turns counters such as Total Energy into per-interval deltas and rates at ingest time
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RATE_PERIODS = {'second': 1.0, 'minute': 60.0, 'hour': 3600.0}
+RATE_UNIT_SUFFIXES = {'second': 's', 'minute': 'min', 'hour': 'h'}
+
+# Raw range of integer counter types, before scaling
+COUNTER_RANGES = {'uint16': 2 ** 16, 'uint32': 2 ** 32}
+
+
+class CounterDeriver:
+    """Per-register counter state: last value and the time it was read"""
+
+    def __init__(self, wrap: float = 0.0):
+        self.wrap = wrap
+        self.last: Optional[Tuple[float, float]] = None
+
+    def update(self, t: float, value: float) -> Optional[Tuple[float, float, str]]:
+        """Feed one sample; returns (delta, elapsed seconds, event) or None
+
+        `event` is 'wrap' when the counter rolled over. Resets (a decrease
+        that is not a plausible rollover) re-baseline the counter and return
+        None, since the consumption across the reset is unknown.
+        """
+        previous = self.last
+        if previous is not None and t <= previous[0]:
+            return None
+        self.last = (t, value)
+        if previous is None:
+            return None
+
+        last_t, last_value = previous
+        delta = value - last_value
+        event = ''
+        if delta < 0:
+            wrapped = value + self.wrap - last_value
+            # A rollover only explains the drop if the counter was in the
+            # upper half of its range and is now in the lower half
+            if self.wrap and 0 <= wrapped < self.wrap / 2:
+                delta = wrapped
+                event = 'wrap'
+            else:
+                logger.warning(f"Counter reset detected ({last_value} -> {value}), re-baselining")
+                return None
+
+        return delta, t - last_t, event
+
+
+class DerivedStage:
+    """Counter derivers for every configured register"""
+
+    def __init__(self):
+        self.derivers: Dict[Tuple[int, str], CounterDeriver] = {}
+
+    def process(self, device_id: int, parameter: str, wrap: float,
+                t: float, value: float) -> Optional[Tuple[float, float, str]]:
+        """Run one counter sample through its register's deriver"""
+        key = (device_id, parameter)
+        deriver = self.derivers.get(key)
+        if deriver is None:
+            deriver = CounterDeriver(wrap)
+            self.derivers[key] = deriver
+        deriver.wrap = wrap
+        return deriver.update(t, value)
+
+    def export_state(self) -> List[List[Any]]:
+        """Last sample of every counter"""
+        return [
+            [device_id, parameter, deriver.wrap, list(deriver.last) if deriver.last else None]
+            for (device_id, parameter), deriver in self.derivers.items()
+        ]
+
+    def import_state(self, state: List[List[Any]]):
+        """Restore counters saved by export_state()"""
+        for device_id, parameter, wrap, last in state:
+            deriver = CounterDeriver(wrap)
+            deriver.last = tuple(last) if last else None
+            self.derivers[(device_id, parameter)] = deriver
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Device configuration model and compiled read plans for the Modbus polling service
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from derived import COUNTER_RANGES, RATE_PERIODS, RATE_UNIT_SUFFIXES
+from expressions import VirtualParameter, parse_virtual
+
+logger = logging.getLogger(__name__)
+
+# Holding registers per read request allowed by the Modbus spec
+MAX_BLOCK_REGISTERS = 125
+
+# 16-bit words occupied by each data type; anything else is one word
+REGISTER_WIDTHS = {'float': 2, 'uint32': 2}
+
+# Bump when the cached structures below change shape
+PLAN_CACHE_VERSION = 5
+
+@dataclass
+class CounterConfig:
+    """Derived series for a cumulative counter register"""
+    delta_parameter: str
+    rate_parameter: str
+    rate_unit: str
+    rate_period: float = 3600.0  # seconds per rate unit
+    wrap: float = 0.0  # scaled counter range; 0 means the counter never wraps
+
+@dataclass
+class ValidationConfig:
+    """Data-quality limits for a register's scaled values"""
+    min: Optional[float] = None
+    max: Optional[float] = None
+    max_rate: Optional[float] = None  # largest plausible change per second
+    stuck_window: int = 0  # identical readings in a row that count as stuck; 0 disables
+    action: Optional[str] = None  # 'flag' or 'drop'; None uses the service default
+
+@dataclass
+class RegisterConfig:
+    """Configuration for a single Modbus register"""
+    address: int
+    parameter: str
+    data_type: str  # 'float', 'int', 'uint16', 'uint32'
+    scale: float = 1.0
+    unit: str = ""
+    description: str = ""
+    compression_deviation: float = 0.0  # swinging-door tolerance, 0 disables
+    compression_max_interval: float = 0.0  # force a point at least this often (seconds)
+    counter: Optional[CounterConfig] = None
+    validation: Optional[ValidationConfig] = None
+
+    @property
+    def width(self) -> int:
+        return REGISTER_WIDTHS.get(self.data_type, 1)
+
+@dataclass
+class ReadBlock:
+    """One read request covering contiguous registers"""
+    address: int
+    count: int
+    registers: List[Tuple[int, RegisterConfig]] = field(default_factory=list)  # (word offset, register)
+
+@dataclass
+class DeviceConfig:
+    """Configuration for a Modbus device"""
+    device_id: int
+    ip: str
+    port: int = 502
+    slave_id: int = 1
+    timeout: int = 10
+    registers: List[RegisterConfig] = None
+    max_block_registers: int = MAX_BLOCK_REGISTERS
+    read_plan: List[ReadBlock] = None
+    virtual: List[VirtualParameter] = field(default_factory=list)
+    load_profile: Optional[str] = None  # layout name in the load-profile layouts file
+
+def build_read_plan(registers: List[RegisterConfig], max_block: int = MAX_BLOCK_REGISTERS,
+                    max_gap: int = 0, holes: List[Tuple[int, int]] = ()) -> List[ReadBlock]:
+    """Merge adjacent registers into as few block reads as possible
+
+    With `max_gap`, blocks also bridge up to that many unconfigured words, but
+    never a `(start, end)` address range in `holes`; a register inside a hole
+    is read on its own.
+    """
+    def in_hole(start: int, end: int) -> bool:
+        return any(start < hole_end and hole_start < end for hole_start, hole_end in holes)
+
+    blocks: List[ReadBlock] = []
+    closed = False
+    for register in sorted(registers, key=lambda r: r.address):
+        block = blocks[-1] if blocks else None
+        end = register.address + register.width
+        if block is not None and not closed \
+                and block.address <= register.address <= block.address + block.count + max_gap \
+                and end - block.address <= max_block \
+                and not in_hole(block.address + block.count, end):
+            block.registers.append((register.address - block.address, register))
+            block.count = max(block.count, end - block.address)
+        else:
+            blocks.append(ReadBlock(register.address, register.width, [(0, register)]))
+            closed = in_hole(register.address, end)
+    return blocks
+
+def parse_counter(reg_data: Dict[str, Any]) -> Optional[CounterConfig]:
+    """Counter settings of a register, or None if it is not a counter"""
+    counter = reg_data.get('counter')
+    if not counter:
+        return None
+    if counter is True:
+        counter = {}
+
+    parameter = reg_data['parameter']
+    unit = reg_data.get('unit', '')
+    data_type = reg_data.get('data_type', 'float')
+    per = counter.get('rate_per', 'hour')
+    if per not in RATE_PERIODS:
+        raise ValueError(f"Invalid rate_per '{per}' for {parameter}, expected one of {sorted(RATE_PERIODS)}")
+
+    wrap = counter.get('wrap')
+    if wrap is None:
+        wrap = COUNTER_RANGES.get(data_type, 0) * reg_data.get('scale', 1.0)
+
+    return CounterConfig(
+        delta_parameter=counter.get('delta_parameter', f"{parameter} Delta"),
+        rate_parameter=counter.get('rate_parameter', f"{parameter} Rate"),
+        rate_unit=counter.get('rate_unit', f"{unit}/{RATE_UNIT_SUFFIXES[per]}"),
+        rate_period=RATE_PERIODS[per],
+        wrap=wrap
+    )
+
+def parse_validation(reg_data: Dict[str, Any]) -> Optional[ValidationConfig]:
+    """Validation limits of a register, or None if it has none"""
+    validation = reg_data.get('validation')
+    if not validation:
+        return None
+
+    action = validation.get('action')
+    if action not in (None, 'flag', 'drop'):
+        raise ValueError(f"Invalid validation action '{action}' for {reg_data['parameter']}, "
+                         f"expected 'flag' or 'drop'")
+
+    return ValidationConfig(
+        min=validation.get('min'),
+        max=validation.get('max'),
+        max_rate=validation.get('max_rate'),
+        stuck_window=validation.get('stuck_window', 0),
+        action=action
+    )
+
+def parse_config(config_data: List[Dict[str, Any]]) -> List[DeviceConfig]:
+    """Build device configurations (with read plans) from parsed config.json"""
+    devices = []
+    for device_data in config_data:
+        registers = []
+        for reg_data in device_data.get('registers', []):
+            compression = reg_data.get('compression') or {}
+            registers.append(RegisterConfig(
+                address=reg_data['address'],
+                parameter=reg_data['parameter'],
+                data_type=reg_data.get('data_type', 'float'),
+                scale=reg_data.get('scale', 1.0),
+                unit=reg_data.get('unit', ''),
+                description=reg_data.get('description', ''),
+                compression_deviation=compression.get('deviation', 0.0),
+                compression_max_interval=compression.get('max_interval', 0.0),
+                counter=parse_counter(reg_data),
+                validation=parse_validation(reg_data)
+            ))
+
+        max_block = min(device_data.get('max_block_registers', MAX_BLOCK_REGISTERS), MAX_BLOCK_REGISTERS)
+        devices.append(DeviceConfig(
+            device_id=device_data['device_id'],
+            ip=device_data['ip'],
+            port=device_data.get('port', 502),
+            slave_id=device_data.get('slave_id', 1),
+            timeout=device_data.get('timeout', 10),
+            registers=registers,
+            max_block_registers=max_block,
+            read_plan=build_read_plan(registers, max_block),
+            virtual=parse_virtual(device_data, {register.parameter for register in registers}),
+            load_profile=device_data.get('load_profile')
+        ))
+    return devices
+
+def config_digest(raw: bytes) -> str:
+    """Cache key for a config file's contents"""
+    return hashlib.sha256(raw).hexdigest()
+
+def load_cached_plan(path: str, digest: str) -> Optional[List[DeviceConfig]]:
+    """Compiled devices from the plan cache, if it matches this config"""
+    try:
+        with open(path, 'rb') as f:
+            cached = pickle.load(f)
+        if cached.get('version') == PLAN_CACHE_VERSION and cached.get('digest') == digest:
+            return cached['devices']
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable config cache {path}: {e}")
+    return None
+
+def store_cached_plan(path: str, digest: str, devices: List[DeviceConfig]):
+    """Write compiled devices for the next cold start"""
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'version': PLAN_CACHE_VERSION, 'digest': digest, 'devices': devices},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write config cache {path}: {e}")
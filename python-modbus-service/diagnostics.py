@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Fleet diagnostics for the Modbus polling service
+Checks every gateway and device in config.json at once and writes a JSON (and HTML) report
+
+Gateways are checked concurrently, devices behind one gateway one after the
+other over a single connection, as the poller does. Modbus requests are not
+retried, and every socket and Modbus timeout is capped by what is left of
+the global budget, so the run ends within `--budget` seconds plus at most
+one `--timeout`. Checks run on daemon threads: one that still hangs at that
+point is reported as timed out and cannot hold up the exit.
+
+    python diagnostics.py --output report.json --html report.html
+    python diagnostics.py --budget 5 config.json
+"""
+
+import argparse
+import html
+import json
+import logging
+import math
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from device_config import DeviceConfig, parse_config
+
+logger = logging.getLogger(__name__)
+
+STATUS_OK = 'ok'
+STATUS_PARTIAL = 'partial'
+STATUS_FAILED = 'failed'
+STATUS_UNREACHABLE = 'unreachable'
+STATUS_TIMED_OUT = 'timed_out'
+
+
+class Budget:
+    """Deadline shared by every check of one run"""
+
+    def __init__(self, seconds: float):
+        self.deadline = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def timeout(self, cap: float) -> float:
+        return min(cap, self.remaining())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+def percentiles(samples: List[float]) -> Dict[str, Any]:
+    """Count, min, p50, p90, p99 and max of durations in seconds, reported in ms"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def rank(q: float) -> float:
+        # Nearest-rank percentile
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+    return {
+        "count": len(ordered),
+        "min_ms": round(ordered[0] * 1000, 1),
+        "p50_ms": round(rank(0.50) * 1000, 1),
+        "p90_ms": round(rank(0.90) * 1000, 1),
+        "p99_ms": round(rank(0.99) * 1000, 1),
+        "max_ms": round(ordered[-1] * 1000, 1)
+    }
+
+
+def check_connect(ip: str, port: int, samples: int, budget: Budget, timeout: float) -> Dict[str, Any]:
+    """TCP connect round trips to a gateway
+
+    Stands in for ICMP ping, which needs root or a platform-specific ping
+    command, and also proves the Modbus port is open.
+    """
+    rtts, errors = [], []
+    for _ in range(samples):
+        if budget.expired:
+            break
+        start = time.monotonic()
+        try:
+            with socket.create_connection((ip, port), timeout=budget.timeout(timeout)):
+                rtts.append(time.monotonic() - start)
+        except OSError as e:
+            errors.append(str(e) or type(e).__name__)
+    return {"rtt": percentiles(rtts), "attempts": len(rtts) + len(errors), "errors": errors}
+
+
+def limit_timeout(client, seconds: float):
+    """Cap how long the client's next request may wait (pymodbus 3 reads it from comm_params)"""
+    client.comm_params.timeout_connect = seconds
+    if client.socket is not None:
+        client.socket.settimeout(seconds)
+
+
+def check_device(client, device: DeviceConfig, budget: Budget, timeout: float) -> Dict[str, Any]:
+    """Read the device's whole read plan, timing every request"""
+    times, errors = [], []
+    blocks_ok = registers_ok = 0
+    for block in device.read_plan:
+        if budget.expired:
+            errors.append(f"budget exhausted before block {block.address}")
+            break
+        limit_timeout(client, budget.timeout(min(timeout, device.timeout)))
+        start = time.monotonic()
+        try:
+            result = client.read_holding_registers(address=block.address, count=block.count,
+                                                   slave=device.slave_id)
+        except Exception as e:
+            errors.append(f"block {block.address}+{block.count}: {e}")
+            continue
+        times.append(time.monotonic() - start)
+        if result.isError():
+            code = getattr(result, 'exception_code', None)
+            errors.append(f"block {block.address}+{block.count}: "
+                          f"{f'exception {code:02d}' if code is not None else result}")
+            continue
+        blocks_ok += 1
+        registers_ok += len(block.registers)
+
+    if blocks_ok == len(device.read_plan):
+        status = STATUS_OK
+    elif blocks_ok:
+        status = STATUS_PARTIAL
+    else:
+        status = STATUS_FAILED
+    return {
+        "device_id": device.device_id,
+        "slave_id": device.slave_id,
+        "status": status,
+        "blocks": len(device.read_plan),
+        "blocks_ok": blocks_ok,
+        "registers": len(device.registers),
+        "registers_ok": registers_ok,
+        "response": percentiles(times),
+        "errors": errors
+    }
+
+
+def device_stub(device: DeviceConfig, status: str, error: str) -> Dict[str, Any]:
+    """Report entry for a device that could not be read at all"""
+    return {
+        "device_id": device.device_id,
+        "slave_id": device.slave_id,
+        "status": status,
+        "blocks": len(device.read_plan),
+        "blocks_ok": 0,
+        "registers": len(device.registers),
+        "registers_ok": 0,
+        "response": percentiles([]),
+        "errors": [error]
+    }
+
+
+def check_gateway(ip: str, port: int, devices: List[DeviceConfig], budget: Budget,
+                  timeout: float, samples: int) -> Dict[str, Any]:
+    """Connect round trips to one gateway, then every device behind it"""
+    start = time.monotonic()
+    report = {"ip": ip, "port": port, "connect": check_connect(ip, port, samples, budget, timeout)}
+
+    if not report["connect"]["rtt"]["count"]:
+        error = report["connect"]["errors"][-1] if report["connect"]["errors"] else "budget exhausted"
+        report["status"] = STATUS_UNREACHABLE
+        report["devices"] = [device_stub(device, STATUS_FAILED, f"gateway unreachable: {error}")
+                             for device in devices]
+        report["duration_s"] = round(time.monotonic() - start, 3)
+        return report
+
+    try:
+        from pymodbus.client import ModbusTcpClient
+    except ImportError:
+        ModbusTcpClient = None
+
+    results = []
+    client = None
+    try:
+        if ModbusTcpClient is None:
+            results = [device_stub(device, STATUS_FAILED, "pymodbus is not installed") for device in devices]
+        else:
+            # No retries: pymodbus would otherwise wait up to (retries + 1) timeouts per request
+            client = ModbusTcpClient(host=ip, port=port, retries=0,
+                                     timeout=budget.timeout(min(timeout, max(device.timeout for device in devices))))
+            if not client.connect():
+                results = [device_stub(device, STATUS_FAILED, "Modbus connection failed") for device in devices]
+            else:
+                for device in devices:
+                    if budget.expired:
+                        results.append(device_stub(device, STATUS_TIMED_OUT, "budget exhausted"))
+                    else:
+                        results.append(check_device(client, device, budget, timeout))
+    finally:
+        if client is not None:
+            client.close()
+
+    report["devices"] = results
+    statuses = {result["status"] for result in results}
+    report["status"] = STATUS_OK if statuses == {STATUS_OK} else \
+        STATUS_FAILED if statuses <= {STATUS_FAILED, STATUS_TIMED_OUT} else STATUS_PARTIAL
+    report["duration_s"] = round(time.monotonic() - start, 3)
+    return report
+
+
+def run_diagnostics(devices: List[DeviceConfig], budget_s: float = 10.0, timeout: float = 2.0,
+                    samples: int = 5, workers: int = 64) -> Dict[str, Any]:
+    """Check all gateways concurrently within `budget_s` seconds and build the report"""
+    gateways: Dict[Tuple[str, int], List[DeviceConfig]] = OrderedDict()
+    for device in devices:
+        gateways.setdefault((device.ip, device.port), []).append(device)
+
+    started_at = datetime.now(timezone.utc)
+    start = time.monotonic()
+    budget = Budget(budget_s)
+    todo: queue.Queue = queue.Queue()
+    for key in gateways:
+        todo.put(key)
+    finished: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    failures: Dict[Tuple[str, int], Exception] = {}
+
+    def worker():
+        while True:
+            try:
+                ip, port = todo.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                finished[(ip, port)] = check_gateway(ip, port, gateways[(ip, port)], budget, timeout, samples)
+            except Exception as e:
+                failures[(ip, port)] = e
+
+    # Daemon threads: a check stuck past the deadline is abandoned rather than waited for on exit
+    threads = [threading.Thread(target=worker, name=f"diagnostics-{index}", daemon=True)
+               for index in range(max(1, min(workers, len(gateways))))]
+    for thread in threads:
+        thread.start()
+    # A check that started just before the deadline may still need one timeout
+    end = start + budget_s + timeout
+    for thread in threads:
+        thread.join(max(0.0, end - time.monotonic()))
+
+    reports = dict(finished)
+    for ip, port in gateways:
+        if (ip, port) in reports:
+            continue
+        error = f"check failed: {failures[(ip, port)]}" if (ip, port) in failures else "budget exhausted"
+        reports[(ip, port)] = {
+            "ip": ip, "port": port, "status": STATUS_TIMED_OUT, "connect": None, "duration_s": None,
+            "devices": [device_stub(device, STATUS_TIMED_OUT, error) for device in gateways[(ip, port)]]
+        }
+
+    ordered = [reports[key] for key in gateways]
+    device_reports = [device for gateway in ordered for device in gateway["devices"]]
+    summary = {
+        "gateways": len(ordered),
+        "gateways_reachable": sum(1 for gateway in ordered
+                                  if gateway["status"] not in (STATUS_UNREACHABLE, STATUS_TIMED_OUT)),
+        "devices": len(device_reports),
+        **{f"devices_{status}": sum(1 for device in device_reports if device["status"] == status)
+           for status in (STATUS_OK, STATUS_PARTIAL, STATUS_FAILED, STATUS_TIMED_OUT)},
+        # Fleet-wide percentiles are taken over the per-gateway and per-device medians
+        "connect_rtt": percentiles([gateway["connect"]["rtt"]["p50_ms"] / 1000 for gateway in ordered
+                                    if gateway["connect"] and gateway["connect"]["rtt"]["count"]]),
+        "modbus_response": percentiles([device["response"]["p50_ms"] / 1000 for device in device_reports
+                                        if device["response"]["count"]])
+    }
+    return {
+        "generated_at": started_at.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        "budget_s": budget_s,
+        "timeout_s": timeout,
+        "elapsed_s": round(time.monotonic() - start, 3),
+        "summary": summary,
+        "gateways": ordered
+    }
+
+
+def render_html(report: Dict[str, Any]) -> str:
+    """Self-contained HTML page for a report"""
+    def cell(value: Any) -> str:
+        return f"<td>{html.escape('' if value is None else str(value))}</td>"
+
+    def ms(stats: Optional[Dict[str, Any]], key: str) -> Any:
+        return stats.get(key) if stats else None
+
+    summary = report["summary"]
+    rows = []
+    for gateway in report["gateways"]:
+        rtt = gateway["connect"]["rtt"] if gateway["connect"] else None
+        for device in gateway["devices"]:
+            rows.append(
+                f"<tr class=\"{html.escape(device['status'])}\">"
+                + cell(f"{gateway['ip']}:{gateway['port']}") + cell(ms(rtt, 'p50_ms'))
+                + cell(device["device_id"]) + cell(device["slave_id"]) + cell(device["status"])
+                + cell(f"{device['blocks_ok']}/{device['blocks']}")
+                + cell(ms(device["response"], 'p50_ms')) + cell(ms(device["response"], 'p90_ms'))
+                + cell(ms(device["response"], 'max_ms')) + cell("; ".join(device["errors"][:3]))
+                + "</tr>"
+            )
+    counts = ", ".join(f"{summary[f'devices_{status}']} {status}"
+                       for status in (STATUS_OK, STATUS_PARTIAL, STATUS_FAILED, STATUS_TIMED_OUT))
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Modbus fleet diagnostics {html.escape(report['generated_at'])}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; }}
+th, td {{ border: 1px solid #ccc; padding: 4px 8px; text-align: left; }}
+tr.ok td {{ background: #e8f5e9; }}
+tr.partial td {{ background: #fff8e1; }}
+tr.failed td, tr.timed_out td {{ background: #ffebee; }}
+</style>
+</head>
+<body>
+<h1>Modbus fleet diagnostics</h1>
+<p>{html.escape(report['generated_at'])}: {summary['devices']} devices behind
+{summary['gateways_reachable']}/{summary['gateways']} reachable gateways ({html.escape(counts)})
+in {report['elapsed_s']} s (budget {report['budget_s']} s).</p>
+<table>
+<tr><th>Gateway</th><th>Connect p50 ms</th><th>Device</th><th>Slave</th><th>Status</th><th>Blocks</th>
+<th>Response p50 ms</th><th>p90 ms</th><th>max ms</th><th>Errors</th></tr>
+{chr(10).join(rows)}
+</table>
+</body>
+</html>
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check every configured gateway and device at once")
+    parser.add_argument('config', nargs='?', default=os.getenv('MODBUS_CONFIG', 'config.json'),
+                        help='device configuration (default: $MODBUS_CONFIG or config.json)')
+    parser.add_argument('--budget', type=float, default=10.0, help='seconds for the whole run (default: %(default)s)')
+    parser.add_argument('--timeout', type=float, default=2.0,
+                        help='cap on each connect and Modbus request in seconds (default: %(default)s)')
+    parser.add_argument('--samples', type=int, default=5,
+                        help='TCP connect round trips per gateway (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=64, help='gateways checked at once (default: %(default)s)')
+    parser.add_argument('--output', help='write the JSON report to this file (default: stdout)')
+    parser.add_argument('--html', metavar='PATH', help='also write an HTML report')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    with open(args.config, 'r') as f:
+        devices = parse_config(json.load(f))
+    report = run_diagnostics(devices, args.budget, args.timeout, args.samples, args.workers)
+    report["config"] = args.config
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    if args.html:
+        with open(args.html, 'w') as f:
+            f.write(render_html(report))
+
+    summary = report["summary"]
+    print(f"{summary['devices_ok']}/{summary['devices']} devices ok, "
+          f"{summary['gateways_reachable']}/{summary['gateways']} gateways reachable "
+          f"in {report['elapsed_s']} s", file=sys.stderr)
+    for gateway in report["gateways"]:
+        for device in gateway["devices"]:
+            if device["status"] != STATUS_OK:
+                print(f"  {gateway['ip']}:{gateway['port']} device {device['device_id']}: "
+                      f"{device['status']} ({'; '.join(device['errors'][:1])})", file=sys.stderr)
+    sys.exit(0 if summary['devices_ok'] == summary['devices'] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Virtual parameters computed from other parameters of the same device
+Expressions are validated and compiled to Python bytecode once, at config load
+"""
+
+import ast
+import math
+from typing import Any, Dict, List, Optional, Set
+
+# Functions available inside expressions
+FUNCTIONS = {
+    'abs': abs,
+    'min': min,
+    'max': max,
+    'round': round,
+    'pow': pow,
+    'sqrt': math.sqrt,
+    'exp': math.exp,
+    'log': math.log,
+    'log10': math.log10,
+    'sin': math.sin,
+    'cos': math.cos,
+    'atan2': math.atan2,
+    'degrees': math.degrees,
+    'radians': math.radians,
+}
+
+CONSTANTS = {'pi': math.pi, 'e': math.e}
+
+# (fewest, most) arguments of each function; None for no upper limit
+ARITY = {
+    'abs': (1, 1),
+    'min': (2, None),
+    'max': (2, None),
+    'round': (1, 2),
+    'pow': (2, 2),
+    'sqrt': (1, 1),
+    'exp': (1, 1),
+    'log': (1, 2),
+    'log10': (1, 1),
+    'sin': (1, 1),
+    'cos': (1, 1),
+    'atan2': (2, 2),
+    'degrees': (1, 1),
+    'radians': (1, 1),
+}
+
+BITWISE_OPS = (ast.BitAnd, ast.BitOr, ast.BitXor, ast.LShift, ast.RShift)
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp,
+    ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UAdd, ast.USub, ast.Not, ast.And, ast.Or,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+    ast.BitAnd, ast.BitOr, ast.BitXor, ast.LShift, ast.RShift,
+)
+
+
+def _whole(value) -> int:
+    """Operand of a bitwise operator: register values are floats, so whole numbers are converted"""
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f"bitwise operand {value} is not a whole number")
+        return int(value)
+    return value
+
+
+_WHOLE = '_bitwise_operand'
+
+_GLOBALS = {'__builtins__': {}, **FUNCTIONS, **CONSTANTS, _WHOLE: _whole}
+
+
+class _BitwiseOperands(ast.NodeTransformer):
+    """Wraps both operands of every bitwise operator in _whole()"""
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.BinOp:
+        self.generic_visit(node)
+        if isinstance(node.op, BITWISE_OPS):
+            node.left = ast.Call(ast.Name(_WHOLE, ast.Load()), [node.left], [])
+            node.right = ast.Call(ast.Name(_WHOLE, ast.Load()), [node.right], [])
+        return node
+
+
+class ExpressionError(ValueError):
+    """Invalid virtual parameter expression"""
+
+
+def compile_expression(expression: str, name: str = '<virtual>'):
+    """Validate an arithmetic expression and compile it; returns (code, names used)"""
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except SyntaxError as e:
+        raise ExpressionError(f"Invalid expression for {name}: {e.msg}") from None
+
+    names: Set[str] = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ExpressionError(f"{type(node).__name__} is not allowed in the expression for {name}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ExpressionError(f"Only numeric constants are allowed in the expression for {name}")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                raise ExpressionError(f"Unsupported function call in the expression for {name}")
+            fewest, most = ARITY[node.func.id]
+            if len(node.args) < fewest or (most is not None and len(node.args) > most):
+                expected = f"{fewest}" if fewest == most else \
+                    f"at least {fewest}" if most is None else f"{fewest} to {most}"
+                raise ExpressionError(f"{node.func.id}() takes {expected} arguments in the expression "
+                                      f"for {name}, got {len(node.args)}")
+        elif isinstance(node, ast.Name) and node.id not in FUNCTIONS and node.id not in CONSTANTS:
+            names.add(node.id)
+
+    tree = ast.fix_missing_locations(_BitwiseOperands().visit(tree))
+    return compile(tree, name, 'eval'), names
+
+
+class VirtualParameter:
+    """A parameter computed from other parameters of the same device"""
+
+    def __init__(self, parameter: str, expression: str, inputs: Optional[Dict[str, str]] = None,
+                 unit: str = "", description: str = ""):
+        self.parameter = parameter
+        self.expression = expression
+        self.unit = unit
+        self.description = description
+        self.code, names = compile_expression(expression, f"<virtual:{parameter}>")
+        aliases = inputs or {}
+        # Identifiers are aliases from "inputs" or, if they are valid Python
+        # names, parameter names used directly
+        self.bindings = {name: aliases.get(name, name) for name in sorted(names)}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Code objects cannot be pickled; recompile from source on load
+        state = self.__dict__.copy()
+        del state['code']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self.code, _ = compile_expression(self.expression, f"<virtual:{self.parameter}>")
+
+    def __repr__(self) -> str:
+        return f"VirtualParameter({self.parameter!r}, {self.expression!r})"
+
+    @property
+    def inputs(self) -> List[str]:
+        return list(self.bindings.values())
+
+    def evaluate(self, values: Dict[str, float]) -> Optional[float]:
+        """Compute the value from a snapshot; None if an input is missing
+
+        Raises ArithmeticError, ValueError or TypeError when the expression
+        cannot be evaluated for these values, e.g. a complex result.
+        """
+        env = {}
+        for name, parameter in self.bindings.items():
+            value = values.get(parameter)
+            if value is None:
+                return None
+            env[name] = value
+        result = eval(self.code, _GLOBALS, env)
+        if isinstance(result, complex):
+            raise ValueError(f"result {result} is not a real number")
+        return float(result)
+
+
+def parse_virtual(device_data: Dict[str, Any], known: Set[str]) -> List[VirtualParameter]:
+    """Compile a device's "virtual" list, checking every input exists"""
+    virtual = []
+    available = set(known)
+    for item in device_data.get('virtual', []):
+        vp = VirtualParameter(
+            parameter=item['parameter'],
+            expression=item['expression'],
+            inputs=item.get('inputs'),
+            unit=item.get('unit', ''),
+            description=item.get('description', '')
+        )
+        missing = [parameter for parameter in vp.inputs if parameter not in available]
+        if missing:
+            raise ExpressionError(
+                f"Virtual parameter '{vp.parameter}' of device {device_data.get('device_id')} "
+                f"uses unknown parameters: {', '.join(missing)}"
+            )
+        # Later virtual parameters may build on earlier ones
+        available.add(vp.parameter)
+        virtual.append(vp)
+    return virtual
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Active-standby leader election for the Modbus polling service
+Lease-based election through a SQLite database on storage shared by both nodes
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = 'modbus_poller'
+
+
+class LeaseElector:
+    """Holds or watches the polling lease
+
+    The active node renews its lease every ttl/3 seconds. A standby only takes
+    the lease once it has expired, and the active node stops considering
+    itself leader `safety_margin` seconds before its own lease runs out, so
+    the two never poll at the same time. Each takeover bumps the lease term,
+    which fences off state written by a previous leader.
+
+    Expiry is judged on each node's own monotonic clock, never by comparing
+    wall times across nodes: the leader counts its lease from just before it
+    wrote it, and a standby only treats the lease as expired once the lease
+    row has stayed unchanged for a full ttl since it first saw it. Clock skew
+    between the nodes (or an NTP step) therefore cannot cause two leaders.
+    """
+
+    def __init__(self, path: str, node_id: str = None, ttl: float = 30.0,
+                 safety_margin: float = 2.0,
+                 on_promote: Optional[Callable[[int], None]] = None,
+                 on_demote: Optional[Callable[[], None]] = None):
+        self.path = path
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.ttl = ttl
+        self.safety_margin = safety_margin
+        self.on_promote = on_promote
+        self.on_demote = on_demote
+        self.term = 0
+        self.expires_at = 0.0  # time.monotonic() deadline of the lease this node holds
+        self.leader = False
+        self.observed: Optional[tuple] = None
+        self.observed_at = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._setup()
+
+    @classmethod
+    def from_env(cls, **callbacks) -> Optional['LeaseElector']:
+        """Build an elector from HA_* variables; None when HA is disabled"""
+        path = os.getenv('HA_LEASE_PATH')
+        if not path:
+            return None
+        return cls(
+            path,
+            node_id=os.getenv('HA_NODE_ID') or None,
+            ttl=float(os.getenv('HA_LEASE_TTL', '30')),
+            **callbacks
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: transactions are managed explicitly below
+        return sqlite3.connect(self.path, timeout=self.ttl / 3, isolation_level=None)
+
+    def _setup(self):
+        with closing(self._connect()) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS lease (
+                    name TEXT PRIMARY KEY,
+                    holder TEXT NOT NULL,
+                    term INTEGER NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS handoff_state (
+                    name TEXT PRIMARY KEY,
+                    term INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    state TEXT NOT NULL
+                )
+            """)
+
+    def try_acquire(self) -> bool:
+        """Acquire or renew the lease; returns whether this node leads"""
+        now = time.time()
+        # Our lease runs from before the write, so it never outlives the copy a standby sees
+        started = time.monotonic()
+        conn = None
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT holder, term, expires_at FROM lease WHERE name = ?", (LEASE_NAME,)
+            ).fetchone()
+
+            if row is None:
+                term = 1
+                conn.execute(
+                    "INSERT INTO lease (name, holder, term, expires_at) VALUES (?, ?, ?, ?)",
+                    (LEASE_NAME, self.node_id, term, now + self.ttl)
+                )
+            else:
+                holder, term, _ = row
+                if holder != self.node_id and not self._expired(tuple(row)):
+                    conn.execute("COMMIT")
+                    return self._set_leader(False, 0, 0.0)
+                if holder != self.node_id:
+                    term += 1
+                conn.execute(
+                    "UPDATE lease SET holder = ?, term = ?, expires_at = ? WHERE name = ?",
+                    (self.node_id, term, now + self.ttl, LEASE_NAME)
+                )
+            conn.execute("COMMIT")
+            return self._set_leader(True, term, started + self.ttl)
+
+        except sqlite3.Error as e:
+            logger.error(f"Lease store error: {e}")
+            if conn is not None and conn.in_transaction:
+                conn.execute("ROLLBACK")
+            # Keep leading only while the last granted lease is still valid
+            return self._set_leader(self.is_leader(), self.term, self.expires_at)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _expired(self, row: tuple) -> bool:
+        """Whether another node's lease has run out, measured on this node's monotonic clock"""
+        now = time.monotonic()
+        if row[2] == 0:
+            # Released on shutdown
+            return True
+        if row != self.observed:
+            # Renewed (or first seen) since the last check: the full ttl starts again
+            self.observed, self.observed_at = row, now
+            return False
+        return now - self.observed_at >= self.ttl
+
+    def _set_leader(self, leader: bool, term: int, expires_at: float) -> bool:
+        was_leader = self.leader
+        self.leader, self.term, self.expires_at = leader, term, expires_at
+        if leader and not was_leader:
+            logger.info(f"Node {self.node_id} became active (term {term})")
+            if self.on_promote:
+                self.on_promote(term)
+        elif was_leader and not leader:
+            logger.warning(f"Node {self.node_id} lost the lease, switching to standby")
+            if self.on_demote:
+                self.on_demote()
+        return leader
+
+    def is_leader(self) -> bool:
+        """True while this node holds an unexpired lease"""
+        return self.leader and time.monotonic() < self.expires_at - self.safety_margin
+
+    def save_state(self, state: Dict[str, Any]) -> bool:
+        """Publish handoff state, only if this node still holds the current term"""
+        try:
+            with closing(self._connect()) as conn:
+                cursor = conn.execute("""
+                    INSERT INTO handoff_state (name, term, updated_at, state)
+                    SELECT ?, ?, ?, ?
+                    WHERE EXISTS (SELECT 1 FROM lease WHERE name = ? AND holder = ? AND term = ?)
+                    ON CONFLICT(name) DO UPDATE SET
+                        term = excluded.term, updated_at = excluded.updated_at, state = excluded.state
+                """, (LEASE_NAME, self.term, time.time(), json.dumps(state),
+                      LEASE_NAME, self.node_id, self.term))
+                return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.error(f"Failed to save handoff state: {e}")
+            return False
+
+    def load_state(self) -> Optional[Dict[str, Any]]:
+        """Handoff state written by the most recent leader"""
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute(
+                    "SELECT state FROM handoff_state WHERE name = ?", (LEASE_NAME,)
+                ).fetchone()
+            return json.loads(row[0]) if row else None
+        except (sqlite3.Error, ValueError) as e:
+            logger.error(f"Failed to load handoff state: {e}")
+            return None
+
+    def _run(self):
+        interval = self.ttl / 3
+        while not self._stop.wait(interval):
+            self.try_acquire()
+
+    def start(self):
+        """Try to take the lease now, then keep renewing/watching in the background"""
+        self.try_acquire()
+        self._thread = threading.Thread(target=self._run, name='ha-lease', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop renewing and release the lease so the standby takes over at once"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.ttl)
+        if not self.leader:
+            return
+        try:
+            with closing(self._connect()) as conn:
+                conn.execute(
+                    "UPDATE lease SET expires_at = 0 WHERE name = ? AND holder = ?",
+                    (LEASE_NAME, self.node_id)
+                )
+            logger.info(f"Node {self.node_id} released the lease")
+        except sqlite3.Error as e:
+            logger.error(f"Failed to release lease: {e}")
+        self.leader = False
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+In-memory last-value table for live dashboard widgets
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+QUALITY_GOOD = 'good'
+QUALITY_COMM_ERROR = 'comm_error'
+QUALITY_STALE = 'stale'
+
+
+class LastValueCache:
+    """Latest reading per (device_id, parameter) with change versions
+
+    Every update bumps a global version and the device's version; readers use
+    them as ETags and can block until either moves past a version they hold.
+    Values ageing into `stale` bump the versions too, and ETags carry a
+    per-process epoch so a restarted poller never repeats an old tag.
+    """
+
+    def __init__(self, stale_after: float = 3600.0):
+        self.stale_after = stale_after
+        self.entries: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        self.epoch = f"{int(time.time() * 1000):x}"
+        self.version = 0
+        self.device_versions: Dict[int, int] = {}
+        self.changed = threading.Condition()
+
+    def _bump(self, device_id: int):
+        self.version += 1
+        self.device_versions[device_id] = self.version
+
+    def _age_out(self):
+        """Mark good values not updated for `stale_after` seconds as stale (lock held)"""
+        cutoff = time.time() - self.stale_after
+        aged = {entry["device_id"] for entry in self.entries.values()
+                if entry["quality"] == QUALITY_GOOD and entry["updated_at"] < cutoff}
+        if not aged:
+            return
+        for entry in self.entries.values():
+            if entry["device_id"] in aged and entry["quality"] == QUALITY_GOOD and entry["updated_at"] < cutoff:
+                entry["quality"] = QUALITY_STALE
+        for device_id in aged:
+            self._bump(device_id)
+        self.changed.notify_all()
+
+    def etag(self, version: int) -> str:
+        return f'"{self.epoch}-{version}"'
+
+    def update(self, readings: List[Dict[str, Any]], quality: str = QUALITY_GOOD):
+        """Record the newest value of each reading's register"""
+        if not readings:
+            return
+        now = time.time()
+        with self.changed:
+            for device_id in {reading['device_id'] for reading in readings}:
+                self._bump(device_id)
+            for reading in readings:
+                self.entries[(reading['device_id'], reading['parameter'])] = {
+                    "device_id": reading['device_id'],
+                    "parameter": reading['parameter'],
+                    "value": reading['value'],
+                    "unit": reading.get('unit', ''),
+                    "timestamp": reading['timestamp'],
+                    "quality": reading.get('quality', quality),
+                    "updated_at": now
+                }
+            self.changed.notify_all()
+
+    def mark_device(self, device_id: int, quality: str):
+        """Flag every value of a device, e.g. when it stopped answering"""
+        with self.changed:
+            entries = [entry for key, entry in self.entries.items() if key[0] == device_id]
+            if not entries or all(entry["quality"] == quality for entry in entries):
+                return
+            for entry in entries:
+                entry["quality"] = quality
+            self._bump(device_id)
+            self.changed.notify_all()
+
+    def current_version(self, device_id: Optional[int] = None) -> int:
+        with self.changed:
+            self._age_out()
+            if device_id is None:
+                return self.version
+            return self.device_versions.get(device_id, 0)
+
+    def snapshot(self, device_id: Optional[int] = None) -> Tuple[int, List[Dict[str, Any]]]:
+        """(version, values) for all devices or one device"""
+        with self.changed:
+            version = self.current_version(device_id)
+            values = []
+            for (entry_device, _), entry in self.entries.items():
+                if device_id is not None and entry_device != device_id:
+                    continue
+                value = dict(entry)
+                del value["updated_at"]
+                values.append(value)
+            return version, values
+
+    def wait_for_change(self, version: int, timeout: float, device_id: Optional[int] = None) -> bool:
+        """Block until the version moves past `version`; False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self.changed:
+            while self.current_version(device_id) == version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                # Wake up now and then so values ageing out count as a change
+                self.changed.wait(min(remaining, 1.0))
+            return True
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Load generator for the readings ingestion API
+Posts synthetic readings for N virtual devices at a target rate and reports throughput and latency
+
+Virtual devices take their parameters from config.json in turn and each
+gets a device id of its own, from --device-ids (test devices set up in
+Laravel) or, with --allow-real-devices, the configured devices themselves.
+The send schedule is open-loop: batches fall due at the target rate whether
+or not earlier ones were answered. Besides the request latency, the report
+gives the response time measured from when each batch was due, which keeps
+the time spent waiting behind a slow API in the percentiles (no
+coordinated omission), and `max_lag_s` shows how far the generator fell
+behind.
+
+    python loadgen.py --device-ids 9001-9200 --rate 2000 --batch-size 100 --concurrency 8 --duration 60
+    python loadgen.py --allow-real-devices --rate 50 --batch-size 1 --output load.json
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import math
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from device_config import DeviceConfig, parse_config
+from diagnostics import percentiles
+
+logger = logging.getLogger(__name__)
+
+API_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+DAY = 86400.0
+
+# Readings per request accepted by POST /api/readings/batch
+MAX_BATCH = 1000
+
+# (keyword in the parameter name, base, amplitude) for waveform registers
+WAVE_RANGES = (
+    ('Voltage', 230.0, 5.0),
+    ('Current', 10.0, 5.0),
+    ('Power', 3.0, 2.0),
+    ('Frequency', 50.0, 0.05),
+    ('Flow', 30.0, 20.0),
+    ('Temperature', 20.0, 5.0),
+)
+
+# (keyword, increase per second) for cumulative counter registers
+COUNTER_RATES = (
+    ('Energy', 0.001),
+    ('Volume', 0.01),
+    ('Runtime', 1 / 3600),
+    ('Total', 0.01),
+)
+
+
+@dataclass
+class SignalModel:
+    """Synthetic value of one register over time
+
+    A 'wave' follows a daily cycle around `base` with Gaussian noise; a
+    'counter' only ever increases, at `rate` per second give or take `noise`.
+    """
+    kind: str
+    base: float
+    amplitude: float = 0.0
+    noise: float = 0.0
+    rate: float = 0.0
+    phase: float = 0.0
+    last_time: Optional[float] = None
+
+    def value(self, t: float, rng: random.Random) -> float:
+        if self.kind == 'counter':
+            if self.last_time is not None and t > self.last_time:
+                self.base += self.rate * (t - self.last_time) * max(0.0, 1 + rng.gauss(0, self.noise))
+            self.last_time = t
+            return round(self.base, 3)
+        cycle = math.sin(2 * math.pi * t / DAY + self.phase)
+        return round(self.base + self.amplitude * cycle + rng.gauss(0, self.noise), 3)
+
+
+def model_for(parameter: str, rng: random.Random) -> SignalModel:
+    """Waveform or counter model chosen from the parameter name"""
+    for keyword, rate in COUNTER_RATES:
+        if keyword in parameter:
+            return SignalModel('counter', base=rng.uniform(100, 10000), rate=rate * rng.uniform(0.5, 1.5),
+                               noise=0.2)
+    for keyword, base, amplitude in WAVE_RANGES:
+        if keyword in parameter:
+            break
+    else:
+        base, amplitude = 50.0, 25.0
+    return SignalModel('wave', base=base, amplitude=amplitude * rng.uniform(0.5, 1.0),
+                       noise=amplitude * 0.02, phase=rng.uniform(0, 2 * math.pi))
+
+
+class ReadingSource:
+    """Readings of N virtual devices, one whole device snapshot after another
+
+    Virtual device i uses the registers of the i-th configured device (in
+    turn) and device id `device_ids[i]`, or that configured device's own id
+    when no ids are given. Ids are never shared, so every counter series only
+    ever increases.
+    """
+
+    def __init__(self, devices: List[DeviceConfig], count: Optional[int] = None, seed: int = 42,
+                 alerts_evaluated: bool = False, device_ids: Optional[List[int]] = None):
+        templates = [device for device in devices if device.registers]
+        if not templates:
+            raise ValueError("The configuration has no registers to generate readings for")
+        ids = device_ids if device_ids is not None else [template.device_id for template in templates]
+        count = len(ids) if count is None else count
+        if not 1 <= count <= len(ids):
+            raise ValueError(f"{count} virtual devices need as many distinct device ids, {len(ids)} available")
+        self.rng = random.Random(seed)
+        self.alerts_evaluated = alerts_evaluated
+        self.fleet: List[Tuple[int, List[Tuple[str, str, SignalModel]]]] = [
+            (ids[index], [(register.parameter, register.unit, model_for(register.parameter, self.rng))
+                          for register in templates[index % len(templates)].registers])
+            for index in range(count)
+        ]
+        self.position = 0
+        self.pending: List[Dict[str, Any]] = []
+
+    def batch(self, size: int) -> List[Dict[str, Any]]:
+        """The next `size` readings; a snapshot split across batches continues in the next one"""
+        now = time.time()
+        timestamp = datetime.fromtimestamp(now, timezone.utc).strftime(API_TIMESTAMP_FORMAT)
+        while len(self.pending) < size:
+            device_id, registers = self.fleet[self.position]
+            self.position = (self.position + 1) % len(self.fleet)
+            for parameter, unit, model in registers:
+                reading = {
+                    "device_id": device_id,
+                    "parameter": parameter,
+                    "value": model.value(now, self.rng),
+                    "unit": unit,
+                    "timestamp": timestamp
+                }
+                if self.alerts_evaluated:
+                    reading["alerts_evaluated"] = True
+                self.pending.append(reading)
+        batch, self.pending = self.pending[:size], self.pending[size:]
+        return batch
+
+
+class LoadStats:
+    """Request outcomes, per reporting window and in total"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total = self._empty()
+        self.window = self._empty()
+
+    @staticmethod
+    def _empty() -> Dict[str, Any]:
+        return {"requests": 0, "readings_sent": 0, "readings_stored": 0, "readings_rejected": 0,
+                "readings_failed": 0, "latencies": [], "response_times": [], "statuses": Counter()}
+
+    def record(self, latency: Optional[float], response_time: Optional[float], status: str,
+               sent: int, stored: int, rejected: int):
+        """`latency` from sending the request, `response_time` from when the batch was due"""
+        with self.lock:
+            for stats in (self.total, self.window):
+                stats["requests"] += 1
+                stats["readings_sent"] += sent
+                stats["readings_stored"] += stored
+                stats["readings_rejected"] += rejected
+                stats["readings_failed"] += sent - stored - rejected
+                stats["statuses"][status] += 1
+                if latency is not None:
+                    stats["latencies"].append(latency)
+                    stats["response_times"].append(response_time)
+
+    def take_window(self) -> Dict[str, Any]:
+        with self.lock:
+            window, self.window = self.window, self._empty()
+        return window
+
+    @staticmethod
+    def summarize(stats: Dict[str, Any], seconds: float) -> Dict[str, Any]:
+        sent = stats["readings_sent"]
+        return {
+            "requests": stats["requests"],
+            "readings_sent": sent,
+            "readings_stored": stats["readings_stored"],
+            "readings_rejected": stats["readings_rejected"],
+            "readings_failed": stats["readings_failed"],
+            "throughput_per_s": round(stats["readings_stored"] / seconds, 1) if seconds > 0 else None,
+            "error_rate": round((sent - stats["readings_stored"]) / sent, 4) if sent else None,
+            "latency": percentiles(stats["latencies"]),
+            "response_time": percentiles(stats["response_times"]),
+            "statuses": dict(stats["statuses"])
+        }
+
+
+class ApiClient:
+    """One keep-alive HTTP connection to the ingestion API
+
+    Uses http.client rather than requests so that the generator's own
+    per-request overhead stays small next to the server's.
+    """
+
+    def __init__(self, url: str, timeout: float):
+        parts = urlsplit(url)
+        connection = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection(parts.hostname, parts.port, timeout=timeout)
+        self.path = parts.path or '/'
+        if parts.query:
+            self.path += f"?{parts.query}"
+
+    def post(self, payload: Any) -> Tuple[int, bytes]:
+        body = json.dumps(payload).encode()
+        try:
+            self.connection.request('POST', self.path, body=body, headers={
+                'Content-Type': 'application/json',
+                'Accept': 'application/json'
+            })
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnect on the next request
+            self.connection.close()
+            raise
+
+    def close(self):
+        self.connection.close()
+
+
+def store_outcome(status: int, body: bytes, batch: List[Dict[str, Any]],
+                  batched: bool) -> Tuple[int, int]:
+    """(stored, rejected) readings of one response; the rest failed and could be retried"""
+    if status == 429 or status >= 500:
+        return 0, 0
+    if not batched:
+        return (1, 0) if status in (200, 201) else (0, 1)
+    if status != 200:
+        return 0, len(batch)
+    results = json.loads(body).get('results', [])
+    stored = sum(1 for result in results if result['status'] in (200, 201))
+    failed = sum(1 for result in results if result['status'] >= 500)
+    return stored, len(batch) - stored - failed
+
+
+class LoadGenerator:
+    """Sends readings at `rate` per second through `concurrency` keep-alive connections"""
+
+    def __init__(self, source: ReadingSource, url: str, batch_url: str, rate: float, batch_size: int = 100,
+                 concurrency: int = 4, timeout: float = 30.0):
+        self.source = source
+        self.url = url
+        self.batch_url = batch_url
+        self.rate = rate
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.stats = LoadStats()
+        self.queue: queue.Queue = queue.Queue(maxsize=self.concurrency * 2)
+        self.max_lag = 0.0
+
+    def _worker(self):
+        batched = self.batch_size > 1
+        client = ApiClient(self.batch_url if batched else self.url, self.timeout)
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    return
+                due, batch = item
+                start = time.monotonic()
+                try:
+                    status, body = client.post({"readings": batch} if batched else batch[0])
+                    done = time.monotonic()
+                    stored, rejected = store_outcome(status, body, batch, batched)
+                    self.stats.record(done - start, done - due, str(status), len(batch), stored, rejected)
+                except (OSError, http.client.HTTPException, ValueError) as e:
+                    logger.debug(f"Request failed: {e}")
+                    self.stats.record(None, None, type(e).__name__, len(batch), 0, 0)
+        finally:
+            client.close()
+
+    def run(self, duration: float, interval: float = 5.0) -> Dict[str, Any]:
+        """Send for `duration` seconds, reporting every `interval`; returns the final report"""
+        workers = [threading.Thread(target=self._worker, name=f"loadgen-{index}", daemon=True)
+                   for index in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+
+        windows = []
+        start = time.monotonic()
+        next_report = start + interval
+        window_start = start
+        queued = 0
+        while True:
+            now = time.monotonic()
+            if now >= next_report:
+                windows.append(self._report_window(now - start, now - window_start))
+                window_start, next_report = now, next_report + interval
+            if now - start >= duration:
+                break
+            due = start + queued / self.rate
+            if due > now:
+                time.sleep(max(0.0, min(due, next_report, start + duration) - now))
+                continue
+            self.max_lag = max(self.max_lag, now - due)
+            # Blocks while every connection is busy and the queue is full; the
+            # batch keeps its due time so that wait counts in its response time
+            self.queue.put((due, self.source.batch(self.batch_size)))
+            queued += self.batch_size
+
+        for _ in workers:
+            self.queue.put(None)
+        for worker in workers:
+            worker.join(timeout=self.timeout)
+        elapsed = time.monotonic() - start
+        if self.stats.window["requests"]:
+            windows.append(self._report_window(elapsed, time.monotonic() - window_start))
+
+        return {
+            "generated_at": datetime.now(timezone.utc).strftime(API_TIMESTAMP_FORMAT),
+            "url": self.batch_url if self.batch_size > 1 else self.url,
+            "virtual_devices": len(self.source.fleet),
+            "target_rate_per_s": self.rate,
+            "batch_size": self.batch_size,
+            "concurrency": self.concurrency,
+            "duration_s": round(elapsed, 3),
+            "max_lag_s": round(self.max_lag, 3),
+            "total": LoadStats.summarize(self.stats.total, elapsed),
+            "windows": windows
+        }
+
+    def _report_window(self, at: float, seconds: float) -> Dict[str, Any]:
+        window = {"t_s": round(at, 1), **LoadStats.summarize(self.stats.take_window(), seconds)}
+        latency, response = window["latency"], window["response_time"]
+        print(f"t={window['t_s']:>6}s stored {window['throughput_per_s']}/s of {self.rate:g}/s target, "
+              f"{window['requests']} requests, p50 {latency.get('p50_ms')} ms, p99 {latency.get('p99_ms')} ms, "
+              f"p99 from schedule {response.get('p99_ms')} ms, errors {window['error_rate'] if window['error_rate'] is not None else '-'}",
+              file=sys.stderr)
+        return window
+
+
+def device_id_list(text: str) -> List[int]:
+    """Device ids from a list like '9001-9100,9150'"""
+    ids = []
+    try:
+        for part in text.split(','):
+            low, _, high = part.strip().partition('-')
+            ids.extend(range(int(low), int(high or low) + 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid device id list '{text}'") from None
+    if not ids or len(set(ids)) != len(ids):
+        raise argparse.ArgumentTypeError(f"device id list '{text}' is empty or repeats ids")
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the readings API with synthetic load")
+    parser.add_argument('--config', default=os.getenv('MODBUS_CONFIG', 'config.json'),
+                        help='devices and parameters to generate readings for (default: $MODBUS_CONFIG or config.json)')
+    parser.add_argument('--url', default=os.getenv('LARAVEL_API_URL', 'http://localhost:8000/api/readings'),
+                        help='single-reading endpoint (default: $LARAVEL_API_URL)')
+    parser.add_argument('--batch-url', help='batch endpoint (default: $API_BATCH_URL or URL/batch)')
+    parser.add_argument('--device-ids', type=device_id_list,
+                        help='device ids to write to, e.g. 9001-9200: test devices in Laravel with the '
+                             'parameters of the configured devices')
+    parser.add_argument('--allow-real-devices', action='store_true',
+                        help='write to the configured devices themselves instead of --device-ids')
+    parser.add_argument('--devices', type=int,
+                        help='virtual devices, each with its own device id (default: one per id)')
+    parser.add_argument('--rate', type=float, default=500, help='readings per second to send (default: %(default)s)')
+    parser.add_argument('--batch-size', type=int, default=100,
+                        help='readings per request; 1 posts to the single-reading endpoint (default: %(default)s)')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='keep-alive connections sending at once (default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=60, help='seconds to send for (default: %(default)s)')
+    parser.add_argument('--interval', type=float, default=5, help='seconds per report window (default: %(default)s)')
+    parser.add_argument('--timeout', type=float, default=30, help='request timeout in seconds (default: %(default)s)')
+    parser.add_argument('--alerts-evaluated', action='store_true',
+                        help='mark readings alerts_evaluated, as the poller does with EDGE_ALERTS')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for the signal models')
+    parser.add_argument('--max-error-rate', type=float, default=0.01,
+                        help='exit 1 if more readings than this share were not stored (default: %(default)s)')
+    parser.add_argument('--output', help='write the JSON report to this file (default: stdout)')
+    args = parser.parse_args()
+    if not 1 <= args.batch_size <= MAX_BATCH:
+        parser.error(f"--batch-size must be between 1 and {MAX_BATCH}, the API's batch limit")
+    if args.rate <= 0:
+        parser.error("--rate must be positive")
+    if (args.device_ids is None) == (not args.allow_real_devices):
+        parser.error("pass either --device-ids for test devices or --allow-real-devices")
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    with open(args.config, 'r') as f:
+        devices = parse_config(json.load(f))
+    try:
+        source = ReadingSource(devices, args.devices, args.seed, args.alerts_evaluated, args.device_ids)
+    except ValueError as e:
+        parser.error(str(e))
+    batch_url = args.batch_url or os.getenv('API_BATCH_URL') or f"{args.url}/batch"
+    generator = LoadGenerator(source, args.url, batch_url, args.rate, args.batch_size,
+                              args.concurrency, args.timeout)
+    report = generator.run(args.duration, args.interval)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    total = report["total"]
+    print(f"{total['readings_stored']}/{total['readings_sent']} readings stored in {report['duration_s']} s: "
+          f"{total['throughput_per_s']}/s against {args.rate:g}/s target, "
+          f"p50 {total['latency'].get('p50_ms')} ms, p99 {total['latency'].get('p99_ms')} ms, "
+          f"p99 from schedule {total['response_time'].get('p99_ms')} ms, max lag {report['max_lag_s']} s", file=sys.stderr)
+    if total['error_rate'] is None or total['error_rate'] > args.max_error_rate:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Local HTTP/JSON API of the Modbus polling service
+Serves commands and live data to the dashboard host without going through MySQL
+"""
+
+import hmac
+import json
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from commands import CommandError, CommandExecutor
+from ondemand import ReadCoalescer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ApiRequest:
+    """A parsed request passed to route handlers"""
+    method: str
+    path: str
+    params: Dict[str, str]
+    query: Dict[str, str]
+    headers: Any
+    body: Any = None
+
+
+@dataclass
+class ApiResponse:
+    """What a route handler returns"""
+    status: int
+    body: Any = None
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+Handler = Callable[[ApiRequest], ApiResponse]
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """Dispatches requests to the routes registered on LocalApiServer"""
+
+    server: 'LocalApiServer'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(f"Local API {self.address_string()} {format % args}")
+
+    def _send(self, response: ApiResponse):
+        payload = b'' if response.body is None else json.dumps(response.body).encode('utf-8')
+        self.send_response(response.status)
+        if response.body is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in response.headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if payload and self.command != 'HEAD':
+            self.wfile.write(payload)
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        try:
+            if not self.server.authorized(self.headers):
+                return self._send(ApiResponse(401, {"success": False, "message": "Unauthorized"}))
+
+            match = self.server.match(self.command, url.path)
+            if match is None:
+                return self._send(ApiResponse(404, {"success": False, "message": "Not found"}))
+            handler, params = match
+
+            body = None
+            length = int(self.headers.get('Content-Length') or 0)
+            if length:
+                body = json.loads(self.rfile.read(length))
+
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            self._send(handler(ApiRequest(self.command, url.path, params, query, self.headers, body)))
+
+        except (ValueError, CommandError) as e:
+            self._send(ApiResponse(400, {"success": False, "message": str(e)}))
+        except Exception as e:
+            logger.error(f"Local API error on {self.command} {url.path}: {e}")
+            self._send(ApiResponse(500, {"success": False, "message": "Internal error"}))
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+class LocalApiServer(ThreadingHTTPServer):
+    """Small threaded HTTP server with regex routes"""
+
+    daemon_threads = True
+    # Many widgets refresh at once; the default backlog of 5 drops connections
+    request_queue_size = 128
+
+    def __init__(self, host: str, port: int, token: str = None):
+        super().__init__((host, port), ApiRequestHandler)
+        self.token = token
+        self.routes: List[Tuple[str, Pattern, Handler]] = []
+        self.thread: Optional[threading.Thread] = None
+
+    def route(self, method: str, pattern: str, handler: Handler):
+        """Register a handler; named groups in `pattern` become request params"""
+        self.routes.append((method, re.compile(f"^{pattern}$"), handler))
+
+    def match(self, method: str, path: str) -> Optional[Tuple[Handler, Dict[str, str]]]:
+        for route_method, pattern, handler in self.routes:
+            found = pattern.match(path)
+            if found and route_method == method:
+                return handler, found.groupdict()
+        return None
+
+    def authorized(self, headers) -> bool:
+        if not self.token:
+            return True
+        supplied = headers.get('Authorization', '')
+        return hmac.compare_digest(supplied, f"Bearer {self.token}")
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name='local-api', daemon=True)
+        self.thread.start()
+        logger.info(f"Local API listening on {self.server_address[0]}:{self.server_address[1]}")
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def create_local_api(poller, is_active: Callable[[], bool] = lambda: True) -> Optional[LocalApiServer]:
+    """Build the local API from LOCAL_API_* variables; None when disabled"""
+    port = int(os.getenv('LOCAL_API_PORT', '0'))
+    if not port:
+        return None
+
+    server = LocalApiServer(
+        os.getenv('LOCAL_API_HOST', '127.0.0.1'),
+        port,
+        token=os.getenv('LOCAL_API_TOKEN') or None
+    )
+    executor = CommandExecutor(poller, poller.pool)
+    coalescer = ReadCoalescer(poller, ttl=float(os.getenv('ONDEMAND_CACHE_TTL', '2')))
+    max_wait = float(os.getenv('LIVE_VALUES_MAX_WAIT', '30'))
+
+    def write(request: ApiRequest) -> ApiResponse:
+        if not is_active():
+            return ApiResponse(503, {"success": False, "message": "This node is on standby"})
+        if not isinstance(request.body, dict):
+            raise ValueError("Expected a JSON object")
+        result = executor.execute(request.body)
+        return ApiResponse(200 if result["success"] else 502, result)
+
+    def read(request: ApiRequest) -> ApiResponse:
+        if not is_active():
+            return ApiResponse(503, {"success": False, "message": "This node is on standby"})
+        device_id = int(request.params['device_id'])
+        max_age = request.query.get('max_age')
+        readings, age = coalescer.read(device_id, float(max_age) if max_age is not None else None)
+        if not readings:
+            return ApiResponse(502, {"success": False, "message": f"Could not read device {device_id}"})
+
+        wanted = request.query.get('parameters')
+        missing = []
+        if wanted:
+            names = [name.strip() for name in wanted.split(',') if name.strip()]
+            by_name = {reading['parameter']: reading for reading in readings}
+            missing = [name for name in names if name not in by_name]
+            readings = [by_name[name] for name in names if name in by_name]
+
+        return ApiResponse(200, {
+            "success": True,
+            "device_id": device_id,
+            "age_ms": round(age * 1000, 1),
+            "readings": readings,
+            "missing": missing
+        })
+
+    def read_stats(request: ApiRequest) -> ApiResponse:
+        return ApiResponse(200, coalescer.stats)
+
+    def sender_stats(request: ApiRequest) -> ApiResponse:
+        if poller.sender is None:
+            return ApiResponse(404, {"success": False, "message": "Batch sending is disabled"})
+        return ApiResponse(200, poller.sender.metrics())
+
+    def sink_stats(request: ApiRequest) -> ApiResponse:
+        return ApiResponse(200, poller.sinks.stats() if poller.sinks is not None else {})
+
+    def values(request: ApiRequest) -> ApiResponse:
+        device_id = request.params.get('device_id')
+        if device_id is not None:
+            device_id = int(device_id)
+            if poller.device_by_id(device_id) is None:
+                raise ValueError(f"Device {device_id} is not configured")
+
+        # Long-poll: hold the request while the client's copy is still current
+        client_tag = request.headers.get('If-None-Match')
+        wait = min(float(request.query.get('wait', '0')), max_wait)
+        version = poller.live.current_version(device_id)
+        if wait > 0 and client_tag == poller.live.etag(version):
+            poller.live.wait_for_change(version, wait, device_id)
+
+        version, snapshot = poller.live.snapshot(device_id)
+        headers = {"ETag": poller.live.etag(version), "Cache-Control": "no-cache"}
+        if client_tag == headers["ETag"]:
+            return ApiResponse(304, headers=headers)
+        return ApiResponse(200, {"version": version, "values": snapshot}, headers)
+
+    server.route('POST', r'/commands/write', write)
+    server.route('GET', r'/devices/(?P<device_id>\d+)/read', read)
+    server.route('GET', r'/stats/reads', read_stats)
+    server.route('GET', r'/stats/sender', sender_stats)
+    server.route('GET', r'/stats/sinks', sink_stats)
+    server.route('GET', r'/values', values)
+    server.route('GET', r'/values/(?P<device_id>\d+)', values)
+    return server
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+On-demand device reads with request coalescing for the Modbus polling service
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from connections import PRIORITY_READ
+
+logger = logging.getLogger(__name__)
+
+
+class _InflightRead:
+    """A device read that concurrent callers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.readings: List[Dict[str, Any]] = []
+
+
+class ReadCoalescer:
+    """Serves fresh device snapshots, one Modbus transaction per device at a time
+
+    Callers arriving while a read of the same device is in flight share its
+    result, and completed snapshots are reused for `ttl` seconds.
+    """
+
+    def __init__(self, poller, ttl: float = 2.0):
+        self.poller = poller
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.cache: Dict[int, Tuple[float, List[Dict[str, Any]]]] = {}
+        self.inflight: Dict[int, _InflightRead] = {}
+        self.stats = {"requests": 0, "cache_hits": 0, "coalesced": 0, "device_reads": 0}
+
+    def read(self, device_id: int, max_age: Optional[float] = None) -> Tuple[List[Dict[str, Any]], float]:
+        """Snapshot of a device and its age in seconds"""
+        device = self.poller.device_by_id(device_id)
+        if device is None:
+            raise ValueError(f"Device {device_id} is not configured")
+        max_age = self.ttl if max_age is None else min(max_age, self.ttl)
+
+        with self.lock:
+            self.stats["requests"] += 1
+            cached = self.cache.get(device_id)
+            if cached is not None and time.monotonic() - cached[0] <= max_age:
+                self.stats["cache_hits"] += 1
+                return cached[1], time.monotonic() - cached[0]
+
+            inflight = self.inflight.get(device_id)
+            leader = inflight is None
+            if leader:
+                inflight = _InflightRead()
+                self.inflight[device_id] = inflight
+                self.stats["device_reads"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            inflight.done.wait()
+            return inflight.readings, 0.0
+
+        try:
+            # Checked against the polled history but leaving it untouched
+            readings = self.poller.quality.validate(
+                device, self.poller.read_device_registers(device, priority=PRIORITY_READ), update=False)
+            readings.extend(self.poller.compute_virtual(device, readings))
+            if self.poller.alerts is not None:
+                self.poller.alerts.evaluate(readings)
+            inflight.readings = readings
+            self.poller.live.update(readings)
+            with self.lock:
+                if readings:
+                    self.cache[device_id] = (time.monotonic(), readings)
+        except Exception as e:
+            logger.error(f"On-demand read of device {device_id} failed: {e}")
+        finally:
+            with self.lock:
+                del self.inflight[device_id]
+            inflight.done.set()
+
+        return inflight.readings, 0.0
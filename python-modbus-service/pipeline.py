@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Staged polling pipeline for the Modbus polling service
+Acquire, decode, process, spool and send run as stages connected by bounded queues
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import tracing
+from last_values import QUALITY_COMM_ERROR
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class Stage:
+    """Worker threads fed from a bounded queue
+
+    `handler(item, emit)` processes one item and passes results on with
+    `emit`, which blocks while the next stage's queue is full. That is the
+    backpressure: a slow stage stalls the ones before it instead of letting
+    work pile up in memory.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any, Callable[[Any], None]], None],
+                 workers: int = 1, queue_size: int = 64):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self.output: Optional['Stage'] = None
+        self.threads: List[threading.Thread] = []
+        self.lock = threading.Lock()
+        self.stats = {"processed": 0, "errors": 0, "max_queued": 0, "busy_s": 0.0, "blocked_s": 0.0}
+
+    def then(self, stage: 'Stage') -> 'Stage':
+        self.output = stage
+        return stage
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, item):
+        """Queue an item, waiting while the queue is full"""
+        self.queue.put(item)
+        with self.lock:
+            self.stats["max_queued"] = max(self.stats["max_queued"], self.queue.qsize())
+
+    def emit(self, item):
+        start = time.monotonic()
+        self.output.put(item)
+        with self.lock:
+            self.stats["blocked_s"] += time.monotonic() - start
+
+    def _handle(self, item):
+        start = time.monotonic()
+        try:
+            self.handler(item, self.emit)
+        except Exception as e:
+            logger.error(f"Pipeline stage {self.name} failed: {e}")
+            with self.lock:
+                self.stats["errors"] += 1
+        with self.lock:
+            self.stats["processed"] += 1
+            self.stats["busy_s"] += time.monotonic() - start
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _DONE:
+                return
+            self._handle(item)
+
+    def finish(self):
+        """Process everything queued, then stop the workers"""
+        for _ in self.threads:
+            self.queue.put(_DONE)
+        for thread in self.threads:
+            thread.join()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue.maxsize,
+                **{key: round(value, 3) if isinstance(value, float) else value
+                   for key, value in self.stats.items()}
+            }
+
+
+class BatchStage(Stage):
+    """Collects reading lists into batches of `batch_size`, flushed at least every `max_wait` seconds
+
+    Until `drain()` is called, a batch the next stage cannot take at once is
+    held here rather than waited on, so a stalled upload never backs up into
+    polling. Held batches go out, in order, once the stages before are done.
+    """
+
+    def __init__(self, name: str, batch_size: int, max_wait: float, queue_size: int = 64):
+        super().__init__(name, lambda item, emit: None, workers=1, queue_size=queue_size)
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self.held: List[List[Dict[str, Any]]] = []
+        self.draining = threading.Event()
+        self.stats["max_held"] = 0
+
+    def drain(self):
+        """The stages before are finished: wait for the next stage from now on"""
+        self.draining.set()
+
+    def emit(self, item):
+        if item:
+            self.held.append(item)
+        if self.draining.is_set():
+            for batch in self.held:
+                super().emit(batch)
+            self.held = []
+            return
+        while self.held:
+            try:
+                self.output.queue.put_nowait(self.held[0])
+            except queue.Full:
+                with self.lock:
+                    self.stats["max_held"] = max(self.stats["max_held"], len(self.held))
+                return
+            self.held.pop(0)
+
+    def _run(self):
+        batch: List[Dict[str, Any]] = []
+        started = None
+        while True:
+            timeout = None if started is None else max(0.0, started + self.max_wait - time.monotonic())
+            if self.held:
+                # Retry held batches as the send queue frees up
+                timeout = 0.5 if timeout is None else min(timeout, 0.5)
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _DONE:
+                self.drain()
+                self.emit(batch)
+                return
+            if item:
+                batch.extend(item)
+                started = started or time.monotonic()
+                with self.lock:
+                    self.stats["processed"] += 1
+            while len(batch) >= self.batch_size:
+                self.emit(batch[:self.batch_size])
+                batch = batch[self.batch_size:]
+            if batch and started is not None and time.monotonic() - started >= self.max_wait:
+                self.emit(batch)
+                batch = []
+            elif self.held:
+                self.emit([])
+            if not batch:
+                started = None
+
+
+class PollPipeline:
+    """One polling cycle as acquire -> decode -> process -> spool -> send
+
+    - acquire: reads the raw register words of a device, several devices at once
+    - decode: turns words into reading records and tracks device health
+    - process: validation, virtual and derived parameters, alerts, live values, sinks, local store, compression
+    - spool: gathers readings into upload batches, sent when full or `batch_wait` old
+    - send: uploads a batch (concurrency within a batch comes from API_BATCH_SEND)
+
+    A device's readings are uploaded as soon as their batch is ready rather
+    than at the end of the cycle, and queued work is bounded by the queue sizes
+    whatever the fleet size.
+    """
+
+    def __init__(self, poller, acquire_workers: int = 4, decode_workers: int = 1, process_workers: int = 1,
+                 queue_size: int = 64, batch_size: int = 500, batch_wait: float = 5.0):
+        self.poller = poller
+        self.acquire_workers = acquire_workers
+        self.decode_workers = decode_workers
+        self.process_workers = process_workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.last_metrics: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_env(cls, poller) -> Optional['PollPipeline']:
+        """Build the pipeline from PIPELINE_* variables; None for the sequential cycle"""
+        if os.getenv('PIPELINE_STAGED', 'false').lower() != 'true':
+            return None
+        return cls(
+            poller,
+            acquire_workers=int(os.getenv('PIPELINE_ACQUIRE_WORKERS', '4')),
+            decode_workers=int(os.getenv('PIPELINE_DECODE_WORKERS', '1')),
+            process_workers=int(os.getenv('PIPELINE_PROCESS_WORKERS', '1')),
+            queue_size=int(os.getenv('PIPELINE_QUEUE_SIZE', '64')),
+            batch_size=int(os.getenv('PIPELINE_BATCH_SIZE', '500')),
+            batch_wait=float(os.getenv('PIPELINE_BATCH_WAIT', '5'))
+        )
+
+    def run(self, devices, backlog: List[Dict[str, Any]],
+            trailing: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Poll `devices` and upload their readings, then `trailing` and `backlog`; returns cycle counts"""
+        poller = self.poller
+        parent = tracing.current_context()
+        counts = {"devices_ok": 0, "readings_read": 0, "readings_sent": 0}
+        counts_lock = threading.Lock()
+
+        def acquire(device, emit):
+            if not poller.is_active():
+                return
+            with tracing.span('device', parent, device_id=device.device_id, ip=device.ip):
+                start = time.monotonic()
+                pieces = poller.fetch_device_blocks(device)
+            emit((device, pieces, time.monotonic() - start))
+
+        def decode(item, emit):
+            device, pieces, duration = item
+            with tracing.span('decode_device', parent, device_id=device.device_id):
+                readings = [reading for piece in pieces for reading in poller.decode_block(device, *piece)]
+            previous_success = poller.device_health.get(device.device_id, {}).get("last_success")
+            poller.update_device_health(device, readings, duration)
+            if not readings:
+                poller.live.mark_device(device.device_id, QUALITY_COMM_ERROR)
+                logger.warning(f"No readings obtained from device {device.device_id}")
+                return
+            if poller.backfill is not None:
+                poller.backfill.check(device, previous_success, readings[-1]["timestamp"])
+            emit((device, readings))
+
+        def process(item, emit):
+            device, readings = item
+            with tracing.span('process', parent, device_id=device.device_id, readings=len(readings)):
+                read = len(readings)
+                readings = poller.quality.validate(device, readings)
+                readings.extend(poller.compute_virtual(device, readings))
+                readings.extend(poller.derive_readings(device, readings))
+                if poller.alerts is not None:
+                    poller.alerts.evaluate(readings)
+                poller.live.update(readings)
+                if poller.sinks is not None:
+                    poller.sinks.publish(readings)
+                poller.store_readings(readings)
+                compressed = poller.compress_readings(device, readings)
+            with counts_lock:
+                counts["devices_ok"] += 1
+                counts["readings_read"] += read
+            logger.info(f"Successfully read {read} registers from device {device.device_id}")
+            if compressed:
+                emit(compressed)
+
+        def send(batch, emit):
+            if not poller.is_active():
+                # Lease lost mid-cycle: hold the batch until this node is active again
+                poller.queue_pending(batch)
+                return
+            poller.last_send_count = 0
+            with tracing.span('send', parent, readings=len(batch)):
+                poller.send_readings_to_api(poller.resolve_register_ids(batch))
+            counts["readings_sent"] += poller.last_send_count
+
+        stages = [
+            Stage('acquire', acquire, self.acquire_workers, self.queue_size),
+            Stage('decode', decode, self.decode_workers, self.queue_size),
+            Stage('process', process, self.process_workers, self.queue_size),
+            BatchStage('spool', self.batch_size, self.batch_wait, self.queue_size),
+            # One upload at a time keeps send order and the pending-retry list consistent
+            Stage('send', send, 1, 2),
+        ]
+        for stage, following in zip(stages, stages[1:]):
+            stage.then(following)
+        for stage in stages:
+            stage.start()
+
+        spool = stages[3]
+        for device in devices:
+            if not poller.is_active():
+                logger.warning("Lease lost, aborting polling cycle")
+                break
+            stages[0].put(device)
+        for stage in stages:
+            if stage is spool:
+                # Polling is over, so uploads may now hold up the spool; readings
+                # recovered from load profiles and those held back from earlier
+                # cycles go out behind this cycle's live data
+                spool.drain()
+                for extra in (trailing, backlog):
+                    for start in range(0, len(extra), self.batch_size):
+                        spool.put(extra[start:start + self.batch_size])
+            stage.finish()
+
+        self.last_metrics = {stage.name: stage.metrics() for stage in stages}
+        return counts
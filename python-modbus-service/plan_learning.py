@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Self-learning read plans for the Modbus polling service
+Learns each device's request size limit, invalid address ranges and request spacing from its responses
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from device_config import DeviceConfig, ReadBlock, build_read_plan
+
+logger = logging.getLogger(__name__)
+
+# Modbus exception codes that carry plan information
+ILLEGAL_DATA_ADDRESS = 0x02
+ILLEGAL_DATA_VALUE = 0x03
+SLAVE_DEVICE_BUSY = 0x06
+
+
+@dataclass
+class DeviceLimits:
+    """What one device has shown it accepts"""
+    max_ok: int = 0  # largest block read that succeeded
+    min_bad: Optional[int] = None  # smallest block read rejected as too large
+    holes: List[Tuple[int, int]] = field(default_factory=list)  # (start, end) ranges not to read across
+    gap: float = 0.0  # seconds to leave between requests
+
+    def block_limit(self, configured: int) -> int:
+        """Registers per request for the next plan
+
+        Until the bound is known exactly, each rejection halves the distance
+        between the largest read that worked and the smallest that did not.
+        """
+        if self.min_bad is None:
+            return configured
+        if self.max_ok >= self.min_bad - 1:
+            return max(1, min(configured, self.min_bad - 1))
+        return max(1, min(configured, (self.max_ok + self.min_bad) // 2))
+
+
+class ReadPlanLearner:
+    """Adapts block reads per device and persists what it learns to JSON
+
+    A block rejected with exception 03 lowers the device's registers per
+    request; one rejected with exception 02 marks the unconfigured words it
+    spanned (or the register itself, for a single read) as a hole; a busy
+    exception or an unanswered request doubles the gap between requests,
+    which then shrinks again while requests succeed.
+    """
+
+    def __init__(self, path: str, max_gap_words: int = 0, max_request_gap: float = 1.0):
+        self.path = path
+        self.max_gap_words = max_gap_words
+        self.max_request_gap = max_request_gap
+        self.lock = threading.Lock()
+        self.limits: Dict[str, DeviceLimits] = {}
+        self.plans: Dict[str, List[ReadBlock]] = {}
+        self.last_request: Dict[str, float] = {}
+        self.dirty = False
+        self.load()
+
+    @classmethod
+    def from_env(cls, shard: Optional[Tuple[int, int]] = None) -> Optional['ReadPlanLearner']:
+        """Build a learner from READ_PLAN_* variables; None while READ_PLAN_LEARN_PATH is unset"""
+        path = os.getenv('READ_PLAN_LEARN_PATH')
+        if not path:
+            return None
+        if shard:
+            path = f"{path}.{shard[0]}"
+        return cls(
+            path,
+            max_gap_words=int(os.getenv('READ_PLAN_MERGE_GAP', '0')),
+            max_request_gap=float(os.getenv('READ_PLAN_MAX_REQUEST_GAP', '1.0'))
+        )
+
+    @staticmethod
+    def key(device: DeviceConfig) -> str:
+        # Keyed by what is on the wire, so a renumbered device keeps its limits
+        return f"{device.ip}:{device.port}/{device.slave_id}"
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.limits = {
+                key: DeviceLimits(value.get('max_ok', 0), value.get('min_bad'),
+                                  [tuple(hole) for hole in value.get('holes', [])], value.get('gap', 0.0))
+                for key, value in data.items()
+            }
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning(f"Ignoring unreadable read plan state {self.path}: {e}")
+
+    def save(self):
+        """Write learned limits if anything changed since the last save"""
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {key: asdict(limits) for key, limits in self.limits.items()}
+            self.dirty = False
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write read plan state {self.path}: {e}")
+
+    def plan(self, device: DeviceConfig) -> List[ReadBlock]:
+        """The device's block reads under what has been learned so far"""
+        key = self.key(device)
+        with self.lock:
+            plan = self.plans.get(key)
+            if plan is None:
+                limits = self.limits.get(key) or DeviceLimits()
+                plan = build_read_plan(device.registers, limits.block_limit(device.max_block_registers),
+                                       self.max_gap_words, limits.holes)
+                self.plans[key] = plan
+            return plan
+
+    def wait(self, device: DeviceConfig):
+        """Sleep until the device's learned request gap has passed"""
+        key = self.key(device)
+        limits = self.limits.get(key)
+        if limits is None or not limits.gap:
+            return
+        remaining = self.last_request.get(key, 0.0) + limits.gap - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def observe(self, device: DeviceConfig, block: ReadBlock, ok: bool, exception_code: Optional[int] = None):
+        """Learn from the outcome of one block read"""
+        key = self.key(device)
+        with self.lock:
+            self.last_request[key] = time.monotonic()
+            limits = self.limits.setdefault(key, DeviceLimits())
+            before = asdict(limits)
+            limit_before = limits.block_limit(device.max_block_registers)
+
+            if ok:
+                limits.max_ok = max(limits.max_ok, block.count)
+                if limits.min_bad is not None and limits.max_ok >= limits.min_bad:
+                    # The device takes more than it used to (firmware update, replaced meter)
+                    limits.min_bad = None
+                # Creep back towards no gap while requests succeed
+                limits.gap = round(limits.gap * 0.98, 4) if limits.gap >= 0.001 else 0.0
+            elif exception_code == ILLEGAL_DATA_VALUE and block.count > 1:
+                limits.min_bad = min(limits.min_bad or block.count, block.count)
+                logger.info(f"Device {device.device_id} rejected {block.count} registers per request, "
+                            f"next plan reads at most {limits.block_limit(device.max_block_registers)}")
+            elif exception_code == ILLEGAL_DATA_ADDRESS:
+                new_holes = self._holes_in(block)
+                limits.holes.extend(hole for hole in new_holes if hole not in limits.holes)
+                if new_holes:
+                    logger.info(f"Device {device.device_id} rejected addresses "
+                                f"{', '.join(f'{start}-{end - 1}' for start, end in new_holes)}, "
+                                f"no longer reading across them")
+            elif exception_code == SLAVE_DEVICE_BUSY or exception_code is None:
+                limits.gap = min(self.max_request_gap, max(0.02, limits.gap * 2))
+                logger.info(f"Device {device.device_id} busy or not answering, "
+                            f"spacing requests {limits.gap * 1000:.0f} ms apart")
+
+            if asdict(limits) != before:
+                self.dirty = True
+                if limits.block_limit(device.max_block_registers) != limit_before \
+                        or limits.holes != before['holes']:
+                    self.plans.pop(key, None)
+
+    @staticmethod
+    def _holes_in(block: ReadBlock) -> List[Tuple[int, int]]:
+        """Unconfigured ranges a rejected block spanned, or the register itself for a single read"""
+        if len(block.registers) == 1:
+            return [(block.address, block.address + block.count)]
+        holes = []
+        covered = block.address
+        for offset, register in sorted(block.registers, key=lambda item: item[0]):
+            start = block.address + offset
+            if start > covered:
+                holes.append((covered, start))
+            covered = max(covered, start + register.width)
+        return holes
+
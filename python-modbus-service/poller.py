@@ -4,17 +4,41 @@ Modbus Polling Service for Energy Monitoring System
 Connects to Modbus TCP devices and sends readings to Laravel API
 """
 
+import time
+MODULE_START = time.perf_counter()
+
 import json
 import logging
-import requests
+import math
 import struct
 from datetime import datetime, timezone
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
-from pymodbus.client import ModbusTcpClient
-from pymodbus.exceptions import ModbusException, ConnectionException
-import time
+from typing import Callable, Dict, List, Optional, Any, Tuple
 import os
+from compression import CompressionStage
+from derived import DerivedStage
+from timeseries_store import TimeSeriesStore
+from sharding import HashRing
+from checkpoint import load_checkpoint, save_checkpoint
+from connections import ConnectionPool, PRIORITY_POLL
+from capture import FrameRecorder
+from plan_learning import ReadPlanLearner
+from backfill import Backfiller
+from pipeline import PollPipeline
+from quality import QualityValidator, IMPLAUSIBLE
+from alerts import AlertEvaluator
+from sender import BatchSender
+from sinks import SinkPipeline
+from profiler import CycleProfiler
+import tracing
+from registry import DeviceRegistry, registry_url
+from last_values import LastValueCache, QUALITY_COMM_ERROR
+from device_config import (
+    RegisterConfig, ReadBlock, DeviceConfig,
+    parse_config, config_digest, load_cached_plan, store_cached_plan
+)
+
+# pymodbus and requests are imported on first use: a one-shot run spends most
+# of its start-up time importing them, and neither is needed to load the plan
 
 # Configure logging
 logging.basicConfig(
@@ -27,62 +51,93 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@dataclass
-class RegisterConfig:
-    """Configuration for a single Modbus register"""
-    address: int
-    parameter: str
-    data_type: str  # 'float', 'int', 'uint16', 'uint32'
-    scale: float = 1.0
-    unit: str = ""
-    description: str = ""
+API_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# (block, raw register words, read timestamp) as returned by the gateway
+RawBlock = Tuple[ReadBlock, List[int], str]
 
-@dataclass
-class DeviceConfig:
-    """Configuration for a Modbus device"""
-    device_id: int
-    ip: str
-    port: int = 502
-    slave_id: int = 1
-    timeout: int = 10
-    registers: List[RegisterConfig] = None
+def reading_time(reading: Dict[str, Any]) -> float:
+    """Epoch seconds of a reading record's timestamp"""
+    try:
+        moment = datetime.strptime(reading['timestamp'], API_TIMESTAMP_FORMAT)
+        return moment.replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        # Readings checkpointed before timestamps matched the API format
+        return datetime.fromisoformat(reading['timestamp']).timestamp()
 
 class ModbusPoller:
     """Main Modbus polling service"""
     
-    def __init__(self, config_file: str = "config.json", api_url: str = None):
+    def __init__(self, config_file: str = "config.json", api_url: str = None,
+                 shard: Optional[Tuple[int, int]] = None):
         self.config_file = config_file
         self.api_url = api_url or "http://localhost:8000/api/readings"
+        self.shard = shard
         self.devices = self.load_config()
-        self.session = requests.Session()
+        self.last_cycle_stats: Dict[str, Any] = {}
+        self.last_send_count = 0
+        self._session = None
+        self.pool = ConnectionPool(FrameRecorder.from_env(shard))
+        self.plan_learner = ReadPlanLearner.from_env(shard)
+        self.compression = CompressionStage()
+        self.derived = DerivedStage()
+        self.quality = QualityValidator.from_env()
+        self.store = TimeSeriesStore.from_env()
+        self.device_health: Dict[int, Dict[str, Any]] = {}
+        self.alerts = AlertEvaluator.from_env(self.api_url)
+        self.registry = DeviceRegistry.from_env(self.api_url)
+        self.sender = BatchSender.from_env(self.api_url)
+        self.sinks = SinkPipeline.from_env()
+        self.profiler = CycleProfiler.from_env()
+        tracing.configure(shard)
+        if self.registry is not None:
+            self.sync_registry(force=True)
+        self.live = LastValueCache(stale_after=float(os.getenv('LIVE_VALUES_STALE_SECONDS', '3600')))
+        self.backfill = Backfiller.from_env(self)
+        self.pipeline = PollPipeline.from_env(self)
+        # Replaced by the scheduler in HA mode: checked before each device, and
+        # before uploading, so a node that loses its lease mid-cycle stops at once
+        self.is_active: Callable[[], bool] = lambda: True
+        self.pending_readings: List[Dict[str, Any]] = []
+        self.max_pending = int(os.getenv('MAX_PENDING_READINGS', '10000'))
+        self.checkpoint_path = os.getenv('CHECKPOINT_PATH')
+        if self.checkpoint_path and shard:
+            self.checkpoint_path = f"{self.checkpoint_path}.{shard[0]}"
+        self.restore_checkpoint()
         
+    @property
+    def session(self):
+        """HTTP session for the API, created on first use"""
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        return self._session
+    
     def load_config(self) -> List[DeviceConfig]:
         """Load device configuration from JSON file"""
         try:
-            with open(self.config_file, 'r') as f:
-                config_data = json.load(f)
+            with open(self.config_file, 'rb') as f:
+                raw = f.read()
             
-            devices = []
-            for device_data in config_data:
-                registers = []
-                for reg_data in device_data.get('registers', []):
-                    registers.append(RegisterConfig(
-                        address=reg_data['address'],
-                        parameter=reg_data['parameter'],
-                        data_type=reg_data.get('data_type', 'float'),
-                        scale=reg_data.get('scale', 1.0),
-                        unit=reg_data.get('unit', ''),
-                        description=reg_data.get('description', '')
-                    ))
-                
-                devices.append(DeviceConfig(
-                    device_id=device_data['device_id'],
-                    ip=device_data['ip'],
-                    port=device_data.get('port', 502),
-                    slave_id=device_data.get('slave_id', 1),
-                    timeout=device_data.get('timeout', 10),
-                    registers=registers
-                ))
+            # Reuse the compiled devices and read plans from the last run
+            # unless config.json changed since
+            digest = config_digest(raw)
+            cache_path = os.getenv('CONFIG_CACHE_PATH', f"{self.config_file}.cache")
+            devices = load_cached_plan(cache_path, digest) if cache_path else None
+            
+            if devices is None:
+                devices = parse_config(json.loads(raw))
+                if cache_path:
+                    store_cached_plan(cache_path, digest, devices)
+            else:
+                logger.debug(f"Using compiled config from {cache_path}")
+            
+            if self.shard:
+                # Only keep the gateways this worker owns (see scheduler --workers)
+                index, count = self.shard
+                ring = HashRing(range(count))
+                devices = [device for device in devices if ring.node_for(device.ip) == index]
+                logger.info(f"Shard {index + 1}/{count} owns {len(devices)} devices")
             
             logger.info(f"Loaded configuration for {len(devices)} devices")
             return devices
@@ -122,88 +177,331 @@ class ModbusPoller:
             
         except Exception as e:
             logger.error(f"Error decoding register value: {e}")
-            return 0.0
+            # NaN rather than 0.0 so validation drops it instead of storing a plausible zero
+            return math.nan
     
-    def read_device_registers(self, device: DeviceConfig) -> List[Dict[str, Any]]:
-        """Read all registers for a single device"""
-        readings = []
-        client = None
+    def make_reading(self, device: DeviceConfig, register: RegisterConfig,
+                     words: List[int], timestamp: str) -> Dict[str, Any]:
+        """Decode one register's words into a reading record"""
+        raw_value = 0
+        for word in words:
+            # Multi-word values are big-endian (high word first)
+            raw_value = (raw_value << 16) | word
+        
+        value = self.decode_register_value(raw_value, register.data_type, register.scale)
+        logger.debug(f"Read {register.parameter}: {value} {register.unit}")
+        
+        return {
+            "device_id": device.device_id,
+            "parameter": register.parameter,
+            "value": round(value, 3),
+            "unit": register.unit,
+            "timestamp": timestamp,
+            "register_address": register.address,
+            "data_type": register.data_type,
+            "description": register.description
+        }
+    
+    def read_block(self, client, device: DeviceConfig, block: ReadBlock) -> List[Dict[str, Any]]:
+        """Read one block of registers, falling back to single reads if the block fails"""
+        return [reading for piece in self.fetch_block(client, device, block)
+                for reading in self.decode_block(device, *piece)]
+    
+    def fetch_block(self, client, device: DeviceConfig, block: ReadBlock) -> List[RawBlock]:
+        """Raw words of one block as (block, words, timestamp) pieces, single reads if the block fails
+
+        Connection-level errors (socket closed, no response) are raised so that
+        the pool drops the connection instead of handing the broken socket on.
+        """
+        from pymodbus.exceptions import ConnectionException, ModbusException, ModbusIOException
         
         try:
-            # Connect to Modbus device
-            client = ModbusTcpClient(
-                host=device.ip,
-                port=device.port,
-                timeout=device.timeout
-            )
+            if self.plan_learner is not None:
+                self.plan_learner.wait(device)
+            # Read holding registers (function code 03)
+            with tracing.span('read_block', address=block.address, count=block.count):
+                result = client.read_holding_registers(
+                    address=block.address,
+                    count=block.count,
+                    slave=device.slave_id
+                )
+            if self.plan_learner is not None:
+                self.plan_learner.observe(device, block, not result.isError(),
+                                          getattr(result, 'exception_code', None))
             
-            if not client.connect():
-                logger.error(f"Failed to connect to device {device.device_id} at {device.ip}:{device.port}")
-                return readings
+            if result.isError():
+                if len(block.registers) > 1:
+                    logger.warning(f"Error reading registers {block.address}-{block.address + block.count - 1}: "
+                                   f"{result}, retrying individually")
+                    return self.fetch_registers_individually(client, device, block)
+                logger.warning(f"Error reading register {block.address}: {result}")
+                return []
             
-            logger.info(f"Connected to device {device.device_id} at {device.ip}")
+            return [(block, result.registers, datetime.now(timezone.utc).strftime(API_TIMESTAMP_FORMAT))]
             
-            # Read each register
-            for register in device.registers:
-                try:
-                    # Read holding register (function code 03)
-                    result = client.read_holding_registers(
-                        address=register.address,
-                        count=2 if register.data_type == 'float' else 1,
-                        slave=device.slave_id
-                    )
-                    
-                    if result.isError():
-                        logger.warning(f"Error reading register {register.address}: {result}")
-                        continue
-                    
-                    # Decode the value
-                    if register.data_type == 'float':
-                        # Combine two 16-bit registers into 32-bit float
-                        raw_value = (result.registers[0] << 16) | result.registers[1]
-                    else:
-                        raw_value = result.registers[0]
-                    
-                    value = self.decode_register_value(raw_value, register.data_type, register.scale)
-                    
-                    # Create reading record
-                    reading = {
-                        "device_id": device.device_id,
-                        "parameter": register.parameter,
-                        "value": round(value, 3),
-                        "unit": register.unit,
-                        "timestamp": datetime.now(timezone.utc).isoformat(),
-                        "register_address": register.address,
-                        "data_type": register.data_type,
-                        "description": register.description
-                    }
-                    
-                    readings.append(reading)
-                    logger.debug(f"Read {register.parameter}: {value} {register.unit}")
-                    
-                except ModbusException as e:
-                    logger.error(f"Modbus error reading register {register.address}: {e}")
-                except Exception as e:
-                    logger.error(f"Unexpected error reading register {register.address}: {e}")
+        except (ConnectionException, ModbusIOException, OSError):
+            raise
+        except ModbusException as e:
+            logger.error(f"Modbus error reading registers at {block.address}: {e}")
+            if self.plan_learner is not None:
+                self.plan_learner.observe(device, block, False)
+        except Exception as e:
+            logger.error(f"Unexpected error reading registers at {block.address}: {e}")
+        return []
+    
+    def fetch_registers_individually(self, client, device: DeviceConfig, block: ReadBlock) -> List[RawBlock]:
+        """Read each register of a failed block on its own"""
+        pieces = []
+        for _, register in block.registers:
+            single = ReadBlock(register.address, register.width, [(0, register)])
+            pieces.extend(self.fetch_block(client, device, single))
+        return pieces
+    
+    def decode_block(self, device: DeviceConfig, block: ReadBlock, words: List[int],
+                     timestamp: str) -> List[Dict[str, Any]]:
+        """Reading records for the registers of one fetched block"""
+        with tracing.span('decode', registers=len(block.registers)):
+            return [
+                self.make_reading(device, register, words[offset:offset + register.width], timestamp)
+                for offset, register in block.registers
+            ]
+    
+    def fetch_device_blocks(self, device: DeviceConfig, priority: int = PRIORITY_POLL) -> List[RawBlock]:
+        """Raw words of all registers of a single device"""
+        from pymodbus.exceptions import ConnectionException, ModbusIOException
+        
+        pieces = []
+        
+        try:
+            # The gateway lock is taken per block so that writes and on-demand
+            # reads can get in between the blocks of a long poll
+            plan = self.plan_learner.plan(device) if self.plan_learner is not None else device.read_plan
+            for index, block in enumerate(plan):
+                with self.pool.connection(device.ip, device.port, device.timeout, priority) as client:
+                    if client is None:
+                        logger.error(f"Failed to connect to device {device.device_id} at {device.ip}:{device.port}")
+                        return pieces
+                    if index == 0:
+                        logger.info(f"Connected to device {device.device_id} at {device.ip}")
+                    pieces.extend(self.fetch_block(client, device, block))
             
-        except ConnectionException as e:
+        except (ConnectionException, ModbusIOException, OSError) as e:
+            # The pool has dropped the gateway connection; the next user reconnects
             logger.error(f"Connection error for device {device.device_id}: {e}")
         except Exception as e:
             logger.error(f"Unexpected error for device {device.device_id}: {e}")
-        finally:
-            if client and client.connected:
-                client.close()
         
-        return readings
+        return pieces
+    
+    def read_device_registers(self, device: DeviceConfig, priority: int = PRIORITY_POLL) -> List[Dict[str, Any]]:
+        """Read all registers for a single device"""
+        return [reading for piece in self.fetch_device_blocks(device, priority)
+                for reading in self.decode_block(device, *piece)]
+    
+    def compute_virtual(self, device: DeviceConfig, readings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Evaluate the device's virtual parameters over this snapshot"""
+        if not device.virtual or not readings:
+            return []
+        
+        values = {reading['parameter']: reading['value'] for reading in readings
+                  if reading.get('quality') not in IMPLAUSIBLE}
+        timestamp = readings[-1]['timestamp']
+        computed = []
+        
+        for vp in device.virtual:
+            try:
+                value = vp.evaluate(values)
+            except (ArithmeticError, ValueError, TypeError) as e:
+                logger.warning(f"Could not compute {vp.parameter} for device {device.device_id}: {e}")
+                continue
+            if value is None:
+                continue
+            
+            values[vp.parameter] = value
+            computed.append({
+                "device_id": device.device_id,
+                "parameter": vp.parameter,
+                "value": round(value, 3),
+                "unit": vp.unit,
+                "timestamp": timestamp,
+                "register_address": None,
+                "data_type": "virtual",
+                "description": vp.description or vp.expression
+            })
+        
+        return computed
+    
+    def prepare_recovered(self, recovered: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Quality codes and virtual parameters for readings recovered from load profiles
+
+        Each device interval is validated against the polled history without
+        updating it. Derived counters are skipped: the intervals are older
+        than the counter state, so their deltas would be wrong.
+        """
+        intervals: Dict[Tuple[int, str], List[Dict[str, Any]]] = {}
+        for reading in recovered:
+            intervals.setdefault((reading['device_id'], reading['timestamp']), []).append(reading)
+        
+        prepared = []
+        for (device_id, _), readings in intervals.items():
+            device = self.device_by_id(device_id)
+            if device is None:
+                continue
+            readings = self.quality.validate(device, readings, update=False)
+            readings.extend(self.compute_virtual(device, readings))
+            prepared.extend(readings)
+        return prepared
+    
+    def derive_readings(self, device: DeviceConfig, readings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Per-interval delta and rate readings for counter registers"""
+        registers = {register.parameter: register for register in device.registers}
+        derived = []
+        
+        for reading in readings:
+            register = registers.get(reading['parameter'])
+            if register is None or register.counter is None or reading.get('quality') in IMPLAUSIBLE:
+                continue
+            
+            counter = register.counter
+            result = self.derived.process(device.device_id, register.parameter, counter.wrap,
+                                          reading_time(reading), reading['value'])
+            if result is None:
+                continue
+            
+            delta, elapsed, event = result
+            if event == 'wrap':
+                logger.info(f"Counter {register.parameter} on device {device.device_id} wrapped around")
+            
+            for parameter, value, unit in (
+                (counter.delta_parameter, delta, register.unit),
+                (counter.rate_parameter, delta / elapsed * counter.rate_period, counter.rate_unit)
+            ):
+                derived.append({
+                    **reading,
+                    "parameter": parameter,
+                    "value": round(value, 3),
+                    "unit": unit,
+                    "data_type": "derived",
+                    "description": f"Derived from {register.parameter}"
+                })
+        
+        return derived
+    
+    def compress_readings(self, device: DeviceConfig, readings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop readings that swinging-door compression can reconstruct"""
+        registers = {register.parameter: register for register in device.registers}
+        compressed = []
+        
+        for reading in readings:
+            register = registers.get(reading['parameter'])
+            if register is None or not register.compression_deviation or reading.get('quality') in IMPLAUSIBLE:
+                compressed.append(reading)
+                continue
+            
+            t = reading_time(reading)
+            compressed.extend(self.compression.process(
+                device.device_id,
+                register.parameter,
+                register.compression_deviation,
+                register.compression_max_interval,
+                t,
+                reading['value'],
+                reading
+            ))
+        
+        return compressed
+    
+    def store_readings(self, readings: List[Dict[str, Any]]):
+        """Append raw readings to the local time-series store"""
+        if self.store is None:
+            return
+        
+        try:
+            discarded = 0
+            for reading in readings:
+                if not self.store.append(reading['device_id'], reading['parameter'],
+                                         reading_time(reading), reading['value']):
+                    discarded += 1
+            if discarded:
+                logger.warning(f"Local store skipped {discarded} readings older than its active segment "
+                               f"or already stored")
+        except Exception as e:
+            logger.error(f"Error writing readings to local store: {e}")
+    
+    def queue_pending(self, readings: List[Dict[str, Any]]):
+        """Keep readings that failed transiently for the next cycle"""
+        if not readings:
+            return
+        self.pending_readings.extend(readings)
+        overflow = len(self.pending_readings) - self.max_pending
+        if overflow > 0:
+            logger.warning(f"Pending reading buffer full, dropping {overflow} oldest readings")
+            del self.pending_readings[:overflow]
+        logger.info(f"{len(readings)} readings queued for retry ({len(self.pending_readings)} pending)")
+    
+    def update_device_health(self, device: DeviceConfig, readings: List[Dict[str, Any]], duration: float):
+        """Track per-device poll outcome"""
+        health = self.device_health.setdefault(device.device_id, {
+            "consecutive_failures": 0,
+            "last_success": None,
+            "last_duration": None
+        })
+        health["last_duration"] = round(duration, 3)
+        
+        if readings:
+            health["consecutive_failures"] = 0
+            health["last_success"] = readings[-1]["timestamp"]
+        else:
+            health["consecutive_failures"] += 1
+    
+    def sync_registry(self, force: bool = False):
+        """Refresh the device registry and report where config.json disagrees with it"""
+        if not self.registry.sync(force) and not force:
+            return
+        if self.registry.loaded:
+            for issue in self.registry.validate(self.devices):
+                logger.warning(f"Registry mismatch: {issue}")
+    
+    def resolve_register_ids(self, readings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Attach register IDs; readings without a register would only be rejected, so drop them"""
+        if self.registry is None or not self.registry.loaded:
+            return readings
+        
+        resolved = []
+        unknown = set()
+        for reading in readings:
+            register_id = self.registry.register_id(reading['device_id'], reading['parameter'])
+            if register_id is None:
+                unknown.add((reading['device_id'], reading['parameter']))
+                continue
+            reading['register_id'] = register_id
+            resolved.append(reading)
+        
+        if unknown:
+            logger.warning(f"Not sending {len(readings) - len(resolved)} readings without a registered "
+                           f"register: {', '.join(f'{d}/{p}' for d, p in sorted(unknown))}")
+        return resolved
     
     def send_readings_to_api(self, readings: List[Dict[str, Any]]) -> bool:
         """Send readings to Laravel API"""
         if not readings:
             return True
         
+        if self.sender is not None:
+            sent, retry = self.sender.send(readings)
+            metrics = self.sender.metrics()
+            logger.info(f"Sent {sent}/{len(readings)} readings to API "
+                        f"(batch size {metrics['batch_size']}, {metrics['concurrency']} in flight)")
+            self.last_send_count = sent
+            self.queue_pending(retry)
+            return sent > 0
+        
+        import requests
+        
         try:
             # Send each reading individually
             success_count = 0
+            retry = []
             for reading in readings:
                 try:
                     response = self.session.post(
@@ -218,13 +516,18 @@ class ModbusPoller:
                         logger.debug(f"Successfully sent reading: {reading['parameter']} = {reading['value']}")
                     else:
                         logger.error(f"API error {response.status_code}: {response.text}")
+                        if response.status_code >= 500:
+                            retry.append(reading)
                         
                 except requests.exceptions.RequestException as e:
                     logger.error(f"Request error sending reading: {e}")
+                    retry.append(reading)
                 except Exception as e:
                     logger.error(f"Unexpected error sending reading: {e}")
             
             logger.info(f"Sent {success_count}/{len(readings)} readings to API")
+            self.last_send_count = success_count
+            self.queue_pending(retry)
             return success_count > 0
             
         except Exception as e:
@@ -233,29 +536,99 @@ class ModbusPoller:
     
     def poll_all_devices(self) -> bool:
         """Poll all configured devices"""
+        try:
+            with tracing.span('cycle', devices=len(self.devices)):
+                if self.profiler is None:
+                    return self._poll_all_devices()
+                with self.profiler.cycle(f"shard{self.shard[0]}" if self.shard else 'cycle'):
+                    return self._poll_all_devices()
+        finally:
+            if self.pool.recorder is not None:
+                self.pool.recorder.flush()
+    
+    def _poll_all_devices(self) -> bool:
         logger.info("Starting Modbus polling cycle")
         
+        if self.registry is not None:
+            self.sync_registry()
+        
+        if self.pipeline is not None:
+            return self._poll_staged()
+        
         all_readings = []
         success_count = 0
+        read_count = 0
         
         for device in self.devices:
-            try:
-                logger.info(f"Polling device {device.device_id} ({device.ip})")
-                readings = self.read_device_registers(device)
-                
-                if readings:
-                    all_readings.extend(readings)
-                    success_count += 1
-                    logger.info(f"Successfully read {len(readings)} registers from device {device.device_id}")
-                else:
-                    logger.warning(f"No readings obtained from device {device.device_id}")
+            if not self.is_active():
+                logger.warning("Lease lost, aborting polling cycle")
+                break
+            with tracing.span('device', device_id=device.device_id, ip=device.ip):
+                try:
+                    logger.info(f"Polling device {device.device_id} ({device.ip})")
+                    device_start = time.monotonic()
+                    readings = self.read_device_registers(device)
+                    previous_success = self.device_health.get(device.device_id, {}).get("last_success")
+                    self.update_device_health(device, readings, time.monotonic() - device_start)
+                    if readings and self.backfill is not None:
+                        self.backfill.check(device, previous_success, readings[-1]["timestamp"])
                     
-            except Exception as e:
-                logger.error(f"Error polling device {device.device_id}: {e}")
+                    if readings:
+                        read_count += len(readings)
+                        with tracing.span('validate'):
+                            readings = self.quality.validate(device, readings)
+                        with tracing.span('virtual'):
+                            readings.extend(self.compute_virtual(device, readings))
+                        with tracing.span('derive'):
+                            readings.extend(self.derive_readings(device, readings))
+                        if self.alerts is not None:
+                            with tracing.span('alerts'):
+                                self.alerts.evaluate(readings)
+                        self.live.update(readings)
+                        if self.sinks is not None:
+                            self.sinks.publish(readings)
+                        with tracing.span('store'):
+                            self.store_readings(readings)
+                        with tracing.span('compress', readings=len(readings)):
+                            all_readings.extend(self.compress_readings(device, readings))
+                        success_count += 1
+                        logger.info(f"Successfully read {len(readings)} registers from device {device.device_id}")
+                    else:
+                        self.live.mark_device(device.device_id, QUALITY_COMM_ERROR)
+                        logger.warning(f"No readings obtained from device {device.device_id}")
+                        
+                except Exception as e:
+                    self.live.mark_device(device.device_id, QUALITY_COMM_ERROR)
+                    logger.error(f"Error polling device {device.device_id}: {e}")
+        
+        if not self.is_active():
+            # Keep what was read for when this node is active again; the new leader polls on its own
+            self.queue_pending(all_readings)
+            self.last_send_count = 0
+            return self.end_cycle(success_count, read_count)
+        
+        # Intervals recovered from load profiles go after this cycle's live readings
+        if self.backfill is not None:
+            recovered = self.prepare_recovered(self.backfill.drain())
+            if recovered:
+                logger.info(f"Adding {len(recovered)} readings recovered from load profiles")
+                if self.sinks is not None:
+                    self.sinks.publish(recovered)
+                self.store_readings(recovered)
+                all_readings.extend(recovered)
+        
+        # Retry readings that failed to send last cycle first, oldest first
+        if self.pending_readings:
+            all_readings = self.pending_readings + all_readings
+            self.pending_readings = []
+        
+        all_readings = self.resolve_register_ids(all_readings)
         
         # Send all readings to API
+        self.last_send_count = 0
         if all_readings:
-            api_success = self.send_readings_to_api(all_readings)
+            with tracing.span('send', readings=len(all_readings)):
+                api_success = self.send_readings_to_api(all_readings)
             if api_success:
                 logger.info(f"Polling cycle completed: {len(all_readings)} readings sent to API")
             else:
@@ -263,18 +636,194 @@ class ModbusPoller:
         else:
             logger.warning("No readings obtained from any device")
         
+        return self.end_cycle(success_count, read_count)
+    
+    def _poll_staged(self) -> bool:
+        """Polling cycle through the staged pipeline (PIPELINE_STAGED)"""
+        backlog, self.pending_readings = self.pending_readings, []
+        recovered = self.prepare_recovered(self.backfill.drain()) if self.backfill is not None else []
+        if recovered:
+            logger.info(f"Adding {len(recovered)} readings recovered from load profiles")
+            if self.sinks is not None:
+                self.sinks.publish(recovered)
+            self.store_readings(recovered)
+        
+        counts = self.pipeline.run(self.devices, backlog, recovered)
+        self.last_send_count = counts["readings_sent"]
+        logger.info(f"Polling cycle completed: {counts['devices_ok']}/{len(self.devices)} devices, "
+                    f"{counts['readings_sent']} readings sent to API")
+        return self.end_cycle(counts["devices_ok"], counts["readings_read"])
+    
+    def end_cycle(self, success_count: int, read_count: int) -> bool:
+        """Housekeeping and stats shared by both cycle implementations"""
+        if self.store is not None:
+            self.store.compact()
+        if self.plan_learner is not None:
+            self.plan_learner.save()
+        
+        self.last_cycle_stats = {
+            "devices": len(self.devices),
+            "devices_ok": success_count,
+            "readings_read": read_count,
+            "readings_sent": self.last_send_count,
+            "readings_pending": len(self.pending_readings)
+        }
+        if self.sender is not None:
+            self.last_cycle_stats["sender"] = self.sender.metrics()
+        if self.sinks is not None:
+            self.last_cycle_stats["sinks"] = self.sinks.stats()
+        self.last_cycle_stats["quality"] = self.quality.metrics()
+        if self.store is not None:
+            self.last_cycle_stats["store_discarded"] = self.store.discarded
+        if self.backfill is not None:
+            self.last_cycle_stats["backfill"] = self.backfill.metrics()
+        if self.pipeline is not None:
+            self.last_cycle_stats["pipeline"] = self.pipeline.last_metrics
+        
+        self.write_checkpoint()
+        
         return success_count > 0
     
+    def export_state(self) -> Dict[str, Any]:
+        """Runtime state another poller instance needs to continue seamlessly"""
+        return {
+            "compression": self.compression.export_state(),
+            "counters": self.derived.export_state(),
+            "quality": self.quality.export_state(),
+            "device_health": {str(device_id): health for device_id, health in self.device_health.items()},
+            "pending_readings": self.pending_readings,
+            "alarms": self.alerts.export_state() if self.alerts is not None else [],
+            "backfill": self.backfill.export_state() if self.backfill is not None else {}
+        }
+    
+    def import_state(self, state: Dict[str, Any]):
+        """Restore state produced by export_state()"""
+        self.compression.import_state(state.get("compression", []))
+        self.derived.import_state(state.get("counters", []))
+        self.quality.import_state(state.get("quality", []), self.devices)
+        self.device_health.update({
+            int(device_id): health for device_id, health in state.get("device_health", {}).items()
+        })
+        self.pending_readings = state.get("pending_readings", [])[-self.max_pending:]
+        if self.alerts is not None:
+            self.alerts.import_state(state.get("alarms", []))
+        if self.backfill is not None:
+            self.backfill.import_state(state.get("backfill", {}))
+    
+    def restore_checkpoint(self):
+        """Resume from the last runtime checkpoint, if any"""
+        if not self.checkpoint_path:
+            return
+        state = load_checkpoint(self.checkpoint_path)
+        if state is None:
+            return
+        try:
+            self.import_state(state)
+            logger.info(f"Restored runtime state from {self.checkpoint_path} "
+                        f"({len(self.pending_readings)} pending readings)")
+        except Exception as e:
+            logger.error(f"Ignoring unusable checkpoint {self.checkpoint_path}: {e}")
+    
+    def write_checkpoint(self):
+        """Snapshot runtime state so a restart resumes where this process stopped"""
+        if self.checkpoint_path:
+            save_checkpoint(self.checkpoint_path, self.export_state())
+    
+    def device_by_id(self, device_id: int) -> Optional[DeviceConfig]:
+        """Configured device with this id"""
+        for device in self.devices:
+            if device.device_id == device_id:
+                return device
+        return None
+    
+    def close(self):
+        """Close pooled Modbus connections and flush queued uploads, sink output and alerts"""
+        if not self.checkpoint_path and self.is_active():
+            # Without a checkpoint the point each compressed series still holds would be lost
+            held = self.compression.flush()
+            if held:
+                logger.info(f"Sending {len(held)} readings held back by compression")
+                self.send_readings_to_api(self.resolve_register_ids(held))
+        self.pool.close_all()
+        if self.sender is not None:
+            self.sender.close()
+        if self.sinks is not None:
+            self.sinks.close()
+        if self.alerts is not None:
+            self.alerts.close()
+        if self.backfill is not None:
+            self.backfill.close()
+            # Keep what the backfill recovered after the cycle's checkpoint
+            self.write_checkpoint()
+    
     def run_single_poll(self):
         """Run a single polling cycle"""
-        return self.poll_all_devices()
+        try:
+            return self.poll_all_devices()
+        finally:
+            self.close()
+
+def import_report(config_file: str):
+    """Print where one-shot start-up time goes, without polling"""
+    import importlib
+    
+    print(f"poller module imported in {time.perf_counter() - MODULE_START:.4f}s")
+    
+    for module in ('requests', 'pymodbus.client', 'pymodbus.exceptions'):
+        start = time.perf_counter()
+        try:
+            importlib.import_module(module)
+            print(f"import {module:<22} {time.perf_counter() - start:.4f}s (deferred until first use)")
+        except ImportError as e:
+            print(f"import {module:<22} unavailable: {e}")
+    
+    for attempt in ('first load', 'cached load'):
+        start = time.perf_counter()
+        poller = ModbusPoller(config_file=config_file)
+        print(f"{attempt:<29} {time.perf_counter() - start:.4f}s "
+              f"({len(poller.devices)} devices, "
+              f"{sum(len(d.read_plan) for d in poller.devices)} block reads)")
+    
+    print("Run `python -X importtime poller.py --import-report` for a per-module breakdown")
+
+def check_registry(config_file: str, api_url: str) -> int:
+    """Print where config.json disagrees with the API registry; returns an exit code"""
+    registry = DeviceRegistry(registry_url(api_url))
+    registry.sync(force=True)
+    if not registry.loaded:
+        print(f"Could not load the registry from {registry.url}")
+        return 2
+    
+    devices = ModbusPoller(config_file=config_file, api_url=api_url).devices
+    issues = registry.validate(devices)
+    for issue in issues:
+        print(issue)
+    print(f"{len(devices)} devices checked against {len(registry.devices)} registry devices: "
+          f"{len(issues)} issues")
+    return 1 if issues else 0
 
 def main():
     """Main entry point"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Run a single Modbus polling cycle")
+    parser.add_argument('--import-report', action='store_true',
+                        help='report start-up import and config load times, then exit')
+    parser.add_argument('--check-registry', action='store_true',
+                        help='compare config.json with the API device registry, then exit')
+    args = parser.parse_args()
+    
     # Get configuration from environment or use defaults
     config_file = os.getenv('MODBUS_CONFIG', 'config.json')
     api_url = os.getenv('LARAVEL_API_URL', 'http://localhost:8000/api/readings')
     
+    if args.import_report:
+        import_report(config_file)
+        return
+    
+    if args.check_registry:
+        exit(check_registry(config_file, api_url))
+    
     logger.info("Starting Modbus Polling Service")
     logger.info(f"Config file: {config_file}")
     logger.info(f"API URL: {api_url}")
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Slow-cycle profiler for the Modbus polling service
+Samples thread stacks during every cycle and keeps the profile only when the cycle was slow
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StackSampler:
+    """Counts the call stacks of all other threads every `interval` seconds
+
+    Sampling reads `sys._current_frames()` from a background thread, so the
+    cost is independent of how many calls the profiled code makes.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def top_frames(self, thread_name: str, count: int = 5):
+        """Innermost frames of one thread that were sampled most often"""
+        leaves: Counter = Counter()
+        for stack, hits in self.stacks.items():
+            frames = stack.split(';')
+            if frames[0] == thread_name:
+                leaves[frames[-1]] += hits
+        return leaves.most_common(count)
+
+
+class CycleProfiler:
+    """Profiles polling cycles, writing dumps only for cycles slower than `threshold`
+
+    For each slow cycle it writes `<name>.collapsed` (one "frame;frame;frame
+    count" line per stack, ready for flamegraph.pl or speedscope) and, with
+    tracemalloc enabled, `<name>.memory.txt` with the top allocation sites.
+    """
+
+    def __init__(self, output_dir: str, threshold: float, interval: float = 0.01,
+                 trace_memory: bool = False, keep: int = 20):
+        self.output_dir = output_dir
+        self.threshold = threshold
+        self.interval = interval
+        self.trace_memory = trace_memory
+        self.keep = keep
+
+    @classmethod
+    def from_env(cls) -> Optional['CycleProfiler']:
+        """Build a profiler from PROFILE_* variables; None when disabled"""
+        threshold = float(os.getenv('PROFILE_SLOW_CYCLE_SECONDS', '0'))
+        if threshold <= 0:
+            return None
+        return cls(
+            os.getenv('PROFILE_DIR', 'profiles'),
+            threshold,
+            interval=float(os.getenv('PROFILE_INTERVAL_MS', '10')) / 1000,
+            trace_memory=os.getenv('PROFILE_TRACEMALLOC', 'false').lower() == 'true',
+            keep=int(os.getenv('PROFILE_KEEP', '20'))
+        )
+
+    @contextmanager
+    def cycle(self, label: str = 'cycle'):
+        """Profile the enclosed block; dump if it took longer than the threshold"""
+        sampler = StackSampler(self.interval)
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(10)
+        sampler.start()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - start
+            sampler.stop()
+            memory = None
+            if self.trace_memory and tracemalloc.is_tracing():
+                memory = (tracemalloc.take_snapshot(), tracemalloc.get_traced_memory())
+            if started_tracing:
+                tracemalloc.stop()
+
+            if duration >= self.threshold:
+                try:
+                    self._dump(label, duration, sampler, memory)
+                except OSError as e:
+                    logger.error(f"Could not write cycle profile to {self.output_dir}: {e}")
+
+    def _dump(self, label: str, duration: float, sampler: StackSampler, memory):
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{label}")
+
+        with open(f"{base}.collapsed", 'w') as f:
+            for stack, hits in sampler.stacks.most_common():
+                f.write(f"{stack} {hits}\n")
+
+        if memory is not None:
+            snapshot, (current, peak) = memory
+            snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+            with open(f"{base}.memory.txt", 'w') as f:
+                f.write(f"traced memory: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n\n")
+                for stat in snapshot.statistics('lineno')[:25]:
+                    f.write(f"{stat}\n")
+
+        top = ', '.join(f"{frame} {hits * 100 / max(sampler.samples, 1):.0f}%"
+                        for frame, hits in sampler.top_frames(threading.current_thread().name))
+        logger.warning(f"Slow cycle ({duration:.2f}s >= {self.threshold:.2f}s), "
+                       f"profile written to {base}.collapsed; busiest frames: {top}")
+        self._prune()
+
+    def _prune(self):
+        dumps = sorted(name for name in os.listdir(self.output_dir) if name.endswith('.collapsed'))
+        for name in dumps[:-self.keep] if self.keep > 0 else []:
+            for suffix in ('.collapsed', '.memory.txt'):
+                path = os.path.join(self.output_dir, name[:-len('.collapsed')] + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Data-quality validation for the Modbus polling service
+Checks each device snapshot for non-finite, out-of-range, jumping and stuck values
+"""
+
+import logging
+import math
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+from device_config import DeviceConfig, RegisterConfig, ValidationConfig
+from last_values import QUALITY_GOOD
+
+logger = logging.getLogger(__name__)
+
+API_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+QUALITY_NOT_FINITE = 'not_finite'
+QUALITY_OUT_OF_BOUNDS = 'out_of_bounds'
+QUALITY_RATE_EXCEEDED = 'rate_exceeded'
+QUALITY_STUCK = 'stuck'
+
+# Values that cannot be physical: kept out of alerts, counters, virtual parameters and compression
+IMPLAUSIBLE = (QUALITY_OUT_OF_BOUNDS, QUALITY_RATE_EXCEEDED)
+
+# Worst first: a reading gets the code of the first check it fails
+QUALITY_CODES = (QUALITY_NOT_FINITE, QUALITY_OUT_OF_BOUNDS, QUALITY_RATE_EXCEEDED, QUALITY_STUCK, QUALITY_GOOD)
+
+ACTIONS = ('flag', 'drop')
+
+_np = None  # numpy once looked up; False when it is not installed
+
+
+def _numpy():
+    """numpy, imported on the first validation to keep it off the start-up path; None if missing"""
+    global _np
+    if _np is None:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:  # optional; the same checks run as a plain loop
+            _np = False
+    return _np or None
+
+
+class DeviceChecks:
+    """Limits and recent history of one device's registers as parallel columns
+
+    `last_value`/`last_time` hold the last reading that passed the range and
+    rate checks, and `repeats` how many readings in a row equalled it.
+    """
+
+    def __init__(self, registers: List[RegisterConfig], default_action: str):
+        self.registers = registers
+        self.index = {register.parameter: i for i, register in enumerate(registers)}
+        rules = [register.validation or ValidationConfig() for register in registers]
+        self.low = [-math.inf if rule.min is None else float(rule.min) for rule in rules]
+        self.high = [math.inf if rule.max is None else float(rule.max) for rule in rules]
+        self.max_rate = [math.inf if rule.max_rate is None else float(rule.max_rate) for rule in rules]
+        self.stuck_window = [rule.stuck_window for rule in rules]
+        self.drop = [(rule.action or default_action) == 'drop' for rule in rules]
+        self.last_value = [math.nan] * len(registers)
+        self.last_time = [math.nan] * len(registers)
+        self.repeats = [0] * len(registers)
+        np = _numpy()
+        if np is not None:
+            for name in ('low', 'high', 'max_rate', 'last_value', 'last_time'):
+                setattr(self, name, np.array(getattr(self, name), dtype=float))
+            self.stuck_window = np.array(self.stuck_window, dtype=int)
+            self.repeats = np.array(self.repeats, dtype=int)
+            self.drop = np.array(self.drop, dtype=bool)
+
+    def history(self, position: int) -> Tuple[float, float, int]:
+        return float(self.last_value[position]), float(self.last_time[position]), int(self.repeats[position])
+
+    def restore(self, position: int, value: float, moment: float, repeats: int):
+        self.last_value[position] = value
+        self.last_time[position] = moment
+        self.repeats[position] = repeats
+
+
+class QualityValidator:
+    """Gives every raw reading a quality code and drops what must not be stored
+
+    Non-finite values (NaN, +/-inf from float decoding or a failed decode)
+    are always dropped: they cannot be sent as JSON. Readings failing a
+    register's `validation` limits are flagged with their code, or dropped
+    when the register's action (or QUALITY_ACTION) is 'drop'. Each device
+    snapshot is checked at once, vectorized when numpy is installed.
+    """
+
+    def __init__(self, default_action: str = 'flag'):
+        if default_action not in ACTIONS:
+            raise ValueError(f"Invalid quality action '{default_action}', expected one of {list(ACTIONS)}")
+        self.default_action = default_action
+        self.lock = threading.Lock()
+        self.devices: Dict[int, DeviceChecks] = {}
+        self.times: Dict[str, float] = {}
+        self.stats = {code: 0 for code in QUALITY_CODES}
+        self.stats["dropped"] = 0
+
+    @classmethod
+    def from_env(cls) -> 'QualityValidator':
+        return cls(default_action=os.getenv('QUALITY_ACTION', 'flag').lower())
+
+    def _checks(self, device: DeviceConfig) -> DeviceChecks:
+        checks = self.devices.get(device.device_id)
+        if checks is None or checks.registers is not device.registers:
+            fresh = DeviceChecks(device.registers, self.default_action)
+            if checks is not None:
+                # Reloaded configuration: keep the history of registers that are still there
+                for parameter, position in checks.index.items():
+                    if parameter in fresh.index:
+                        fresh.restore(fresh.index[parameter], *checks.history(position))
+            checks = self.devices[device.device_id] = fresh
+        return checks
+
+    def _time(self, timestamp: str) -> float:
+        moment = self.times.get(timestamp)
+        if moment is None:
+            if len(self.times) > 1000:
+                self.times.clear()
+            moment = datetime.strptime(timestamp, API_TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+            self.times[timestamp] = moment
+        return moment
+
+    def validate(self, device: DeviceConfig, readings: List[Dict[str, Any]],
+                 update: bool = True) -> List[Dict[str, Any]]:
+        """Set each reading's `quality` and return the readings to keep
+
+        With `update=False` (on-demand reads) the readings are checked against
+        the polled history without changing it or the counters, so extra reads
+        between cycles cannot skew the rate and stuck checks.
+        """
+        if not readings:
+            return readings
+        with self.lock:
+            checks = self._checks(device)
+            checked = [reading for reading in readings if reading['parameter'] in checks.index]
+            positions = [checks.index[reading['parameter']] for reading in checked]
+            values = [reading['value'] for reading in checked]
+            times = [self._time(reading['timestamp']) for reading in checked]
+            check = self._check_vectorized if _numpy() is not None else self._check_loop
+            codes, drop = check(checks, positions, values, times, update)
+            for reading, code in zip(checked, codes):
+                reading['quality'] = code
+
+            kept = []
+            dropped = {id(reading) for reading, dropping in zip(checked, drop) if dropping}
+            for reading in readings:
+                code = reading.setdefault('quality', QUALITY_GOOD)
+                if code == QUALITY_GOOD and not math.isfinite(reading['value']):
+                    code = reading['quality'] = QUALITY_NOT_FINITE
+                if update:
+                    self.stats[code] += 1
+                if code == QUALITY_NOT_FINITE or id(reading) in dropped:
+                    if update:
+                        self.stats["dropped"] += 1
+                    logger.debug(f"Dropping {reading['parameter']} of device {device.device_id}: "
+                                 f"{reading['value']} ({code})")
+                    continue
+                kept.append(reading)
+
+        if len(kept) < len(readings):
+            logger.warning(f"Dropped {len(readings) - len(kept)} readings of device {device.device_id} "
+                           f"that failed validation")
+        return kept
+
+    @staticmethod
+    def _check_vectorized(checks: DeviceChecks, positions: List[int], values: List[float],
+                          times: List[float], update: bool) -> Tuple[List[str], List[bool]]:
+        np = _numpy()
+        at = np.array(positions, dtype=int)
+        value = np.array(values, dtype=float)
+        moment = np.array(times, dtype=float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            finite = np.isfinite(value)
+            out_of_range = finite & ((value < checks.low[at]) | (value > checks.high[at]))
+            elapsed = moment - checks.last_time[at]
+            rate = np.abs(value - checks.last_value[at]) / elapsed
+            too_fast = finite & ~out_of_range & (elapsed > 0) & (rate > checks.max_rate[at])
+            repeats = np.where(value == checks.last_value[at], checks.repeats[at] + 1, 0)
+            stuck = finite & (checks.stuck_window[at] > 1) & (repeats + 1 >= checks.stuck_window[at])
+
+        codes = np.select([~finite, out_of_range, too_fast, stuck],
+                          [QUALITY_NOT_FINITE, QUALITY_OUT_OF_BOUNDS, QUALITY_RATE_EXCEEDED, QUALITY_STUCK],
+                          QUALITY_GOOD)
+        if update:
+            accepted = finite & ~out_of_range & ~too_fast
+            checks.last_value[at[accepted]] = value[accepted]
+            checks.last_time[at[accepted]] = moment[accepted]
+            checks.repeats[at[accepted]] = repeats[accepted]
+        drop = ~finite | (checks.drop[at] & (codes != QUALITY_GOOD))
+        return codes.tolist(), drop.tolist()
+
+    @staticmethod
+    def _check_loop(checks: DeviceChecks, positions: List[int], values: List[float],
+                    times: List[float], update: bool) -> Tuple[List[str], List[bool]]:
+        codes, drop = [], []
+        for at, value, moment in zip(positions, values, times):
+            last_value, last_time = checks.last_value[at], checks.last_time[at]
+            elapsed = moment - last_time
+            repeats = checks.repeats[at] + 1 if value == last_value else 0
+            if not math.isfinite(value):
+                code = QUALITY_NOT_FINITE
+            elif not checks.low[at] <= value <= checks.high[at]:
+                code = QUALITY_OUT_OF_BOUNDS
+            elif elapsed > 0 and abs(value - last_value) / elapsed > checks.max_rate[at]:
+                code = QUALITY_RATE_EXCEEDED
+            elif checks.stuck_window[at] > 1 and repeats + 1 >= checks.stuck_window[at]:
+                code = QUALITY_STUCK
+            else:
+                code = QUALITY_GOOD
+            if update and code in (QUALITY_GOOD, QUALITY_STUCK):
+                checks.restore(at, value, moment, repeats)
+            codes.append(code)
+            drop.append(code == QUALITY_NOT_FINITE or (checks.drop[at] and code != QUALITY_GOOD))
+        return codes, drop
+
+    def export_state(self) -> List[List[Any]]:
+        """[device_id, parameter, last value, last time, repeats] of every register with history"""
+        with self.lock:
+            state = []
+            for device_id, checks in self.devices.items():
+                for parameter, position in checks.index.items():
+                    value, moment, repeats = checks.history(position)
+                    if math.isfinite(moment):
+                        state.append([device_id, parameter, value, moment, repeats])
+            return state
+
+    def import_state(self, state: List[List[Any]], devices: List[DeviceConfig]):
+        """Restore history saved by export_state() for the given devices"""
+        by_id = {device.device_id: device for device in devices}
+        with self.lock:
+            for device_id, parameter, value, moment, repeats in state:
+                device = by_id.get(device_id)
+                if device is None:
+                    continue
+                checks = self._checks(device)
+                if parameter in checks.index:
+                    checks.restore(checks.index[parameter], value, moment, repeats)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"vectorized": _numpy() is not None, **self.stats}
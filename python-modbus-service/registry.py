@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Device/register registry sync with the Laravel API
+Validates config.json against the database and resolves register IDs for uploads
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from device_config import DeviceConfig
+
+logger = logging.getLogger(__name__)
+
+
+def registry_url(api_url: str) -> str:
+    """REGISTRY_URL, or the registry endpoint next to the readings endpoint"""
+    return os.getenv('REGISTRY_URL') or f"{api_url.rsplit('/', 1)[0]}/registry"
+
+
+def config_parameters(device: DeviceConfig) -> List[str]:
+    """Every parameter name a device's readings are sent under"""
+    names = []
+    for register in device.registers:
+        names.append(register.parameter)
+        if register.counter is not None:
+            names.extend([register.counter.delta_parameter, register.counter.rate_parameter])
+    names.extend(virtual.parameter for virtual in device.virtual)
+    return names
+
+
+class DeviceRegistry:
+    """Bulk copy of the API's devices and registers, refreshed with ETags
+
+    The last good copy is kept on disk so the poller still sends register
+    IDs when the API is briefly unreachable at start-up.
+    """
+
+    def __init__(self, url: str, cache_path: Optional[str] = None, refresh_interval: float = 3600.0):
+        self.url = url
+        self.cache_path = cache_path
+        self.refresh_interval = refresh_interval
+        self.etag: Optional[str] = None
+        self.devices: Dict[int, Dict[str, Any]] = {}
+        self.register_ids: Dict[Tuple[int, str], int] = {}
+        self.loaded = False
+        self.synced_at: Optional[float] = None
+        self.load_cache()
+
+    @classmethod
+    def from_env(cls, api_url: str) -> Optional['DeviceRegistry']:
+        """Build a registry from REGISTRY_* variables; None when sync is disabled"""
+        if os.getenv('REGISTRY_SYNC', 'false').lower() != 'true':
+            return None
+        return cls(
+            registry_url(api_url),
+            cache_path=os.getenv('REGISTRY_CACHE_PATH', 'registry_cache.json') or None,
+            refresh_interval=float(os.getenv('REGISTRY_REFRESH_SECONDS', '3600'))
+        )
+
+    def _apply(self, devices: List[Dict[str, Any]]):
+        self.devices = {int(device['id']): device for device in devices}
+        self.register_ids = {
+            (int(device['id']), register['parameter_name']): int(register['id'])
+            for device in devices
+            for register in device.get('registers', [])
+        }
+        self.loaded = True
+
+    def load_cache(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, 'r') as f:
+                cached = json.load(f)
+            self._apply(cached['devices'])
+            self.etag = cached.get('etag')
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unusable registry cache {self.cache_path}: {e}")
+
+    def save_cache(self, devices: List[Dict[str, Any]]):
+        if not self.cache_path:
+            return
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({"etag": self.etag, "devices": devices}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write registry cache {self.cache_path}: {e}")
+
+    def sync(self, force: bool = False) -> bool:
+        """Refresh from the API when due; True if the registry changed"""
+        if not force and self.synced_at is not None \
+                and time.monotonic() - self.synced_at < self.refresh_interval:
+            return False
+
+        import requests
+
+        headers = {'If-None-Match': self.etag} if self.etag and self.loaded else {}
+        try:
+            response = requests.get(self.url, headers=headers, timeout=30)
+            if response.status_code == 304:
+                self.synced_at = time.monotonic()
+                return False
+            response.raise_for_status()
+            devices = response.json()['devices']
+            self._apply(devices)
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Registry sync from {self.url} failed: {e}")
+            return False
+
+        self.etag = response.headers.get('ETag')
+        self.synced_at = time.monotonic()
+        self.save_cache(devices)
+        logger.info(f"Registry synced: {len(self.devices)} devices, {len(self.register_ids)} registers")
+        return True
+
+    def validate(self, devices: List[DeviceConfig]) -> List[str]:
+        """Differences between config.json and the registry, one message each"""
+        issues = []
+        for device in devices:
+            known = self.devices.get(device.device_id)
+            if known is None:
+                issues.append(f"Device {device.device_id} ({device.ip}) is not in the registry")
+                continue
+            if known.get('slave_id') is not None and int(known['slave_id']) != device.slave_id:
+                issues.append(f"Device {device.device_id}: slave_id {device.slave_id} in config, "
+                              f"{known['slave_id']} in registry")
+            if known.get('gateway_ip') and known['gateway_ip'] != device.ip:
+                issues.append(f"Device {device.device_id}: ip {device.ip} in config, "
+                              f"gateway {known['gateway_ip']} in registry")
+
+            registers = {register['parameter_name']: register for register in known.get('registers', [])}
+            for parameter in config_parameters(device):
+                if parameter not in registers:
+                    issues.append(f"Device {device.device_id}: '{parameter}' has no register in the registry")
+
+            for register in device.registers:
+                match = registers.get(register.parameter)
+                if match is None:
+                    continue
+                if match.get('register_address') is not None and int(match['register_address']) != register.address:
+                    issues.append(f"Device {device.device_id} '{register.parameter}': address {register.address} "
+                                  f"in config, {match['register_address']} in registry")
+                if match.get('data_type') and match['data_type'] != register.data_type:
+                    issues.append(f"Device {device.device_id} '{register.parameter}': data type "
+                                  f"{register.data_type} in config, {match['data_type']} in registry")
+        return issues
+
+    def register_id(self, device_id: int, parameter: str) -> Optional[int]:
+        return self.register_ids.get((device_id, parameter))
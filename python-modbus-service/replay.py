@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Replay server for Modbus captures
+Serves the responses recorded by MODBUS_CAPTURE_FILE with their original latencies
+
+Each captured gateway gets its own Modbus TCP port. Requests are matched on
+unit id and PDU, and the n-th identical request gets the n-th recorded answer,
+so a run against the same config replays exactly the same traffic.
+
+    python replay.py capture.bin --port 5020 --config config.json --write-config replay.json
+    MODBUS_CONFIG=replay.json python poller.py
+"""
+
+import argparse
+import json
+import logging
+import socketserver
+import struct
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from capture import Exchange, exchanges, read_capture
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MBAP = struct.Struct('>HHHB')  # transaction id, protocol id, length, unit id
+
+# Answer for requests that were never captured
+EXCEPTION_GATEWAY_TARGET_FAILED = 0x0B
+
+
+class ReplayGateway:
+    """The recorded conversation of one gateway, served in order"""
+
+    def __init__(self, name: str, recorded: List[Exchange], speed: float = 1.0, loop: bool = True):
+        self.name = name
+        self.speed = speed
+        self.loop = loop
+        self.lock = threading.Lock()
+        self.answers: Dict[bytes, List[Exchange]] = defaultdict(list)
+        for exchange in recorded:
+            self.answers[exchange.request[6:]].append(exchange)
+        self.positions: Dict[bytes, int] = defaultdict(int)
+        self.served = 0
+        self.unmatched = 0
+
+    def answer(self, request: bytes) -> Tuple[Optional[bytes], float]:
+        """(response frame or None for no answer, seconds to wait first)"""
+        key = request[6:]
+        with self.lock:
+            candidates = self.answers.get(key)
+            position = self.positions[key]
+            if not candidates or (position >= len(candidates) and not self.loop):
+                self.unmatched += 1
+                unit, function = request[6], request[7] if len(request) > 7 else 0
+                body = bytes([unit, function | 0x80, EXCEPTION_GATEWAY_TARGET_FAILED])
+                return request[:4] + struct.pack('>H', len(body)) + body, 0.0
+            exchange = candidates[position % len(candidates)]
+            self.positions[key] = position + 1
+            self.served += 1
+
+        delay = exchange.latency / self.speed if self.speed > 0 else 0.0
+        if exchange.response is None:
+            return None, delay
+        # Same answer, under the transaction id of this request
+        return request[:2] + exchange.response[2:], delay
+
+
+class ReplayHandler(socketserver.BaseRequestHandler):
+    def _read(self, size: int) -> Optional[bytes]:
+        data = b''
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def handle(self):
+        gateway: ReplayGateway = self.server.gateway
+        while True:
+            header = self._read(MBAP.size)
+            if header is None:
+                return
+            _, _, length, _ = MBAP.unpack(header)
+            body = self._read(length - 1)
+            if body is None:
+                return
+            response, delay = gateway.answer(header + body)
+            if delay:
+                time.sleep(delay)
+            if response is not None:
+                try:
+                    self.request.sendall(response)
+                except OSError:
+                    return
+
+
+class ReplayServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: Tuple[str, int], gateway: ReplayGateway):
+        super().__init__(address, ReplayHandler)
+        self.gateway = gateway
+
+
+def rewrite_config(config_file: str, output: str, ports: Dict[str, int], host: str):
+    """Copy config.json with every captured gateway pointed at its replay port"""
+    with open(config_file, 'r') as f:
+        config = json.load(f)
+    for device in config:
+        port = ports.get(f"{device['ip']}:{device.get('port', 502)}")
+        if port is None:
+            logger.warning(f"Device {device['device_id']} at {device['ip']} is not in the capture")
+            continue
+        device['ip'] = host
+        device['port'] = port
+    with open(output, 'w') as f:
+        json.dump(config, f, indent=2)
+    logger.info(f"Wrote {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a Modbus capture with its recorded latencies")
+    parser.add_argument('capture', help='file written with MODBUS_CAPTURE_FILE')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=5020, help='port of the first gateway; others follow')
+    parser.add_argument('--gateway', action='append', help='only replay this host:port (repeatable)')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='divide recorded latencies by this; 0 answers immediately')
+    parser.add_argument('--once', action='store_true',
+                        help='answer repeated requests only as often as captured instead of starting over')
+    parser.add_argument('--config', help='config.json the capture was taken with')
+    parser.add_argument('--write-config', metavar='PATH', help='write --config pointed at the replay ports')
+    args = parser.parse_args()
+
+    _, records = read_capture(args.capture)
+    recorded = exchanges(records)
+    names = [name for name in sorted(recorded) if not args.gateway or name in args.gateway]
+    if not names:
+        parser.error(f"No matching gateways in {args.capture}")
+
+    servers = []
+    ports = {}
+    for index, name in enumerate(names):
+        gateway = ReplayGateway(name, recorded[name], speed=args.speed, loop=not args.once)
+        server = ReplayServer((args.host, args.port + index), gateway)
+        threading.Thread(target=server.serve_forever, name=f"replay-{name}", daemon=True).start()
+        servers.append(server)
+        ports[name] = args.port + index
+        unanswered = sum(exchange.response is None for exchange in recorded[name])
+        logger.info(f"Replaying {name} on {args.host}:{args.port + index} "
+                    f"({len(recorded[name])} exchanges, {unanswered} unanswered)")
+
+    if args.config and args.write_config:
+        rewrite_config(args.config, args.write_config, ports, args.host)
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.shutdown()
+            gateway = server.gateway
+            logger.info(f"{gateway.name}: served {gateway.served} recorded answers, "
+                        f"{gateway.unmatched} requests not in the capture")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 Scheduler for Modbus Polling Service
-Runs the polling service every 30 minutes
+Runs the polling service every POLL_INTERVAL_MINUTES (30 by default)
 """
 
 import os
@@ -9,9 +9,12 @@ import sys
 import logging
 from datetime import datetime
 from apscheduler.schedulers.blocking import BlockingScheduler
-from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from dotenv import load_dotenv
 from poller import ModbusPoller
+from supervisor import WorkerSupervisor
+from ha import LeaseElector
+from local_api import create_local_api
 
 # Load environment variables
 load_dotenv()
@@ -33,7 +36,60 @@ class ModbusScheduler:
     def __init__(self):
         self.scheduler = BlockingScheduler()
         self.poller = None
-        self.setup_poller()
+        self.supervisor = None
+        self.interval_minutes = self.load_interval()
+        workers = int(os.getenv('POLLER_WORKERS', '1'))
+        if workers > 1:
+            self.setup_supervisor(workers)
+        else:
+            self.setup_poller()
+        # Standby nodes keep the poller above loaded so takeover is immediate
+        self.elector = LeaseElector.from_env(on_promote=self.on_promote)
+        if self.elector is not None:
+            # Leadership is re-checked before every device, not only when a cycle starts
+            target = self.supervisor if self.supervisor is not None else self.poller
+            target.is_active = self.is_active
+            if self.supervisor is not None:
+                self.supervisor.export_worker_state = True
+        self.local_api = None
+    
+    @staticmethod
+    def load_interval() -> int:
+        """POLL_INTERVAL_MINUTES as a whole number of minutes, at least 1"""
+        value = os.getenv('POLL_INTERVAL_MINUTES', '30')
+        try:
+            minutes = int(value)
+        except ValueError:
+            minutes = 0
+        if minutes < 1:
+            logger.error(f"Invalid POLL_INTERVAL_MINUTES '{value}', expected a whole number of minutes >= 1")
+            sys.exit(1)
+        return minutes
+    
+    def setup_supervisor(self, workers: int):
+        """Split devices across worker processes (supervisor mode)"""
+        try:
+            config_file = os.getenv('MODBUS_CONFIG', 'config.json')
+            api_url = os.getenv('LARAVEL_API_URL', 'http://localhost:8000/api/readings')
+            
+            self.supervisor = WorkerSupervisor(
+                workers=workers,
+                config_file=config_file,
+                api_url=api_url,
+                cycle_timeout=float(os.getenv('POLLER_CYCLE_TIMEOUT', '1500'))
+            )
+            self.supervisor.start()
+            
+            if not self.supervisor.device_count:
+                logger.error("No devices configured. Please check your config.json file.")
+                self.supervisor.stop()
+                sys.exit(1)
+                
+            logger.info(f"Initialized supervisor with {workers} workers for {self.supervisor.device_count} devices")
+            
+        except Exception as e:
+            logger.error(f"Failed to initialize supervisor: {e}")
+            sys.exit(1)
     
     def setup_poller(self):
         """Initialize the Modbus poller"""
@@ -53,17 +109,64 @@ class ModbusScheduler:
             logger.error(f"Failed to initialize poller: {e}")
             sys.exit(1)
     
+    def on_promote(self, term: int):
+        """Take over from the previous active node"""
+        state = self.elector.load_state()
+        if not state:
+            return
+        
+        if self.poller is not None and state.get('poller'):
+            self.poller.import_state(state['poller'])
+            logger.info(f"Imported poll state handed off by the previous active node (term {term})")
+        elif self.supervisor is not None and state.get('supervisor'):
+            self.supervisor.import_state(state['supervisor'])
+            logger.info(f"Handed the previous active node's poll state to the workers (term {term})")
+        elif state.get('poller') or state.get('supervisor'):
+            logger.warning("Previous active node ran in a different process mode, its poll state was dropped")
+        
+        # If the previous node died before running its last scheduled cycle,
+        # run it now instead of waiting for the next tick
+        missed = datetime.now().timestamp() - state.get('last_cycle_started', 0) > self.interval_minutes * 60
+        if missed and self.scheduler.running:
+            logger.warning("Previous active node missed a cycle, polling now")
+            self.scheduler.add_job(
+                func=self.run_polling_job,
+                trigger='date',
+                id='takeover_poll',
+                name='Takeover Polling Job',
+                replace_existing=True
+            )
+    
+    def is_active(self) -> bool:
+        """Whether this node may talk to devices (always true without HA)"""
+        return self.elector is None or self.elector.is_leader()
+    
     def run_polling_job(self):
         """Execute the polling job"""
         try:
+            if not self.is_active():
+                logger.info("Standby node, skipping polling cycle")
+                return
+            
             logger.info("Starting scheduled polling cycle")
             start_time = datetime.now()
             
-            success = self.poller.poll_all_devices()
+            if self.supervisor is not None:
+                success = self.supervisor.run_cycle()
+            else:
+                success = self.poller.poll_all_devices()
             
             end_time = datetime.now()
             duration = (end_time - start_time).total_seconds()
             
+            if self.elector is not None:
+                self.elector.save_state({
+                    'last_cycle_started': start_time.timestamp(),
+                    'last_cycle_completed': end_time.timestamp(),
+                    'poller': self.poller.export_state() if self.poller is not None else {},
+                    'supervisor': self.supervisor.export_state() if self.supervisor is not None else {}
+                })
+            
             if success:
                 logger.info(f"Polling cycle completed successfully in {duration:.2f} seconds")
             else:
@@ -73,12 +176,27 @@ class ModbusScheduler:
             logger.error(f"Error in polling job: {e}")
     
     def start_scheduler(self):
-        """Start the scheduler with 30-minute intervals"""
+        """Start the scheduler with POLL_INTERVAL_MINUTES intervals"""
         try:
-            # Add the polling job to run every 30 minutes
+            if self.elector is not None:
+                self.elector.start()
+                role = "active" if self.elector.is_leader() else "standby"
+                logger.info(f"HA mode enabled, node {self.elector.node_id} starting as {role}")
+            
+            if self.poller is not None:
+                self.local_api = create_local_api(self.poller, is_active=self.is_active)
+                if self.local_api is not None:
+                    self.local_api.start()
+            elif os.getenv('LOCAL_API_PORT'):
+                logger.warning("The local API is not available in multi-process mode")
+            
+            # Add the polling job, counted from midnight so cycles land on clock marks
+            # (:00 and :30 by default); unlike a cron minute step this also gives the
+            # right spacing for intervals such as 45 or 90 that do not divide an hour
+            midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
             self.scheduler.add_job(
                 func=self.run_polling_job,
-                trigger=CronTrigger(minute='*/30'),  # Every 30 minutes
+                trigger=IntervalTrigger(minutes=self.interval_minutes, start_date=midnight),
                 id='modbus_polling',
                 name='Modbus Polling Job',
                 replace_existing=True
@@ -92,7 +210,7 @@ class ModbusScheduler:
                 name='Initial Polling Job'
             )
             
-            logger.info("Scheduler configured to run every 30 minutes")
+            logger.info(f"Scheduler configured to run every {self.interval_minutes} minutes")
             logger.info("Starting scheduler...")
             
             # Start the scheduler
@@ -107,6 +225,14 @@ class ModbusScheduler:
         try:
             logger.info("Stopping scheduler...")
             self.scheduler.shutdown()
+            if self.local_api is not None:
+                self.local_api.stop()
+            if self.poller is not None:
+                self.poller.close()
+            if self.supervisor is not None:
+                self.supervisor.stop()
+            if self.elector is not None:
+                self.elector.stop()
             logger.info("Scheduler stopped")
         except Exception as e:
             logger.error(f"Error stopping scheduler: {e}")
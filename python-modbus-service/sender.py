@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Adaptive batch upload of readings to the Laravel API
+Batch size and in-flight requests follow additive-increase/multiplicative-decrease
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# POST /api/readings/batch rejects larger batches (ReadingController: max:1000)
+SERVER_BATCH_LIMIT = 1000
+
+
+class AimdController:
+    """Batch size and concurrency limits driven by per-wave API feedback
+
+    A wave is one round of concurrent batch requests. A clean wave grows the
+    batch size by `batch_step`, and once batches are at the ceiling adds one
+    request in flight. A wave with an error, a 429/5xx or a latency above
+    `target_latency` halves both, never below the floors.
+    """
+
+    def __init__(self, min_batch: int = 10, max_batch: int = 500, batch_step: int = 25,
+                 min_concurrency: int = 1, max_concurrency: int = 4,
+                 target_latency: float = 2.0, decrease_factor: float = 0.5):
+        if max_batch > SERVER_BATCH_LIMIT:
+            logger.warning(f"API_BATCH_MAX {max_batch} is above the API's limit, using {SERVER_BATCH_LIMIT}")
+        self.max_batch = min(max_batch, SERVER_BATCH_LIMIT)
+        self.min_batch = min(min_batch, self.max_batch)
+        self.batch_step = batch_step
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.batch_size = self.min_batch
+        self.concurrency = min_concurrency
+        self.increases = 0
+        self.decreases = 0
+
+    def update(self, latencies: List[float], congested: bool):
+        """Adjust the limits after a wave"""
+        if congested or max(latencies, default=0.0) > self.target_latency:
+            self.batch_size = max(self.min_batch, int(self.batch_size * self.decrease_factor))
+            self.concurrency = max(self.min_concurrency, int(self.concurrency * self.decrease_factor))
+            self.decreases += 1
+        elif self.batch_size < self.max_batch:
+            self.batch_size = min(self.max_batch, self.batch_size + self.batch_step)
+            self.increases += 1
+        elif self.concurrency < self.max_concurrency:
+            self.concurrency += 1
+            self.increases += 1
+
+
+class BatchSender:
+    """Uploads readings through POST /api/readings/batch in AIMD-sized waves"""
+
+    def __init__(self, url: str, controller: AimdController, timeout: float = 30.0):
+        self.url = url
+        self.controller = controller
+        self.timeout = timeout
+        self.local = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=controller.max_concurrency,
+                                           thread_name_prefix='api-sender')
+        self.stats = {"batches": 0, "congested_batches": 0, "readings_sent": 0,
+                      "readings_rejected": 0, "last_latency_ms": None}
+
+    @classmethod
+    def from_env(cls, api_url: str):
+        """Build a sender from API_BATCH_* variables; None to post readings one by one"""
+        if os.getenv('API_BATCH_SEND', 'false').lower() != 'true':
+            return None
+        controller = AimdController(
+            min_batch=int(os.getenv('API_BATCH_MIN', '10')),
+            max_batch=int(os.getenv('API_BATCH_MAX', '500')),
+            batch_step=int(os.getenv('API_BATCH_STEP', '25')),
+            min_concurrency=int(os.getenv('API_CONCURRENCY_MIN', '1')),
+            max_concurrency=int(os.getenv('API_CONCURRENCY_MAX', '4')),
+            target_latency=float(os.getenv('API_TARGET_LATENCY', '2'))
+        )
+        return cls(os.getenv('API_BATCH_URL') or f"{api_url}/batch", controller)
+
+    def _session(self):
+        # One session per sender thread; sessions are not shared across threads
+        if not hasattr(self.local, 'session'):
+            import requests
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def _post(self, batch: List[Dict[str, Any]],
+              parent: Optional[tracing.SpanContext] = None) -> Tuple[float, bool, int, List[Dict[str, Any]]]:
+        """(latency, congested, sent, retry) for one batch request"""
+        import requests
+
+        start = time.monotonic()
+        try:
+            with tracing.span('send_batch', parent, readings=len(batch)):
+                response = self._session().post(self.url, json={"readings": batch}, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Request error sending batch of {len(batch)} readings: {e}")
+            return time.monotonic() - start, True, 0, batch
+        latency = time.monotonic() - start
+
+        if response.status_code == 429 or response.status_code >= 500:
+            logger.error(f"API error {response.status_code} for batch of {len(batch)} readings")
+            return latency, True, 0, batch
+        if response.status_code != 200:
+            logger.error(f"API rejected batch of {len(batch)} readings ({response.status_code}): {response.text}")
+            return latency, False, 0, []
+
+        sent = 0
+        retry = []
+        for result in response.json().get('results', []):
+            if result['status'] in (200, 201):
+                sent += 1
+            elif result['status'] >= 500:
+                retry.append(batch[result['index']])
+            else:
+                logger.error(f"API rejected reading {batch[result['index']]['parameter']} "
+                             f"({result['status']}): {result.get('message')}")
+        return latency, False, sent, retry
+
+    def send(self, readings: List[Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]]]:
+        """Upload readings; returns the number stored and the readings to retry later"""
+        sent = 0
+        retry: List[Dict[str, Any]] = []
+        position = 0
+
+        while position < len(readings):
+            size = self.controller.batch_size
+            batches = []
+            for _ in range(self.controller.concurrency):
+                if position >= len(readings):
+                    break
+                batches.append(readings[position:position + size])
+                position += size
+
+            parent = tracing.current_context()
+            results = list(self.executor.map(lambda batch: self._post(batch, parent), batches))
+            congested = [result[1] for result in results]
+            self.controller.update([result[0] for result in results], any(congested))
+
+            for latency, batch_congested, batch_sent, batch_retry in results:
+                sent += batch_sent
+                retry.extend(batch_retry)
+                self.stats["batches"] += 1
+                self.stats["congested_batches"] += int(batch_congested)
+                self.stats["last_latency_ms"] = round(latency * 1000, 1)
+
+            if all(congested):
+                # Nothing got through this wave: keep the rest for the next cycle
+                # instead of pressing on against an overloaded or unreachable API
+                retry.extend(readings[position:])
+                break
+
+        self.stats["readings_sent"] += sent
+        self.stats["readings_rejected"] += len(readings) - sent - len(retry)
+        return sent, retry
+
+    def metrics(self) -> Dict[str, Any]:
+        """Current AIMD settings and upload counters"""
+        controller = self.controller
+        return {
+            "batch_size": controller.batch_size,
+            "concurrency": controller.concurrency,
+            "batch_limits": [controller.min_batch, controller.max_batch],
+            "concurrency_limits": [controller.min_concurrency, controller.max_concurrency],
+            "target_latency_ms": round(controller.target_latency * 1000, 1),
+            "increases": controller.increases,
+            "decreases": controller.decreases,
+            **self.stats
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Consistent hashing for splitting devices across poller worker processes
+"""
+
+import bisect
+import hashlib
+from typing import Hashable, Iterable, List, Tuple
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes
+
+    Keys are gateway IPs, so every slave behind one gateway lands on the same
+    worker and only ~1/N of the gateways move when the worker count changes.
+    """
+
+    def __init__(self, nodes: Iterable[Hashable], replicas: int = 64):
+        self.ring: List[Tuple[int, Hashable]] = []
+        for node in nodes:
+            for replica in range(replicas):
+                self.ring.append((self._hash(f"{node}#{replica}"), node))
+        self.ring.sort()
+        self.hashes = [h for h, _ in self.ring]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+    def node_for(self, key: str) -> Hashable:
+        """Node owning a key"""
+        if not self.ring:
+            raise ValueError("Hash ring has no nodes")
+        index = bisect.bisect(self.hashes, self._hash(key)) % len(self.ring)
+        return self.ring[index][1]
+
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Output sinks for the Modbus polling service
+Fans each cycle's readings out to MQTT, HTTP and file consumers, each on its own queue and thread
+"""
+
+import calendar
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def reading_epoch_ns(reading: Dict[str, Any]) -> int:
+    """Nanosecond epoch of a reading's Y-m-dTH:i:sZ timestamp"""
+    return calendar.timegm(time.strptime(reading['timestamp'], '%Y-%m-%dT%H:%M:%SZ')) * 1_000_000_000
+
+
+def _escape_tag(value: Any) -> str:
+    return re.sub(r'([,= ])', r'\\\1', str(value))
+
+
+def to_json(reading: Dict[str, Any]) -> str:
+    return json.dumps(reading, separators=(',', ':'))
+
+
+def to_line_protocol(reading: Dict[str, Any], measurement: str = 'modbus') -> str:
+    """InfluxDB line protocol: device, parameter and unit as tags, value as the field"""
+    tags = f"device_id={reading['device_id']},parameter={_escape_tag(reading['parameter'])}"
+    if reading.get('unit'):
+        tags += f",unit={_escape_tag(reading['unit'])}"
+    return f"{_escape_tag(measurement)},{tags} value={float(reading['value'])} {reading_epoch_ns(reading)}"
+
+
+class Sink:
+    """A reading consumer with its own bounded queue, batching and worker thread
+
+    `submit()` never blocks: when the queue is full the readings are dropped
+    and counted, so a slow or failing sink cannot hold up polling or the
+    other sinks. Subclasses implement `write(batch)`.
+    """
+
+    def __init__(self, name: str, queue_size: int = 10000, batch_size: int = 100,
+                 flush_interval: float = 1.0, retries: int = 3):
+        self.name = name
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.stats = {"queued": 0, "written": 0, "dropped": 0, "failed_batches": 0}
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"sink-{name}", daemon=True)
+
+    def start(self):
+        self.open()
+        self.thread.start()
+
+    def open(self):
+        """Connect or open files before the worker starts"""
+
+    def write(self, batch: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def close_output(self):
+        """Release connections or files after the worker stops"""
+
+    def submit(self, readings: List[Dict[str, Any]]):
+        for reading in readings:
+            try:
+                self.queue.put_nowait(reading)
+                self.stats["queued"] += 1
+            except queue.Full:
+                self.stats["dropped"] += 1
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self.stopping.is_set() and self.queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            for attempt in range(self.retries + 1):
+                try:
+                    self.write(batch)
+                    self.stats["written"] += len(batch)
+                    break
+                except Exception as e:
+                    logger.error(f"Sink {self.name} failed to write {len(batch)} readings "
+                                 f"(attempt {attempt + 1}): {e}")
+                    if attempt < self.retries and not self.stopping.is_set():
+                        time.sleep(min(2 ** attempt, 30))
+            else:
+                self.stats["failed_batches"] += 1
+                self.stats["dropped"] += len(batch)
+
+    def stop(self, timeout: float = 10.0):
+        self.stopping.set()
+        self.thread.join(timeout)
+        self.close_output()
+
+
+class FileSink(Sink):
+    """Appends one serialized reading per line to a file
+
+    `path` may contain strftime codes (e.g. readings-%Y%m%d.lp) to start a
+    new file per day or hour.
+    """
+
+    def __init__(self, name: str, path: str, format: str = 'jsonl', measurement: str = 'modbus', **options):
+        super().__init__(name, **options)
+        if format not in ('jsonl', 'line_protocol'):
+            raise ValueError(f"Unknown file format '{format}', expected jsonl or line_protocol")
+        self.path = path
+        self.format = format
+        self.measurement = measurement
+
+    def serialize(self, reading: Dict[str, Any]) -> str:
+        if self.format == 'line_protocol':
+            return to_line_protocol(reading, self.measurement)
+        return to_json(reading)
+
+    def write(self, batch: List[Dict[str, Any]]):
+        path = time.strftime(self.path, time.gmtime())
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(''.join(f"{self.serialize(reading)}\n" for reading in batch))
+
+
+class HttpSink(Sink):
+    """POSTs each batch as a JSON array to a URL"""
+
+    def __init__(self, name: str, url: str, timeout: float = 10.0, headers: Optional[Dict[str, str]] = None,
+                 **options):
+        super().__init__(name, **options)
+        self.url = url
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.session = None
+
+    def open(self):
+        import requests
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+
+    def write(self, batch: List[Dict[str, Any]]):
+        response = self.session.post(self.url, json=batch, timeout=self.timeout)
+        if response.status_code >= 300:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+
+    def close_output(self):
+        if self.session is not None:
+            self.session.close()
+
+
+class MqttSink(Sink):
+    """Publishes each reading as JSON to a topic per device and parameter (needs paho-mqtt)"""
+
+    def __init__(self, name: str, host: str, port: int = 1883, topic: str = 'modbus/{device_id}/{parameter}',
+                 qos: int = 0, retain: bool = False, username: Optional[str] = None,
+                 password: Optional[str] = None, **options):
+        super().__init__(name, **options)
+        try:
+            import paho.mqtt.client as mqtt
+        except ImportError:
+            raise ValueError("MQTT sinks need the paho-mqtt package") from None
+        self.client = mqtt.Client(client_id=f"modbus-poller-{name}")
+        if username:
+            self.client.username_pw_set(username, password)
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.qos = qos
+        self.retain = retain
+
+    def open(self):
+        # connect_async + loop_start: reconnects in the background, never blocks polling
+        self.client.connect_async(self.host, self.port)
+        self.client.loop_start()
+
+    def write(self, batch: List[Dict[str, Any]]):
+        if not self.client.is_connected():
+            raise RuntimeError(f"Not connected to {self.host}:{self.port}")
+        for reading in batch:
+            topic = self.topic.format(
+                device_id=reading['device_id'],
+                parameter=re.sub(r'[^A-Za-z0-9_.-]+', '_', reading['parameter']).strip('_')
+            )
+            self.client.publish(topic, to_json(reading), qos=self.qos, retain=self.retain)
+
+    def close_output(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+SINK_TYPES = {
+    'file': FileSink,
+    'http': HttpSink,
+    'mqtt': MqttSink,
+}
+
+
+class SinkPipeline:
+    """Every configured sink, fed from one set of readings per poll"""
+
+    def __init__(self, sinks: List[Sink]):
+        self.sinks = sinks
+
+    @classmethod
+    def from_config(cls, path: str) -> 'SinkPipeline':
+        """Build sinks from a JSON list of {"type": ..., "name": ..., options}"""
+        with open(path, 'r') as f:
+            entries = json.load(f)
+
+        sinks = []
+        for index, entry in enumerate(entries):
+            options = dict(entry)
+            kind = options.pop('type', None)
+            name = options.pop('name', f"{kind}-{index}")
+            if options.pop('enabled', True) is False:
+                continue
+            if kind not in SINK_TYPES:
+                logger.error(f"Skipping sink {name}: unknown type '{kind}'")
+                continue
+            try:
+                sinks.append(SINK_TYPES[kind](name, **options))
+            except (TypeError, ValueError) as e:
+                logger.error(f"Skipping sink {name}: {e}")
+        return cls(sinks)
+
+    @classmethod
+    def from_env(cls) -> Optional['SinkPipeline']:
+        """Build and start the sinks listed in SINKS_CONFIG; None when unset"""
+        path = os.getenv('SINKS_CONFIG')
+        if not path:
+            return None
+        pipeline = cls.from_config(path)
+        pipeline.start()
+        logger.info(f"Output sinks: {', '.join(sink.name for sink in pipeline.sinks) or 'none'}")
+        return pipeline
+
+    def start(self):
+        for sink in self.sinks:
+            sink.start()
+
+    def publish(self, readings: List[Dict[str, Any]]):
+        # Sinks serialize on their own threads while the poller keeps
+        # annotating its readings, so they get copies
+        snapshot = [dict(reading) for reading in readings]
+        for sink in self.sinks:
+            sink.submit(snapshot)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {sink.name: {**sink.stats, "backlog": sink.queue.qsize()} for sink in self.sinks}
+
+    def close(self):
+        """Drain and stop every sink"""
+        for sink in self.sinks:
+            sink.stopping.set()
+        for sink in self.sinks:
+            sink.stop()
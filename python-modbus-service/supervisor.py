@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Multi-process supervisor for the Modbus polling service
+Splits devices across worker processes by gateway and restarts crashed workers
+"""
+
+import logging
+import multiprocessing
+import queue
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def worker_main(index: int, count: int, config_file: str, api_url: str,
+                commands: multiprocessing.Queue, results: multiprocessing.Queue,
+                abort=None):
+    """Worker process: poll this shard's devices whenever a cycle is requested
+
+    Commands are `{"type": "cycle", "cycle": n, "export": bool}`, which polls
+    and reports (with the poller state when `export` is set, for the HA
+    handoff), `{"type": "import", "state": {...}}` and None to exit.
+    """
+    # Imported here so the supervisor process never loads pymodbus
+    from poller import ModbusPoller
+
+    poller = ModbusPoller(config_file=config_file, api_url=api_url, shard=(index, count))
+    if abort is not None:
+        poller.is_active = lambda: not abort.is_set()
+    results.put({"type": "ready", "worker": index, "devices": len(poller.devices)})
+
+    while True:
+        command = commands.get()
+        if command is None:
+            poller.close()
+            break
+        if command["type"] == "import":
+            poller.import_state(command["state"])
+            continue
+
+        cycle = command["cycle"]
+        start = time.monotonic()
+        try:
+            success = poller.poll_all_devices() if poller.devices else True
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Worker {index} cycle {cycle} failed: {e}")
+            success = False
+
+        results.put({
+            "type": "cycle",
+            "worker": index,
+            "cycle": cycle,
+            "success": success,
+            "duration": time.monotonic() - start,
+            "state": poller.export_state() if command.get("export") else None,
+            **poller.last_cycle_stats
+        })
+
+
+class WorkerHandle:
+    """A worker process and its command queue"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[multiprocessing.Process] = None
+        self.commands: Optional[multiprocessing.Queue] = None
+        self.restarts = 0
+        self.devices = 0
+
+
+class WorkerSupervisor:
+    """Runs polling cycles on N sharded worker processes and merges their results"""
+
+    def __init__(self, workers: int, config_file: str, api_url: str,
+                 cycle_timeout: float = 1500.0, start_timeout: float = 60.0):
+        self.workers = [WorkerHandle(index) for index in range(workers)]
+        self.config_file = config_file
+        self.api_url = api_url
+        self.cycle_timeout = cycle_timeout
+        self.start_timeout = start_timeout
+        self.results: multiprocessing.Queue = multiprocessing.Queue()
+        # Set when `is_active` turns false mid-cycle; workers check it before each device
+        self.abort = multiprocessing.Event()
+        self.is_active: Callable[[], bool] = lambda: True
+        # With HA, workers report their poller state after each cycle for the handoff
+        self.export_worker_state = False
+        self.worker_states: Dict[int, Dict[str, Any]] = {}
+        self.cycle = 0
+        self.last_cycle_stats: Dict[str, Any] = {}
+
+    @property
+    def device_count(self) -> int:
+        return sum(worker.devices for worker in self.workers)
+
+    def _spawn(self, worker: WorkerHandle):
+        worker.commands = multiprocessing.Queue()
+        worker.process = multiprocessing.Process(
+            target=worker_main,
+            args=(worker.index, len(self.workers), self.config_file, self.api_url,
+                  worker.commands, self.results, self.abort),
+            name=f"modbus-worker-{worker.index}",
+            daemon=True
+        )
+        worker.process.start()
+        logger.info(f"Started worker {worker.index} (pid {worker.process.pid})")
+
+    def _restart(self, worker: WorkerHandle, reason: str):
+        logger.warning(f"Restarting worker {worker.index}: {reason}")
+        if worker.process is not None and worker.process.is_alive():
+            worker.process.terminate()
+            worker.process.join(5)
+        worker.restarts += 1
+        self._spawn(worker)
+
+    def start(self):
+        """Spawn all workers and wait until each has loaded its shard"""
+        for worker in self.workers:
+            self._spawn(worker)
+
+        ready = set()
+        deadline = time.monotonic() + self.start_timeout
+        while len(ready) < len(self.workers) and time.monotonic() < deadline:
+            try:
+                message = self.results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if message["type"] == "ready":
+                self.workers[message["worker"]].devices = message["devices"]
+                ready.add(message["worker"])
+
+        if len(ready) < len(self.workers):
+            logger.warning(f"Only {len(ready)}/{len(self.workers)} workers reported ready")
+        logger.info(f"Supervisor running {len(self.workers)} workers for {self.device_count} devices")
+
+    def run_cycle(self) -> bool:
+        """Trigger one polling cycle on every worker and merge the results"""
+        self.cycle += 1
+        cycle = self.cycle
+        self.abort.clear()
+
+        for worker in self.workers:
+            if worker.process is None or not worker.process.is_alive():
+                self._restart(worker, "process not running")
+            worker.commands.put({"type": "cycle", "cycle": cycle, "export": self.export_worker_state})
+
+        pending = {worker.index for worker in self.workers}
+        reports: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.cycle_timeout
+
+        while pending and time.monotonic() < deadline:
+            if not self.abort.is_set() and not self.is_active():
+                logger.warning(f"Lease lost, aborting cycle {cycle} on all workers")
+                self.abort.set()
+            try:
+                message = self.results.get(timeout=1.0)
+            except queue.Empty:
+                for index in list(pending):
+                    worker = self.workers[index]
+                    if not worker.process.is_alive():
+                        # Crashed mid-cycle: this shard's cycle is lost
+                        pending.discard(index)
+                        self._restart(worker, f"exited with code {worker.process.exitcode}")
+                continue
+
+            if message["type"] == "ready":
+                self.workers[message["worker"]].devices = message["devices"]
+            elif message["type"] == "cycle" and message["cycle"] == cycle:
+                pending.discard(message["worker"])
+                reports.append(message)
+                if message.get("state") is not None:
+                    self.worker_states[message["worker"]] = message["state"]
+
+        for index in pending:
+            self._restart(self.workers[index], f"cycle {cycle} timed out")
+
+        self.last_cycle_stats = self._merge(reports, len(pending))
+        stats = self.last_cycle_stats
+        logger.info(
+            f"Cycle {cycle}: {stats['workers_ok']}/{len(self.workers)} workers, "
+            f"{stats['devices_ok']}/{stats['devices']} devices, "
+            f"{stats['readings_sent']}/{stats['readings_read']} readings sent, "
+            f"slowest worker {stats['max_worker_duration']:.2f}s"
+        )
+        return stats['devices_ok'] > 0
+
+    def _merge(self, reports: List[Dict[str, Any]], lost: int) -> Dict[str, Any]:
+        """Combine per-worker cycle reports into fleet-wide stats"""
+        return {
+            "workers_ok": sum(1 for report in reports if report["success"]),
+            "workers_lost": lost,
+            "devices": self.device_count,
+            "devices_ok": sum(report.get("devices_ok", 0) for report in reports),
+            "readings_read": sum(report.get("readings_read", 0) for report in reports),
+            "readings_sent": sum(report.get("readings_sent", 0) for report in reports),
+            "max_worker_duration": max((report["duration"] for report in reports), default=0.0),
+            "restarts": sum(worker.restarts for worker in self.workers)
+        }
+
+    def export_state(self) -> Dict[str, Any]:
+        """Each worker's poller state as of its last reported cycle"""
+        return {
+            "workers": len(self.workers),
+            "shards": {str(index): state for index, state in self.worker_states.items()}
+        }
+
+    def import_state(self, state: Dict[str, Any]):
+        """Hand each worker the state of its shard from export_state()
+
+        Devices are assigned to shards by worker count, so state from a node
+        running a different number of workers cannot be split and is dropped.
+        """
+        if state.get("workers") != len(self.workers):
+            logger.warning(f"Ignoring handed-off state from {state.get('workers')} workers, "
+                           f"this node runs {len(self.workers)}")
+            return
+        for index, shard in state.get("shards", {}).items():
+            worker = self.workers[int(index)]
+            worker.commands.put({"type": "import", "state": shard})
+            self.worker_states[worker.index] = shard
+
+    def stop(self):
+        """Ask workers to exit, terminating any that do not"""
+        for worker in self.workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.commands.put(None)
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.join(10)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+        logger.info("All workers stopped")
@@ -0,0 +1,46 @@
+import json
+import os
+import sys
+
+import pytest
+
+# The service modules live next to this directory and are imported by name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Every variable the service reads, cleared so tests run with the defaults
+SERVICE_VARIABLES = (
+    'API_BATCH_MAX', 'API_BATCH_MIN', 'API_BATCH_SEND', 'API_BATCH_STEP', 'API_BATCH_URL',
+    'API_CONCURRENCY_MAX', 'API_CONCURRENCY_MIN', 'API_TARGET_LATENCY', 'BACKFILL_MIN_GAP_SECONDS',
+    'BACKFILL_RETRY_SECONDS', 'CHECKPOINT_PATH', 'CONFIG_CACHE_PATH', 'EDGE_ALERTS',
+    'EDGE_ALERTS_HYSTERESIS', 'EDGE_ALERTS_PUSH_URL', 'EDGE_ALERTS_REFRESH_SECONDS',
+    'EDGE_ALERTS_RULES_URL', 'HA_LEASE_PATH', 'HA_LEASE_TTL', 'HA_NODE_ID', 'LARAVEL_API_URL',
+    'LIVE_VALUES_MAX_WAIT', 'LIVE_VALUES_STALE_SECONDS', 'LOAD_PROFILE_LAYOUTS', 'LOCAL_API_HOST',
+    'LOCAL_API_PORT', 'LOCAL_API_TOKEN', 'LOCAL_STORE_DIR', 'LOCAL_STORE_MAX_OPEN',
+    'LOCAL_STORE_RETENTION_HOURS', 'LOCAL_STORE_SEGMENT_POINTS', 'MAX_PENDING_READINGS',
+    'MODBUS_CAPTURE_FILE', 'MODBUS_CAPTURE_MAX_MB', 'MODBUS_CONFIG', 'ONDEMAND_CACHE_TTL',
+    'PIPELINE_ACQUIRE_WORKERS', 'PIPELINE_BATCH_SIZE', 'PIPELINE_BATCH_WAIT',
+    'PIPELINE_DECODE_WORKERS', 'PIPELINE_PROCESS_WORKERS', 'PIPELINE_QUEUE_SIZE',
+    'PIPELINE_STAGED', 'POLLER_CYCLE_TIMEOUT', 'POLLER_WORKERS', 'POLL_INTERVAL_MINUTES',
+    'PROFILE_DIR', 'PROFILE_INTERVAL_MS', 'PROFILE_KEEP', 'PROFILE_SLOW_CYCLE_SECONDS',
+    'PROFILE_TRACEMALLOC', 'QUALITY_ACTION', 'READ_PLAN_LEARN_PATH', 'READ_PLAN_MAX_REQUEST_GAP',
+    'READ_PLAN_MERGE_GAP', 'REGISTRY_CACHE_PATH', 'REGISTRY_REFRESH_SECONDS', 'REGISTRY_SYNC',
+    'REGISTRY_URL', 'SINKS_CONFIG', 'TRACE_FILE', 'TRACE_MAX_MB', 'TRACE_SERVICE_NAME',
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_environment(monkeypatch):
+    for name in SERVICE_VARIABLES:
+        monkeypatch.delenv(name, raising=False)
+
+
+@pytest.fixture
+def write_config(tmp_path, monkeypatch):
+    """Write a config.json into a scratch working directory and return its path"""
+    monkeypatch.chdir(tmp_path)
+
+    def write(devices):
+        path = tmp_path / 'config.json'
+        path.write_text(json.dumps(devices))
+        return str(path)
+    return write
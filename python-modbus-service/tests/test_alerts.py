@@ -0,0 +1,106 @@
+import sys
+import time
+import types
+
+import pytest
+
+from alerts import AlertEvaluator
+
+
+class RequestException(Exception):
+    pass
+
+
+class FakeResponse:
+    status_code = 200
+    text = ''
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+@pytest.fixture
+def rules_api(monkeypatch):
+    """A stand-in for `requests` whose rules endpoint counts calls and can be taken down"""
+    api = types.SimpleNamespace(calls=0, up=True, rules=[
+        {"device_id": 1, "parameter": "Voltage", "min": 200, "max": 250}
+    ])
+
+    def get(url, timeout=None):
+        api.calls += 1
+        if not api.up:
+            raise RequestException('connection refused')
+        return FakeResponse({"rules": api.rules})
+
+    class Session:
+        def post(self, url, json=None, timeout=None):
+            return types.SimpleNamespace(status_code=201, text='')
+
+    monkeypatch.setitem(sys.modules, 'requests', types.SimpleNamespace(
+        get=get, Session=Session, exceptions=types.SimpleNamespace(RequestException=RequestException)
+    ))
+    return api
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def reading(value):
+    return {"device_id": 1, "parameter": "Voltage", "value": value, "quality": "good",
+            "timestamp": "2025-07-08T16:00:00Z"}
+
+
+def test_evaluate_only_reads_cached_rules(rules_api):
+    evaluator = AlertEvaluator('rules', 'push')
+    try:
+        wait_for(lambda: evaluator.rules_loaded_at is not None)
+        for _ in range(20):
+            batch = [reading(260.0)]
+            evaluator.evaluate(batch)
+            assert batch[0]['alerts_evaluated']
+        assert rules_api.calls == 1
+        assert evaluator.stats['raised'] == 1
+    finally:
+        evaluator.close()
+
+
+def test_failed_fetch_is_recorded_and_backed_off(rules_api):
+    rules_api.up = False
+    evaluator = AlertEvaluator('rules', 'push')
+    try:
+        wait_for(lambda: evaluator.rule_failures == 1)
+        assert evaluator.rules_failed_at is not None
+        batch = [reading(260.0)]
+        evaluator.evaluate(batch)
+        time.sleep(0.2)
+        assert rules_api.calls == 1
+        assert 'alerts_evaluated' not in batch[0]
+    finally:
+        evaluator.close()
+
+
+def test_restored_alarms_wait_for_the_rules(rules_api):
+    rules_api.up = False
+    evaluator = AlertEvaluator('rules', 'push')
+    try:
+        wait_for(lambda: evaluator.rule_failures == 1)
+        evaluator.import_state({"active": [[1, "Voltage", "out_of_range"]]})
+        assert evaluator.export_state()['active'] == [[1, "Voltage", "out_of_range"]]
+
+        rules_api.up = True
+        assert evaluator.refresh_rules()
+        evaluator.evaluate([reading(260.0)])
+        assert evaluator.stats['raised'] == 0
+        assert evaluator.export_state()['active'] == [[1, "Voltage", "out_of_range"]]
+    finally:
+        evaluator.close()
@@ -0,0 +1,50 @@
+import contextlib
+import types
+
+import pytest
+
+from commands import CommandError, CommandExecutor
+
+DEVICE = types.SimpleNamespace(device_id=1, ip='127.0.0.1', port=502, timeout=1, slave_id=1)
+
+
+class FakeClient:
+    def __init__(self):
+        self.written = []
+
+    def write_register(self, address, value, slave=None):
+        self.written.append(value)
+        return types.SimpleNamespace(isError=lambda: False)
+
+
+class FakePool:
+    def __init__(self):
+        self.client = FakeClient()
+
+    @contextlib.contextmanager
+    def connection(self, ip, port, timeout, priority):
+        yield self.client
+
+
+@pytest.fixture
+def executor():
+    poller = types.SimpleNamespace(device_by_id=lambda device_id: DEVICE if device_id == 1 else None)
+    return CommandExecutor(poller, FakePool())
+
+
+def command(value):
+    return {"device_id": 1, "type": "register", "address": 10, "value": value, "verify": False}
+
+
+@pytest.mark.parametrize('value, written', [(21, 21), (21.0, 21), (0xFFFF, 0xFFFF)])
+def test_register_accepts_whole_numbers(executor, value, written):
+    result = executor.execute(command(value))
+    assert result['success']
+    assert executor.pool.client.written == [written]
+
+
+@pytest.mark.parametrize('value', [21.7, None, [1], '21', True, -1, 0x10000])
+def test_register_rejects_other_values(executor, value):
+    with pytest.raises(CommandError):
+        executor.execute(command(value))
+    assert executor.pool.client.written == []
@@ -0,0 +1,75 @@
+import pytest
+
+from compression import CompressionStage, SwingingDoorCompressor
+from poller import ModbusPoller
+
+
+def compress(compressor, points):
+    return [payload for t, value in points for payload in compressor.offer(t, value, (t, value))]
+
+
+def test_first_point_is_archived_and_a_straight_line_is_held():
+    compressor = SwingingDoorCompressor(0.5)
+    assert compress(compressor, [(0, 10.0), (60, 11.0), (120, 12.0), (180, 13.0)]) == [(0, 10.0)]
+    assert compressor.flush() == [(180, 13.0)]
+    assert compressor.flush() == []
+
+
+def test_leaving_the_corridor_archives_the_held_point():
+    compressor = SwingingDoorCompressor(0.5)
+    emitted = compress(compressor, [(0, 10.0), (60, 10.1), (120, 10.2), (180, 20.0)])
+    assert emitted == [(0, 10.0), (120, 10.2)]
+
+
+def test_reconstruction_stays_within_the_deviation():
+    compressor = SwingingDoorCompressor(0.5)
+    points = [(t * 60, 230.0 + 0.3 * (t % 7) - 0.02 * t) for t in range(200)]
+    archived = compress(compressor, points) + compressor.flush()
+    assert len(archived) < len(points)
+    for t, value in points:
+        before = max(point for point in archived if point[0] <= t)
+        after = min(point for point in archived if point[0] >= t)
+        if after[0] == before[0]:
+            rebuilt = before[1]
+        else:
+            rebuilt = before[1] + (after[1] - before[1]) * (t - before[0]) / (after[0] - before[0])
+        assert abs(rebuilt - value) <= 0.5 + 1e-9
+
+
+def test_max_interval_forces_a_point():
+    compressor = SwingingDoorCompressor(0.5, max_interval=120)
+    emitted = compress(compressor, [(t * 60, 10.0) for t in range(6)])
+    assert [t for t, _ in emitted] == [0, 120, 240]
+
+
+def test_state_round_trip_continues_the_corridor():
+    original = SwingingDoorCompressor(0.5)
+    compress(original, [(0, 10.0), (60, 10.1)])
+    restored = SwingingDoorCompressor.from_state(original.to_state())
+    assert compress(restored, [(120, 10.2), (180, 20.0)]) == compress(original, [(120, 10.2), (180, 20.0)])
+
+
+def test_stage_restarts_a_series_when_its_deviation_changes():
+    stage = CompressionStage()
+    assert stage.process(1, 'V', 0.5, 0, 0, 10.0, 'a') == ['a']
+    assert stage.process(1, 'V', 0.5, 0, 60, 10.0, 'b') == []
+    assert stage.process(1, 'V', 1.0, 0, 120, 10.0, 'c') == ['c']
+
+
+@pytest.mark.parametrize('checkpoint, sent', [(False, 1), (True, 0)])
+def test_close_sends_held_points_without_a_checkpoint(write_config, tmp_path, monkeypatch, checkpoint, sent):
+    if checkpoint:
+        monkeypatch.setenv('CHECKPOINT_PATH', str(tmp_path / 'checkpoint.json'))
+    poller = ModbusPoller(write_config([{
+        "device_id": 1, "ip": "127.0.0.1",
+        "registers": [{"address": 1, "parameter": "V", "compression": {"deviation": 0.5}}]
+    }]))
+    device = poller.devices[0]
+    for minute in (0, 1):
+        poller.compress_readings(device, [{"device_id": 1, "parameter": "V", "value": 230.0,
+                                           "timestamp": f"2025-07-08T16:0{minute}:00Z"}])
+    uploads = []
+    monkeypatch.setattr(poller, 'send_readings_to_api', lambda readings: uploads.extend(readings) or True)
+
+    poller.close()
+    assert [reading['timestamp'] for reading in uploads] == ['2025-07-08T16:01:00Z'][:sent]
@@ -0,0 +1,90 @@
+import pickle
+
+import pytest
+
+from expressions import ExpressionError, VirtualParameter, compile_expression
+from poller import ModbusPoller
+
+
+def reading(parameter, value, quality='good'):
+    return {"device_id": 1, "parameter": parameter, "value": value, "quality": quality,
+            "timestamp": "2025-07-08T16:00:00Z"}
+
+
+def test_arithmetic_with_aliases():
+    vp = VirtualParameter('Power', 'v * i / 1000', inputs={'v': 'Voltage (L-N)', 'i': 'Current'})
+    assert vp.inputs == ['Current', 'Voltage (L-N)']
+    assert vp.evaluate({'Voltage (L-N)': 230.0, 'Current': 10.0}) == 2.3
+
+
+def test_missing_input_gives_none():
+    assert VirtualParameter('P', 'a + b').evaluate({'a': 1.0}) is None
+
+
+def test_bitwise_operators_work_on_whole_float_values():
+    vp = VirtualParameter('Counter', '(hi << 16) | lo')
+    assert vp.evaluate({'hi': 1.0, 'lo': 2.0}) == 65538.0
+
+
+def test_bitwise_operator_on_fractional_value_raises_value_error():
+    with pytest.raises(ValueError):
+        VirtualParameter('Flags', 'status & 4').evaluate({'status': 4.5})
+
+
+def test_complex_result_is_rejected():
+    with pytest.raises(ValueError):
+        VirtualParameter('Root', 'x ** 0.5').evaluate({'x': -4.0})
+
+
+@pytest.mark.parametrize('expression', ['min(x)', 'max(x)', 'round(x, 1, 2)', 'sqrt()', 'atan2(x)'])
+def test_function_arity_is_checked_at_compile_time(expression):
+    with pytest.raises(ExpressionError):
+        compile_expression(expression)
+
+
+@pytest.mark.parametrize('expression', ['__import__("os")', 'x.real', '[x]', 'f(x)', '"a"', 'abs(x=1)'])
+def test_unsafe_expressions_are_rejected(expression):
+    with pytest.raises(ExpressionError):
+        compile_expression(expression)
+
+
+def test_survives_pickling():
+    vp = pickle.loads(pickle.dumps(VirtualParameter('Counter', '(hi << 16) | lo')))
+    assert vp.evaluate({'hi': 0.0, 'lo': 7.0}) == 7.0
+
+
+def test_failing_virtual_parameter_does_not_affect_the_device(write_config):
+    poller = ModbusPoller(write_config([{
+        "device_id": 1, "ip": "127.0.0.1",
+        "registers": [{"address": 1, "parameter": "hi"}, {"address": 3, "parameter": "lo"}],
+        "virtual": [
+            {"parameter": "Root", "expression": "(hi - 10) ** 0.5"},
+            {"parameter": "Flags", "expression": "lo & 1"},
+            {"parameter": "Sum", "expression": "hi + lo"},
+        ]
+    }]))
+    device = poller.devices[0]
+    computed = poller.compute_virtual(device, [reading('hi', 1.0), reading('lo', 2.5)])
+    assert [(item['parameter'], item['value']) for item in computed] == [('Sum', 3.5)]
+
+
+def test_recovered_intervals_get_quality_and_virtual_parameters(write_config):
+    poller = ModbusPoller(write_config([{
+        "device_id": 1, "ip": "127.0.0.1",
+        "registers": [{"address": 1, "parameter": "hi", "validation": {"max": 100}},
+                      {"address": 3, "parameter": "lo"}],
+        "virtual": [{"parameter": "Sum", "expression": "hi + lo"}]
+    }]))
+    recovered = [
+        {"device_id": 1, "parameter": parameter, "value": value, "timestamp": timestamp}
+        for timestamp, hi in (('2025-07-08T15:00:00Z', 1.0), ('2025-07-08T15:15:00Z', 500.0))
+        for parameter, value in (('hi', hi), ('lo', 2.0))
+    ]
+
+    prepared = poller.prepare_recovered(recovered)
+    assert [(item['timestamp'][11:16], item['parameter'], item.get('quality')) for item in prepared] == [
+        ('15:00', 'hi', 'good'), ('15:00', 'lo', 'good'), ('15:00', 'Sum', None),
+        ('15:15', 'hi', 'out_of_bounds'), ('15:15', 'lo', 'good'),
+    ]
+    assert prepared[2]['value'] == 3.0
+    assert poller.quality.metrics()['out_of_bounds'] == 0
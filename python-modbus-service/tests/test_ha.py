@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from ha import LeaseElector
+
+
+@pytest.fixture
+def lease_path(tmp_path):
+    return str(tmp_path / 'lease.db')
+
+
+def test_only_one_node_leads(lease_path):
+    active = LeaseElector(lease_path, node_id='a', ttl=30, safety_margin=0)
+    standby = LeaseElector(lease_path, node_id='b', ttl=30, safety_margin=0)
+    assert active.try_acquire()
+    assert not standby.try_acquire()
+    assert active.try_acquire() and active.term == 1
+
+
+def test_standby_takes_over_a_full_ttl_after_the_last_renewal(lease_path):
+    promoted = []
+    active = LeaseElector(lease_path, node_id='a', ttl=0.3, safety_margin=0)
+    standby = LeaseElector(lease_path, node_id='b', ttl=0.3, safety_margin=0, on_promote=promoted.append)
+    assert active.try_acquire()
+    assert not standby.try_acquire()
+    time.sleep(0.2)
+    assert active.try_acquire()
+    assert not standby.try_acquire()  # renewed, so the standby starts counting again
+    time.sleep(0.35)
+    assert not active.is_leader()
+    assert standby.try_acquire()
+    assert promoted == [2]
+
+
+def test_old_leader_is_fenced_off(lease_path):
+    active = LeaseElector(lease_path, node_id='a', ttl=0.2, safety_margin=0)
+    standby = LeaseElector(lease_path, node_id='b', ttl=0.2, safety_margin=0)
+    assert active.try_acquire()
+    assert active.save_state({'from': 'a'})
+    standby.try_acquire()
+    time.sleep(0.25)
+    assert standby.try_acquire()
+
+    # The old leader has not noticed yet: its writes must not land
+    assert not active.save_state({'from': 'a', 'late': True})
+    assert standby.save_state({'from': 'b'})
+    assert active.load_state() == {'from': 'b'}
+    assert not active.try_acquire()
+
+
+def test_released_lease_is_taken_at_once(lease_path):
+    active = LeaseElector(lease_path, node_id='a', ttl=30, safety_margin=0)
+    standby = LeaseElector(lease_path, node_id='b', ttl=30, safety_margin=0)
+    active.start()
+    active.stop()
+    assert standby.try_acquire()
@@ -0,0 +1,54 @@
+import pytest
+
+from device_config import ReadBlock, parse_config
+from plan_learning import ILLEGAL_DATA_ADDRESS, ILLEGAL_DATA_VALUE, SLAVE_DEVICE_BUSY, ReadPlanLearner
+
+
+@pytest.fixture
+def device():
+    return parse_config([{
+        "device_id": 1, "ip": "127.0.0.1",
+        "registers": [{"address": address, "parameter": f"P{address}"} for address in range(0, 40, 2)]
+    }])[0]
+
+
+@pytest.fixture
+def learner(tmp_path):
+    return ReadPlanLearner(str(tmp_path / 'plans.json'), max_request_gap=0.5)
+
+
+def test_rejected_block_size_is_narrowed_to_the_exact_limit(learner, device):
+    assert [block.count for block in learner.plan(device)] == [40]
+    # A device that accepts at most 30 registers per request
+    for _ in range(10):
+        for block in learner.plan(device):
+            accepted = block.count <= 30
+            learner.observe(device, block, accepted, None if accepted else ILLEGAL_DATA_VALUE)
+
+    # Two-word registers: 30 worked and 32 was the smallest rejected block
+    limits = learner.limits[learner.key(device)]
+    assert (limits.max_ok, limits.min_bad) == (30, 32)
+    assert [block.count for block in learner.plan(device)] == [30, 10]
+
+
+def test_illegal_address_marks_the_register_as_a_hole(learner, device):
+    register = device.registers[5]
+    learner.observe(device, ReadBlock(register.address, 2, [(0, register)]), False, ILLEGAL_DATA_ADDRESS)
+    assert learner.limits[learner.key(device)].holes == [(10, 12)]
+    assert [(block.address, block.count) for block in learner.plan(device)] == [(0, 10), (10, 2), (12, 28)]
+
+
+def test_busy_device_gets_spaced_requests(learner, device):
+    block = learner.plan(device)[0]
+    for _ in range(10):
+        learner.observe(device, block, False, SLAVE_DEVICE_BUSY)
+    assert learner.limits[learner.key(device)].gap == 0.5
+    learner.observe(device, block, True)
+    assert learner.limits[learner.key(device)].gap == 0.49
+
+
+def test_learned_limits_persist(learner, device):
+    learner.observe(device, learner.plan(device)[0], False, ILLEGAL_DATA_VALUE)
+    learner.save()
+    restored = ReadPlanLearner(learner.path)
+    assert [block.count for block in restored.plan(device)] == [block.count for block in learner.plan(device)]
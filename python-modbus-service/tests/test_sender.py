@@ -0,0 +1,30 @@
+from sender import SERVER_BATCH_LIMIT, AimdController
+
+
+def test_clean_waves_grow_batches_then_concurrency():
+    controller = AimdController(min_batch=10, max_batch=60, batch_step=25, max_concurrency=3)
+    for _ in range(2):
+        controller.update([0.1], congested=False)
+    assert (controller.batch_size, controller.concurrency) == (60, 1)
+    for _ in range(5):
+        controller.update([0.1], congested=False)
+    assert (controller.batch_size, controller.concurrency) == (60, 3)
+
+
+def test_congestion_or_slow_wave_halves_down_to_the_floors():
+    controller = AimdController(min_batch=10, max_batch=200, max_concurrency=4, target_latency=1.0)
+    controller.batch_size, controller.concurrency = 200, 4
+    controller.update([0.2, 1.5], congested=False)
+    assert (controller.batch_size, controller.concurrency) == (100, 2)
+    controller.update([], congested=True)
+    controller.update([], congested=True)
+    assert (controller.batch_size, controller.concurrency) == (25, 1)
+    controller.update([], congested=True)
+    controller.update([], congested=True)
+    assert controller.batch_size == 10
+    assert controller.decreases == 5
+
+
+def test_limits_are_clamped_to_the_server_batch_limit():
+    controller = AimdController(min_batch=SERVER_BATCH_LIMIT + 500, max_batch=SERVER_BATCH_LIMIT * 2)
+    assert controller.max_batch == controller.min_batch == controller.batch_size == SERVER_BATCH_LIMIT
@@ -0,0 +1,42 @@
+import queue
+
+from supervisor import WorkerSupervisor, worker_main
+
+
+def test_worker_imports_and_reports_state(write_config):
+    config = write_config([{"device_id": 1, "ip": "127.0.0.1", "registers": []}])
+    commands, results = queue.Queue(), queue.Queue()
+    pending = [{"device_id": 1, "parameter": "Voltage", "value": 230.0,
+                "timestamp": "2025-07-08T16:00:00Z"}]
+    commands.put({"type": "import", "state": {"pending_readings": pending}})
+    commands.put({"type": "cycle", "cycle": 1, "export": True})
+    commands.put(None)
+
+    # Lost shard, so the cycle polls nothing and the handed-off readings stay pending
+    worker_main(1, 2, config, 'http://localhost:8000/api/readings', commands, results)
+
+    assert results.get_nowait()["type"] == "ready"
+    report = results.get_nowait()
+    assert report["cycle"] == 1
+    assert report["state"]["pending_readings"][0]["value"] == 230.0
+
+
+def test_supervisor_routes_each_shard_to_its_worker():
+    supervisor = WorkerSupervisor(2, 'config.json', 'http://localhost:8000/api/readings')
+    for worker in supervisor.workers:
+        worker.commands = queue.Queue()
+
+    supervisor.import_state({"workers": 2, "shards": {"1": {"pending_readings": []}}})
+    assert supervisor.workers[0].commands.empty()
+    assert supervisor.workers[1].commands.get_nowait() == {"type": "import", "state": {"pending_readings": []}}
+    assert supervisor.export_state() == {"workers": 2, "shards": {"1": {"pending_readings": []}}}
+
+
+def test_supervisor_drops_state_from_a_different_worker_count():
+    supervisor = WorkerSupervisor(2, 'config.json', 'http://localhost:8000/api/readings')
+    for worker in supervisor.workers:
+        worker.commands = queue.Queue()
+
+    supervisor.import_state({"workers": 3, "shards": {"0": {}}})
+    assert all(worker.commands.empty() for worker in supervisor.workers)
+    assert supervisor.export_state()["shards"] == {}
@@ -0,0 +1,51 @@
+import pytest
+
+from timeseries_store import TimeSeriesStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / 'store'), retention_hours=1, segment_points=4, max_open=2)
+    yield store
+    store.close()
+
+
+def test_points_span_segments_and_survive_a_reopen(store, tmp_path):
+    for ts in range(10):
+        assert store.append(1, 'Voltage (L-N)', 1000.0 + ts, 230.0 + ts)
+    assert store.range(1, 'Voltage (L-N)', 1003, 1006) == [(1003.0 + ts, 233.0 + ts) for ts in range(4)]
+    assert store.last(1, 'Voltage (L-N)', 3) == [(1007.0, 237.0), (1008.0, 238.0), (1009.0, 239.0)]
+    store.close()
+
+    reopened = TimeSeriesStore(store.root, segment_points=4, read_only=True)
+    assert reopened.list_series() == [{'device_id': 1, 'parameter': 'Voltage (L-N)',
+                                       'first_ts': 1000.0, 'last_ts': 1009.0, 'points': 10}]
+    with pytest.raises(ValueError):
+        reopened.append(1, 'Voltage (L-N)', 2000.0, 1.0)
+
+
+def test_late_points_go_into_the_active_segment_only(store):
+    for ts in (100.0, 101.0, 102.0, 103.0, 110.0, 112.0):
+        store.append(1, 'P', ts, ts)
+    assert store.append(1, 'P', 111.0, 111.0)
+    assert not store.append(1, 'P', 101.5, 101.5)
+    assert store.discarded == 1
+    assert [ts for ts, _ in store.range(1, 'P', 0, 200)] == [100.0, 101.0, 102.0, 103.0, 110.0, 111.0, 112.0]
+
+
+def test_only_max_open_series_stay_mapped(store):
+    for parameter in ('a', 'b', 'c'):
+        store.append(1, parameter, 100.0, 1.0)
+    assert list(store.open_series) == [(1, 'b'), (1, 'c')]
+    assert store.series[(1, 'a')].active is None
+    assert store.append(1, 'a', 101.0, 2.0)
+    assert store.last(1, 'a', 2) == [(100.0, 1.0), (101.0, 2.0)]
+
+
+def test_compaction_removes_expired_segments(store):
+    for ts in range(6):
+        store.append(1, 'P', 1000.0 + ts, float(ts))
+    store.append(2, 'Q', 1000.0, 1.0)
+    assert store.compact(now=1004.5 + 3600) == 2
+    assert store.range(1, 'P', 0, 5000) == [(1004.0, 4.0), (1005.0, 5.0)]
+    assert [entry['device_id'] for entry in store.list_series()] == [1]
@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Embedded local time-series store for the Modbus polling service
+Keeps recent per-register history on the edge in memory-mapped columnar segments
+"""
+
+import argparse
+import bisect
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Segment layout: fixed header, then a float64 timestamp column followed by a
+# float64 value column, both `capacity` slots long. The point count in the
+# header is updated after the slot is written, so a crash mid-append never
+# exposes a half-written point.
+SEGMENT_MAGIC = b'MBTS'
+SEGMENT_VERSION = 1
+SEGMENT_HEADER = struct.Struct('=4sHxxII16x')  # magic, version, capacity, count
+SEGMENT_SUFFIX = '.seg'
+SERIES_META = 'series.json'
+
+
+@dataclass
+class SegmentInfo:
+    """Timestamp index entry for one segment file"""
+    path: str
+    first_ts: float
+    last_ts: float
+    count: int
+    capacity: int
+
+
+class Segment:
+    """A memory-mapped columnar segment"""
+
+    def __init__(self, path: str, capacity: int = 0, writable: bool = False):
+        self.path = path
+        mode = 'w+b' if capacity else ('r+b' if writable else 'rb')
+        self.file = open(path, mode)
+        if capacity:
+            # New segment: preallocate both columns up front
+            self.file.truncate(SEGMENT_HEADER.size + 16 * capacity)
+            self.file.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, capacity, 0))
+            self.file.flush()
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        self.map = mmap.mmap(self.file.fileno(), 0, access=access)
+
+        magic, version, self.capacity, self.count = SEGMENT_HEADER.unpack_from(self.map, 0)
+        if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+            self.close()
+            raise ValueError(f"Not a v{SEGMENT_VERSION} segment: {path}")
+
+        column = 8 * self.capacity
+        self.body = memoryview(self.map)[SEGMENT_HEADER.size:]
+        self.timestamps = self.body[:column].cast('d')
+        self.values = self.body[column:2 * column].cast('d')
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def append(self, ts: float, value: float):
+        """Write one point and publish it by bumping the header count"""
+        self.timestamps[self.count] = ts
+        self.values[self.count] = value
+        self.count += 1
+        SEGMENT_HEADER.pack_into(self.map, 0, SEGMENT_MAGIC, SEGMENT_VERSION, self.capacity, self.count)
+
+    def insert(self, ts: float, value: float) -> bool:
+        """Write one point into timestamp order; False if the timestamp is already stored
+
+        The newest point is first copied into the next free slot and published,
+        then the rest shift up, so a crash mid-insert can at worst show one point
+        twice and never loses one.
+        """
+        with self.timestamps[:self.count] as existing:
+            at = bisect.bisect_left(existing, ts)
+        if at < self.count and self.timestamps[at] == ts:
+            return False
+        if at == self.count:
+            self.append(ts, value)
+            return True
+        last = self.count - 1
+        self.append(self.timestamps[last], self.values[last])
+        self.timestamps[at + 1:last + 1] = self.timestamps[at:last]
+        self.values[at + 1:last + 1] = self.values[at:last]
+        self.timestamps[at] = ts
+        self.values[at] = value
+        return True
+
+    def slice(self, start: float, end: float) -> List[Tuple[float, float]]:
+        """Points with start <= ts <= end"""
+        with self.timestamps[:self.count] as ts:
+            lo = bisect.bisect_left(ts, start)
+            hi = bisect.bisect_right(ts, end)
+        return [(self.timestamps[i], self.values[i]) for i in range(lo, hi)]
+
+    def tail(self, n: int) -> List[Tuple[float, float]]:
+        """Last n points"""
+        lo = max(0, self.count - n)
+        return [(self.timestamps[i], self.values[i]) for i in range(lo, self.count)]
+
+    def info(self) -> SegmentInfo:
+        first = self.timestamps[0] if self.count else 0.0
+        last = self.timestamps[self.count - 1] if self.count else 0.0
+        return SegmentInfo(self.path, first, last, self.count, self.capacity)
+
+    def close(self):
+        for view in ('timestamps', 'values', 'body'):
+            if hasattr(self, view):
+                getattr(self, view).release()
+        if hasattr(self, 'map'):
+            self.map.flush()
+            self.map.close()
+        self.file.close()
+
+
+class Series:
+    """All segments of one register, oldest first
+
+    The newest segment is mapped writable (`active`) only while points are
+    being written to it; the store closes it again when too many series are
+    open. Other segments are mapped read-only for the duration of a query.
+    """
+
+    def __init__(self, path: str, segment_points: int, read_only: bool = False):
+        self.path = path
+        self.segment_points = segment_points
+        self.read_only = read_only
+        self.index: List[SegmentInfo] = []
+        self.active: Optional[Segment] = None
+
+        for name in sorted(os.listdir(path)):
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            try:
+                segment = Segment(os.path.join(path, name))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable segment {name}: {e}")
+                continue
+            if segment.count:
+                self.index.append(segment.info())
+            segment.close()
+
+    def _open_active(self) -> Optional[Segment]:
+        """The newest segment mapped for writing, if it still has room"""
+        if self.active is None and not self.read_only and self.index \
+                and self.index[-1].count < self.index[-1].capacity:
+            self.active = Segment(self.index[-1].path, writable=True)
+        return self.active
+
+    @property
+    def last_ts(self) -> float:
+        return self.index[-1].last_ts if self.index else float('-inf')
+
+    def append(self, ts: float, value: float) -> bool:
+        """Append a point; False if it was not stored (see insert())"""
+        if ts <= self.last_ts:
+            return self.insert(ts, value)
+
+        self._open_active()
+        if self.active is None or self.active.full:
+            if self.active is not None:
+                self.active.close()
+            # Segment names sort by their first timestamp
+            name = f"{int(ts * 1000):016d}{SEGMENT_SUFFIX}"
+            self.active = Segment(os.path.join(self.path, name), capacity=self.segment_points, writable=True)
+            self.index.append(self.active.info())
+
+        self.active.append(ts, value)
+        entry = self.index[-1]
+        if entry.count == 0:
+            entry.first_ts = ts
+        entry.last_ts = ts
+        entry.count = self.active.count
+        return True
+
+    def insert(self, ts: float, value: float) -> bool:
+        """Store an older point, e.g. one recovered from a meter's load profile
+
+        Only the active segment takes late points: one older than everything
+        in it must still be newer than the sealed segment before it, and the
+        active segment needs a free slot. Other late points are not stored.
+        """
+        entry = self.index[-1]
+        if self._open_active() is None or entry.path != self.active.path or self.active.full:
+            return False
+        previous = self.index[-2].last_ts if len(self.index) > 1 else float('-inf')
+        if ts <= previous or not self.active.insert(ts, value):
+            return False
+        entry.first_ts = min(entry.first_ts, ts)
+        entry.count = self.active.count
+        return True
+
+    def _read(self, info: SegmentInfo, reader) -> List[Tuple[float, float]]:
+        if self.active is not None and info.path == self.active.path:
+            return reader(self.active)
+        segment = Segment(info.path)
+        try:
+            return reader(segment)
+        finally:
+            segment.close()
+
+    def range(self, start: float, end: float) -> List[Tuple[float, float]]:
+        points = []
+        firsts = [info.first_ts for info in self.index]
+        # Skip segments that end before `start` via the first-timestamp index
+        begin = max(0, bisect.bisect_right(firsts, start) - 1)
+        for info in self.index[begin:]:
+            if info.first_ts > end:
+                break
+            if info.last_ts < start:
+                continue
+            points.extend(self._read(info, lambda segment: segment.slice(start, end)))
+        return points
+
+    def last(self, n: int) -> List[Tuple[float, float]]:
+        points: List[Tuple[float, float]] = []
+        for info in reversed(self.index):
+            if len(points) >= n:
+                break
+            points = self._read(info, lambda segment: segment.tail(n - len(points))) + points
+        return points
+
+    def expire(self, cutoff: float) -> int:
+        """Delete sealed segments whose newest point is older than cutoff"""
+        removed = 0
+        while self.index and self.index[0].last_ts < cutoff:
+            info = self.index[0]
+            if self.active is not None and info.path == self.active.path:
+                self.active.close()
+                self.active = None
+            os.remove(info.path)
+            self.index.pop(0)
+            removed += 1
+        return removed
+
+    def close(self):
+        if self.active is not None:
+            self.active.close()
+            self.active = None
+
+
+class TimeSeriesStore:
+    """Append-optimized local history, one series per (device_id, parameter)
+
+    A writable segment holds a file descriptor and a mapping, so at most
+    `max_open` series keep theirs open, least recently written closed first.
+    With `read_only` nothing is created or mapped for writing.
+    """
+
+    def __init__(self, root: str, retention_hours: float = 168.0, segment_points: int = 4096,
+                 max_open: int = 256, read_only: bool = False):
+        self.root = root
+        self.retention = retention_hours * 3600
+        self.segment_points = segment_points
+        self.max_open = max(1, max_open)
+        self.read_only = read_only
+        self.series: Dict[Tuple[int, str], Series] = {}
+        self.open_series: 'OrderedDict[Tuple[int, str], Series]' = OrderedDict()
+        self.discarded = 0
+        self.lock = threading.RLock()
+        if not read_only:
+            os.makedirs(root, exist_ok=True)
+        self._load()
+
+    @classmethod
+    def from_env(cls) -> Optional['TimeSeriesStore']:
+        """Build the store from LOCAL_STORE_* variables; None when disabled"""
+        root = os.getenv('LOCAL_STORE_DIR')
+        if not root:
+            return None
+        return cls(
+            root,
+            retention_hours=float(os.getenv('LOCAL_STORE_RETENTION_HOURS', '168')),
+            segment_points=int(os.getenv('LOCAL_STORE_SEGMENT_POINTS', '4096')),
+            max_open=int(os.getenv('LOCAL_STORE_MAX_OPEN', '256'))
+        )
+
+    @staticmethod
+    def _slug(parameter: str) -> str:
+        return re.sub(r'[^A-Za-z0-9]+', '_', parameter).strip('_') or 'parameter'
+
+    def _load(self):
+        """Open every series directory already on disk"""
+        for device_dir in os.listdir(self.root):
+            device_path = os.path.join(self.root, device_dir)
+            if not device_dir.isdigit() or not os.path.isdir(device_path):
+                continue
+            for series_dir in os.listdir(device_path):
+                path = os.path.join(device_path, series_dir)
+                meta_file = os.path.join(path, SERIES_META)
+                if not os.path.isfile(meta_file):
+                    continue
+                try:
+                    with open(meta_file, 'r') as f:
+                        meta = json.load(f)
+                    key = (int(meta['device_id']), meta['parameter'])
+                    self.series[key] = Series(path, self.segment_points, self.read_only)
+                except Exception as e:
+                    logger.warning(f"Skipping local series {path}: {e}")
+
+    def _get_series(self, device_id: int, parameter: str) -> Series:
+        key = (device_id, parameter)
+        series = self.series.get(key)
+        if series is None:
+            path = os.path.join(self.root, str(device_id), self._slug(parameter))
+            suffix = 1
+            while os.path.exists(path):
+                # Different parameter names can share a slug
+                path = os.path.join(self.root, str(device_id), f"{self._slug(parameter)}_{suffix}")
+                suffix += 1
+            os.makedirs(path)
+            with open(os.path.join(path, SERIES_META), 'w') as f:
+                json.dump({'device_id': device_id, 'parameter': parameter}, f)
+            series = Series(path, self.segment_points)
+            self.series[key] = series
+        return series
+
+    def _track_open(self, key: Tuple[int, str], series: Series):
+        """Mark a series as just written and close the least recently written beyond `max_open`"""
+        if series.active is None:
+            self.open_series.pop(key, None)
+            return
+        self.open_series[key] = series
+        self.open_series.move_to_end(key)
+        while len(self.open_series) > self.max_open:
+            _, oldest = self.open_series.popitem(last=False)
+            oldest.close()
+
+    def append(self, device_id: int, parameter: str, ts: float, value: float) -> bool:
+        """Append one point (epoch seconds); False, and counted in `discarded`, if it was not stored"""
+        if self.read_only:
+            raise ValueError(f"Local store {self.root} is open read-only")
+        with self.lock:
+            series = self._get_series(device_id, parameter)
+            stored = series.append(ts, value)
+            self._track_open((device_id, parameter), series)
+            if not stored:
+                self.discarded += 1
+            return stored
+
+    def range(self, device_id: int, parameter: str, start: float, end: float) -> List[Tuple[float, float]]:
+        """Points of one register with start <= ts <= end"""
+        with self.lock:
+            series = self.series.get((device_id, parameter))
+            return series.range(start, end) if series else []
+
+    def last(self, device_id: int, parameter: str, n: int = 1) -> List[Tuple[float, float]]:
+        """Newest n points of one register, oldest first"""
+        with self.lock:
+            series = self.series.get((device_id, parameter))
+            return series.last(n) if series else []
+
+    def list_series(self) -> List[Dict[str, object]]:
+        """Registers with local history"""
+        with self.lock:
+            return [
+                {
+                    'device_id': device_id,
+                    'parameter': parameter,
+                    'first_ts': series.index[0].first_ts if series.index else None,
+                    'last_ts': series.index[-1].last_ts if series.index else None,
+                    'points': sum(info.count for info in series.index)
+                }
+                for (device_id, parameter), series in sorted(self.series.items())
+            ]
+
+    def compact(self, now: float = None) -> int:
+        """Drop segments that fell out of the retention window"""
+        cutoff = (now or time.time()) - self.retention
+        removed = 0
+        with self.lock:
+            for key, series in list(self.series.items()):
+                removed += series.expire(cutoff)
+                if not series.index:
+                    series.close()
+                    shutil.rmtree(series.path, ignore_errors=True)
+                    del self.series[key]
+                if series.active is None:
+                    self.open_series.pop(key, None)
+        if removed:
+            logger.info(f"Local store compaction removed {removed} expired segments")
+        return removed
+
+    def close(self):
+        with self.lock:
+            for series in self.series.values():
+                series.close()
+            self.open_series.clear()
+
+
+def main():
+    """Query the local store from the command line"""
+    parser = argparse.ArgumentParser(description="Query the poller's local time-series store")
+    parser.add_argument('--dir', default=os.getenv('LOCAL_STORE_DIR', 'local_store'), help='Store directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('series', help='List stored registers')
+
+    range_parser = commands.add_parser('range', help='Points in a time range')
+    range_parser.add_argument('device_id', type=int)
+    range_parser.add_argument('parameter')
+    range_parser.add_argument('--start', type=float, default=0.0, help='Epoch seconds')
+    range_parser.add_argument('--end', type=float, default=None, help='Epoch seconds (default: now)')
+
+    last_parser = commands.add_parser('last', help='Newest N points')
+    last_parser.add_argument('device_id', type=int)
+    last_parser.add_argument('parameter')
+    last_parser.add_argument('-n', type=int, default=10)
+
+    args = parser.parse_args()
+    if not os.path.isdir(args.dir):
+        print(f"Local store {args.dir} not found", file=sys.stderr)
+        sys.exit(1)
+
+    store = TimeSeriesStore(args.dir, read_only=True)
+    try:
+        if args.command == 'series':
+            result = store.list_series()
+        elif args.command == 'range':
+            result = store.range(args.device_id, args.parameter, args.start, args.end or time.time())
+        else:
+            result = store.last(args.device_id, args.parameter, args.n)
+        print(json.dumps(result, indent=2))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
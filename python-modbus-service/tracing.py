@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Lightweight span tracing for the Modbus polling service
+Writes spans as OTLP/JSON lines, the format of the OpenTelemetry Collector file exporter
+"""
+
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SpanContext = Tuple[str, str]  # (trace_id, span_id)
+
+STATUS_ERROR = 2
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Tracer:
+    """Records spans and appends each finished trace to a file
+
+    The active span is tracked per thread; work handed to another thread
+    passes `current_context()` as the new span's `parent`. Finished spans are
+    buffered and written when a root span ends, one export request per line.
+    """
+
+    def __init__(self, path: str, service_name: str = 'modbus-poller',
+                 resource: Optional[Dict[str, Any]] = None, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.resource = [_attribute('service.name', service_name)]
+        self.resource.extend(_attribute(key, value) for key, value in (resource or {}).items())
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.finished: List[Dict[str, Any]] = []
+
+    def _stack(self) -> List[SpanContext]:
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def current_context(self) -> Optional[SpanContext]:
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[SpanContext] = None, **attributes):
+        parent = parent or self.current_context()
+        trace_id = parent[0] if parent else secrets.token_hex(16)
+        span_id = secrets.token_hex(8)
+        stack = self._stack()
+        stack.append((trace_id, span_id))
+        record = {
+            "traceId": trace_id,
+            "spanId": span_id,
+            "name": name,
+            "kind": 1,
+            "startTimeUnixNano": str(time.time_ns()),
+        }
+        if parent:
+            record["parentSpanId"] = parent[1]
+        try:
+            yield record
+        except BaseException as e:
+            record["status"] = {"code": STATUS_ERROR, "message": f"{type(e).__name__}: {e}"}
+            raise
+        finally:
+            stack.pop()
+            record["endTimeUnixNano"] = str(time.time_ns())
+            if attributes:
+                record["attributes"] = [_attribute(key, value) for key, value in attributes.items()]
+            with self.lock:
+                self.finished.append(record)
+            if parent is None:
+                self.flush()
+
+    def flush(self):
+        """Append buffered spans to the trace file"""
+        with self.lock:
+            spans, self.finished = self.finished, []
+        if not spans:
+            return
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": self.resource},
+                "scopeSpans": [{"scope": {"name": "modbus-poller"}, "spans": spans}]
+            }]
+        }
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(request, separators=(',', ':')) + '\n')
+        except OSError as e:
+            logger.error(f"Could not write trace file {self.path}: {e}")
+
+
+_tracer: Optional[Tracer] = None
+
+
+def configure(shard: Optional[Tuple[int, int]] = None) -> Optional[Tracer]:
+    """Enable tracing from TRACE_* variables; spans are no-ops while TRACE_FILE is unset"""
+    global _tracer
+    path = os.getenv('TRACE_FILE')
+    if not path:
+        return None
+    resource = {}
+    if shard:
+        # Each worker process writes its own file
+        path = f"{path}.{shard[0]}"
+        resource['poller.shard'] = shard[0]
+    _tracer = Tracer(
+        path,
+        service_name=os.getenv('TRACE_SERVICE_NAME', 'modbus-poller'),
+        resource=resource,
+        max_bytes=int(os.getenv('TRACE_MAX_MB', '50')) * 1024 * 1024
+    )
+    return _tracer
+
+
+def span(name: str, parent: Optional[SpanContext] = None, **attributes):
+    """Context manager timing a stage; free when tracing is disabled"""
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.span(name, parent, **attributes)
+
+
+def current_context() -> Optional[SpanContext]:
+    return _tracer.current_context() if _tracer is not None else None